@@ -17,7 +17,7 @@ from scipy.io.wavfile import write, read
 
 __author__ = ['Konstantinos Drossos -- TUT', 'Stelios Mimilakis -- Fraunhofer IDMT']
 __docformat__ = 'reStructuredText'
-__all__ = ['wav_read', 'wav_write']
+__all__ = ['wav_read', 'wav_write', 'wav_read_chunks', 'WavWriter']
 
 _normFact = {
     'int8': (2 ** 7) - 1,
@@ -95,6 +95,123 @@ def wav_write(y, sampling_rate, nb_bits, file_name):
         raise ValueError('Could not handle {} number of bits'.format(nb_bits))
 
 
+def wav_read_chunks(file_name, chunk_size, mono=False):
+    """Reads a wav file in chunks of `chunk_size` samples. The chunks are\
+    the consecutive parts of the data that :func:`wav_read` returns, but\
+    only one chunk is in memory at a time. If `mono` is set to true, the\
+    chunks are monophonic (and one dimensional, also for mono files).
+
+    :param file_name: The file name of the wav file.
+    :type file_name: str
+    :param chunk_size: The amount of samples of each chunk.
+    :type chunk_size: int
+    :param mono: Get mono version.
+    :type mono: bool
+    :return: The chunks of the data.
+    :rtype: collections.Iterable[numpy.core.multiarray.ndarray]
+    """
+    try:
+        wav = wave.open(file_name)
+    except Exception:
+        wav = None
+
+    if wav is None:
+        # 32 bit case
+        samples = read(file_name, mmap=True)[1]
+        chunks = (np.array(samples[i:i + chunk_size]) for i in range(0, samples.shape[0], chunk_size))
+    else:
+        chunks = _read_wave_chunks(wav, chunk_size)
+
+    for chunk in chunks:
+        if mono and chunk.ndim == 2:
+            if chunk.shape[1] > 1:
+                chunk = (chunk[:, 0] + chunk[:, 1]) * 0.5
+            else:
+                chunk = chunk[:, 0]
+
+        yield chunk
+
+
+class WavWriter(object):
+    def __init__(self, file_name, sampling_rate, nb_bits):
+        """Writes a mono wav file incrementally. The file is the same as the\
+        one that :func:`wav_write` writes for all the data.
+
+        :param file_name: The file name.
+        :type file_name: str
+        :param sampling_rate: The sampling rate.
+        :type sampling_rate: int
+        :param nb_bits: The number of bits.
+        :type nb_bits: int
+        :raises ValueError: When the number of bits are not 8 or 16.
+        """
+        if nb_bits not in [8, 16]:
+            raise ValueError('Could not handle {} number of bits'.format(nb_bits))
+
+        self._nb_bits = nb_bits
+        self._wav = wave.open(file_name, 'wb')
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(nb_bits // 8)
+        self._wav.setframerate(sampling_rate)
+
+    def write(self, y):
+        """Appends audio data to the file.
+
+        :param y: The audio data.
+        :type y: numpy.core.multiarray.ndarray
+        """
+        if self._nb_bits == 8:
+            # The int8 conversion is kept as in `wav_write`
+            x = np.int8((y + 1.0) * _normFact['int8']).view(np.uint8)
+        else:
+            x = np.int16(y * _normFact['int16']).astype('<i2')
+
+        self._wav.writeframes(x.tobytes())
+
+    def close(self):
+        """Closes the file, after updating its header.
+        """
+        self._wav.close()
+
+
+def _read_wave_chunks(wav, chunk_size):
+    """Reads the data of a wav file opened with the :mod:`wave` package,\
+    in chunks, normalized as in :func:`wav_read`.
+
+    :param wav: The opened wav file.
+    :type wav: wave.Wave_read
+    :param chunk_size: The amount of samples of each chunk.
+    :type chunk_size: int
+    :return: The chunks of the data.
+    :rtype: collections.Iterable[numpy.core.multiarray.ndarray]
+    """
+    nb_channels = wav.getnchannels()
+    sample_width = wav.getsampwidth()
+
+    try:
+        while True:
+            data = wav.readframes(chunk_size)
+
+            if len(data) == 0:
+                break
+
+            samples = _wav_to_array(nb_channels, sample_width, data)
+
+            if sample_width == 1:
+                # 8 bit case
+                samples = (samples.astype(float) / _normFact['int8']) - 1.0
+            elif sample_width == 2:
+                # 16 bit case
+                samples = samples.astype(float) / _normFact['int16']
+            elif sample_width == 3:
+                # 24 bit case
+                samples = samples.astype(float) / _normFact['int24']
+
+            yield samples
+    finally:
+        wav.close()
+
+
 def _load_wav_with_wave(file_name):
     """Loads a wav file with the :mod:`wave` package. Used\
     for wav files with sample width of 24 bits.
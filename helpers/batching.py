@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Batching of the sequences of several tracks for the inference.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['cross_track_inference', 'MicroBatcher']
+
+
+class _Track(object):
+    def __init__(self, index, data, output_shape):
+        """A track for which the inference is ongoing.
+
+        :param index: The index of the track.
+        :type index: int
+        :param data: The data of the track, as given by the data feeder.
+        :type data: tuple
+        :param output_shape: The shape of the predicted voice magnitude.
+        :type output_shape: tuple[int]
+        """
+        self.index = index
+        self.data = data
+        self.mix_magnitude = data[1]
+        self.voice_predicted = np.zeros(output_shape, dtype=np.float32)
+        self.next_sequence = 0
+        self.remaining = output_shape[0]
+
+
+def cross_track_inference(tracks_it, predict_batch, batch_size, context_length):
+    """Performs the inference of the sequences of consecutive tracks,\
+    with batches that can have sequences from more than one track.
+
+    The tracks are read from the `tracks_it` only when their sequences\
+    are needed to fill a batch. All batches are full, except the last one.
+
+    :param tracks_it: An iterator over the tracks, yielding the data as\
+                      the iterator of :func:`helpers.data_feeder.data_feeder_testing`.
+    :type tracks_it: collections.Iterable
+    :param predict_batch: The callable that predicts the voice magnitude of\
+                          a batch of sequences (without the context frames).
+    :type predict_batch: callable
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :param context_length: The context length in frames.
+    :type context_length: int
+    :return: An iterator yielding, in the order of `tracks_it`, the index of\
+             the track, its data, and the predicted voice magnitude.
+    :rtype: collections.Iterable[(int, tuple, numpy.core.multiarray.ndarray)]
+    """
+    tracks_it = enumerate(tracks_it)
+    tracks = deque()
+    nb_unscheduled = 0
+    exhausted = False
+
+    while True:
+        while not exhausted and nb_unscheduled < batch_size:
+            try:
+                index, data = next(tracks_it)
+            except StopIteration:
+                exhausted = True
+                break
+
+            mix_magnitude = data[1]
+            tracks.append(_Track(index, data, (
+                mix_magnitude.shape[0],
+                mix_magnitude.shape[1] - 2 * context_length,
+                mix_magnitude.shape[2]
+            )))
+            nb_unscheduled += mix_magnitude.shape[0]
+
+        if nb_unscheduled == 0:
+            break
+
+        # Gather the batch from the tracks, in order
+        parts = []
+        nb_gathered = 0
+
+        for track in tracks:
+            if nb_gathered == batch_size:
+                break
+
+            b_start = track.next_sequence
+            b_end = min(track.mix_magnitude.shape[0], b_start + batch_size - nb_gathered)
+
+            if b_end > b_start:
+                parts.append((track, b_start, b_end))
+                track.next_sequence = b_end
+                nb_gathered += b_end - b_start
+
+        nb_unscheduled -= nb_gathered
+
+        batch_output = predict_batch(np.concatenate(
+            [track.mix_magnitude[b_start:b_end, :, :] for track, b_start, b_end in parts]
+        ))
+
+        # Route the outputs back to their tracks
+        o_start = 0
+        for track, b_start, b_end in parts:
+            o_end = o_start + b_end - b_start
+            track.voice_predicted[b_start:b_end, :, :] = batch_output[o_start:o_end, :, :]
+            track.remaining -= b_end - b_start
+            o_start = o_end
+
+        while len(tracks) > 0 and tracks[0].remaining == 0:
+            track = tracks.popleft()
+            yield track.index, track.data, track.voice_predicted
+
+
+class _Job(object):
+    def __init__(self, mix_magnitude, context_length):
+        """A request for the inference of the sequences of one track,\
+        at the :class:`MicroBatcher`.
+
+        :param mix_magnitude: The sequences of the mixture magnitude.
+        :type mix_magnitude: numpy.core.multiarray.ndarray
+        :param context_length: The context length in frames.
+        :type context_length: int
+        """
+        self.mix_magnitude = mix_magnitude
+        self.voice_predicted = np.zeros((
+            mix_magnitude.shape[0],
+            mix_magnitude.shape[1] - 2 * context_length,
+            mix_magnitude.shape[2]
+        ), dtype=np.float32)
+        self.next_sequence = 0
+        self.remaining = mix_magnitude.shape[0]
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher(object):
+    def __init__(self, predict_batch, batch_size, context_length, max_wait):
+        """Performs the inference of the sequences of concurrent requests,\
+        with batches that can have sequences from more than one request.
+
+        A thread makes the batches. When there are less sequences than the\
+        batch size, it waits up to `max_wait` seconds for more requests\
+        before it makes a smaller batch.
+
+        :param predict_batch: The callable that predicts the voice magnitude of\
+                              a batch of sequences (without the context frames).
+        :type predict_batch: callable
+        :param batch_size: The batch size.
+        :type batch_size: int
+        :param context_length: The context length in frames.
+        :type context_length: int
+        :param max_wait: The maximum waiting time for filling a batch, in seconds.
+        :type max_wait: float
+        """
+        self._predict_batch = predict_batch
+        self._batch_size = batch_size
+        self._context_length = context_length
+        self._max_wait = max_wait
+
+        self._jobs = deque()
+        self._nb_unscheduled = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+
+        self.nb_batches = 0
+        self.nb_batched_sequences = 0
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def predict(self, mix_magnitude):
+        """Predicts the voice magnitude of the sequences of one track,\
+        blocking until all of them are processed.
+
+        :param mix_magnitude: The sequences of the mixture magnitude.
+        :type mix_magnitude: numpy.core.multiarray.ndarray
+        :return: The predicted voice magnitude, without the context frames.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        job = _Job(mix_magnitude, self._context_length)
+
+        with self._condition:
+            if self._stopped:
+                raise RuntimeError('The micro-batcher is closed.')
+
+            self._jobs.append(job)
+            self._nb_unscheduled += mix_magnitude.shape[0]
+            self._condition.notify()
+
+        job.done.wait()
+
+        if job.error is not None:
+            raise job.error
+
+        return job.voice_predicted
+
+    def queue_depth(self):
+        """Gives the amount of requests and of sequences that are waiting.
+
+        :return: The amount of requests (with unfinished sequences) and the\
+                 amount of sequences that are not in a batch yet.
+        :rtype: (int, int)
+        """
+        with self._condition:
+            return len(self._jobs), self._nb_unscheduled
+
+    def close(self):
+        """Stops the batching thread. Waiting requests fail.
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+        self._thread.join()
+
+    def _next_batch(self):
+        """Waits for sequences and gathers the next batch.
+
+        :return: The parts of the batch, as (job, first sequence, one after\
+                 the last sequence), or None if the batcher is closed.
+        :rtype: list[(_Job, int, int)] | None
+        """
+        with self._condition:
+            while not self._stopped and self._nb_unscheduled == 0:
+                self._condition.wait()
+
+            deadline = time.time() + self._max_wait
+            while not self._stopped and self._nb_unscheduled < self._batch_size:
+                remaining_time = deadline - time.time()
+                if remaining_time <= 0:
+                    break
+                self._condition.wait(remaining_time)
+
+            if self._stopped:
+                for job in self._jobs:
+                    job.error = RuntimeError('The micro-batcher is closed.')
+                    job.done.set()
+                return None
+
+            parts = []
+            nb_gathered = 0
+
+            for job in self._jobs:
+                if nb_gathered == self._batch_size:
+                    break
+
+                b_start = job.next_sequence
+                b_end = min(job.mix_magnitude.shape[0], b_start + self._batch_size - nb_gathered)
+
+                if b_end > b_start:
+                    parts.append((job, b_start, b_end))
+                    job.next_sequence = b_end
+                    nb_gathered += b_end - b_start
+
+            self._nb_unscheduled -= nb_gathered
+
+            return parts
+
+    def _run(self):
+        """The loop of the batching thread.
+        """
+        while True:
+            parts = self._next_batch()
+
+            if parts is None:
+                return
+
+            try:
+                batch_output = self._predict_batch(np.concatenate(
+                    [job.mix_magnitude[b_start:b_end, :, :] for job, b_start, b_end in parts]
+                ))
+                error = None
+            except Exception as e:
+                batch_output = None
+                error = e
+
+            self.nb_batches += 1
+            self.nb_batched_sequences += sum(b_end - b_start for _, b_start, b_end in parts)
+
+            # Route the outputs back to their requests
+            o_start = 0
+            finished = []
+            for job, b_start, b_end in parts:
+                o_end = o_start + b_end - b_start
+
+                if error is None:
+                    job.voice_predicted[b_start:b_end, :, :] = batch_output[o_start:o_end, :, :]
+                else:
+                    job.error = error
+
+                job.remaining -= b_end - b_start
+                o_start = o_end
+
+                if job.remaining == 0:
+                    finished.append(job)
+
+            with self._condition:
+                for job in finished:
+                    self._jobs.remove(job)
+
+            for job in finished:
+                job.done.set()
+
+# EOF
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Checkpoints of the training, for resuming an interrupted training.
+
+A checkpoint has the states of all the modules (the TwinNet ones\
+included) and of the optimizer, the epoch and step counters, and the\
+states of the random number generators. It has also the state of each\
+process of a data-parallel training (see :func:`pack_rank_state`), i.e.\
+the sums of its losses of the current epoch so far and the state of its\
+NumPy random number generator at the start of the epoch. The training\
+thread only copies the states; the serialization and the writing happen\
+at a background thread, while the training goes on. A checkpoint is\
+written to a temporary file that is then renamed, so an interruption\
+while writing leaves the previous checkpoint intact.
+"""
+
+import os
+import queue
+import random
+import threading
+
+import numpy as np
+import torch
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['CheckpointWriter', 'make_checkpoint', 'load_checkpoint', 'restore_rng_states',
+           'pack_rank_state', 'unpack_rank_state']
+
+_end = object()
+
+
+def make_checkpoint(modules, optimizer, epoch, step, epoch_step, rank_states):
+    """Makes a checkpoint, with copies of the states (at the CPU), so that\
+    the training can go on while the checkpoint is written.
+
+    :param modules: The modules, as (name, module).
+    :type modules: list[(str, torch.nn.Module)]
+    :param optimizer: The optimizer.
+    :type optimizer: torch.optim.Optimizer
+    :param epoch: The current epoch.
+    :type epoch: int
+    :param step: The amount of steps done.
+    :type step: int
+    :param epoch_step: The amount of steps done at the current epoch.
+    :type epoch_step: int
+    :param rank_states: The states of the processes, from\
+                        :func:`pack_rank_state`, in the order of their ranks.
+    :type rank_states: list[list[float]]
+    :return: The checkpoint.
+    :rtype: dict
+    """
+    return {
+        'modules': {name: _copy(module.state_dict()) for name, module in modules},
+        'optimizer': _copy(optimizer.state_dict()),
+        'epoch': epoch,
+        'step': step,
+        'epoch_step': epoch_step,
+        'rank_states': [list(rank_state) for rank_state in rank_states],
+        'rng_states': {
+            'python': random.getstate(),
+            'torch': torch.get_rng_state(),
+            'cuda': torch.cuda.get_rng_state() if torch.cuda.is_available() else None
+        }
+    }
+
+
+def pack_rank_state(epoch_losses, numpy_state):
+    """Packs the state of a process to a list of floats, so that the\
+    states of all the processes can be gathered to the one that writes\
+    the checkpoint.
+
+    :param epoch_losses: The sums of the losses of the steps done at the\
+                         current epoch, and the amount of these steps.
+    :type epoch_losses: list[float]
+    :param numpy_state: The state of the NumPy random number generator at\
+                        the start of the current epoch (the data feeder\
+                        uses it for shuffling the batches).
+    :type numpy_state: tuple
+    :return: The state.
+    :rtype: list[float]
+    """
+    _, keys, pos, has_gauss, cached_gaussian = numpy_state
+
+    return list(epoch_losses) + [pos, has_gauss, cached_gaussian] + keys.tolist()
+
+
+def unpack_rank_state(rank_state, nb_losses=5):
+    """Unpacks the state of a process, from :func:`pack_rank_state`.
+
+    :param rank_state: The state.
+    :type rank_state: list[float]
+    :param nb_losses: The amount of values of the losses at the state.
+    :type nb_losses: int
+    :return: The sums of the losses and the state of the NumPy random\
+             number generator.
+    :rtype: (list[float], tuple)
+    """
+    pos, has_gauss, cached_gaussian = rank_state[nb_losses:nb_losses + 3]
+    keys = np.array(rank_state[nb_losses + 3:], dtype=np.uint32)
+
+    numpy_state = ('MT19937', keys, int(pos), int(has_gauss), cached_gaussian)
+
+    return list(rank_state[:nb_losses]), numpy_state
+
+
+def load_checkpoint(file_name, modules, optimizer):
+    """Loads a checkpoint to the modules and the optimizer.
+
+    :param file_name: The file name of the checkpoint.
+    :type file_name: str
+    :param modules: The modules, as (name, module).
+    :type modules: list[(str, torch.nn.Module)]
+    :param optimizer: The optimizer.
+    :type optimizer: torch.optim.Optimizer
+    :return: The checkpoint.
+    :rtype: dict
+    """
+    checkpoint = torch.load(file_name, map_location=lambda storage, location: storage)
+
+    for name, module in modules:
+        module.load_state_dict(checkpoint['modules'][name])
+
+    optimizer.load_state_dict(checkpoint['optimizer'])
+
+    return checkpoint
+
+
+def restore_rng_states(rng_states):
+    """Restores the states of the random number generators of Python and\
+    of PyTorch.
+
+    :param rng_states: The states, as in the checkpoint.
+    :type rng_states: dict
+    """
+    random.setstate(rng_states['python'])
+    torch.set_rng_state(rng_states['torch'])
+
+    if rng_states['cuda'] is not None and torch.cuda.is_available():
+        torch.cuda.set_rng_state(rng_states['cuda'])
+
+
+def _copy(obj):
+    """Copies the tensors of a state to the CPU.
+
+    :param obj: The state (a tensor, or a dict, list or tuple with tensors).
+    :type obj: object
+    :return: The copy.
+    :rtype: object
+    """
+    if torch.is_tensor(obj):
+        return obj.cpu() if obj.is_cuda else obj.clone()
+    elif isinstance(obj, dict):
+        return type(obj)((k, _copy(v)) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return type(obj)(_copy(v) for v in obj)
+
+    return obj
+
+
+class CheckpointWriter(object):
+    def __init__(self, file_name):
+        """Writes checkpoints at a background thread.
+
+        At most one checkpoint waits while another one is written, so\
+        :meth:`save` blocks only when the checkpoints are made faster than\
+        they are written.
+
+        :param file_name: The file name of the checkpoints.
+        :type file_name: str
+        """
+        self.file_name = file_name
+        self.error = None
+
+        self._checkpoints = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._write)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def save(self, checkpoint):
+        """Queues a checkpoint to be written.
+
+        :param checkpoint: The checkpoint, from :func:`make_checkpoint`.
+        :type checkpoint: dict
+        :raises IOError: When a previous checkpoint could not be written.
+        """
+        self._raise_error()
+        self._checkpoints.put(checkpoint)
+
+    def close(self):
+        """Waits until all the queued checkpoints are written.
+
+        :raises IOError: When a checkpoint could not be written.
+        """
+        self._checkpoints.put(_end)
+        self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        """Raises the error of the writing, if any.
+
+        :raises IOError: When a checkpoint could not be written.
+        """
+        if self.error is not None:
+            raise IOError('Could not write the checkpoint {}: {}'.format(self.file_name, self.error))
+
+    def _write(self):
+        """The loop of the background thread.
+        """
+        while True:
+            checkpoint = self._checkpoints.get()
+
+            if checkpoint is _end:
+                break
+
+            if self.error is not None:
+                continue
+
+            try:
+                tmp_file_name = '{}.tmp'.format(self.file_name)
+                torch.save(checkpoint, tmp_file_name)
+                os.replace(tmp_file_name, self.file_name)
+            except Exception as e:
+                self.error = e
+
+# EOF
@@ -5,26 +5,26 @@
 """
 
 import os
-from operator import itemgetter
 
 import numpy as np
-from mir_eval import separation as bss_eval
 from numpy.lib import stride_tricks
 from scipy.signal import hamming
 
 from helpers.audio_io import wav_read, wav_write
-from helpers.settings import dataset_paths, output_audio_paths, wav_quality
+from helpers.mask_store import save_mask
+from helpers.metrics import bss_eval_metrics
+from helpers.settings import dataset_paths, output_audio_paths, wav_quality, mask_constants
+from helpers.sharding import wav_duration, shard_indices
 from helpers.signal_transforms import stft, i_stft, ideal_ratio_masking
 
 __author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
 __docformat__ = 'reStructuredText'
-__all__ = ['data_feeder_training', 'data_feeder_testing', 'data_process_results_testing']
-
-_get_me_the_metrics = itemgetter(0, 2)
+__all__ = ['data_feeder_training', 'data_feeder_testing', 'data_reader_testing',
+           'data_process_results_testing', 'data_durations_testing']
 
 
 def data_feeder_training(window_size, fft_size, hop_size, seq_length, context_length,
-                         batch_size, files_per_pass, debug):
+                         batch_size, files_per_pass, debug, rank=0, world_size=1):
     """Provides an iterator over the training examples.
 
     :param window_size: The window size to be used for the time-frequency transformation.
@@ -47,6 +47,13 @@ def data_feeder_training(window_size, fft_size, hop_size, seq_length, context_le
     :type files_per_pass: int
     :param debug: A flag to indicate debug
     :type debug: bool
+    :param rank: The rank of the process, for distributed training.
+    :type rank: int
+    :param world_size: The amount of processes, for distributed training.\
+                       Each process gets only the sets of files of its shard,\
+                       with about the same total duration at each shard (see\
+                       :func:`helpers.sharding.shard_indices`).
+    :type world_size: int
     :return: An iterator that will provide the input and target values.\
              The iterator yields (input, target) values.
     :rtype: callable
@@ -54,8 +61,18 @@ def data_feeder_training(window_size, fft_size, hop_size, seq_length, context_le
     mixtures_list, sources_list = _get_files_lists('training')
     hamming_window = hamming(window_size, True)
 
+    sets = list(range(int(len(mixtures_list) / files_per_pass)))
+
+    if world_size > 1:
+        sets = shard_indices(
+            [sum(wav_duration(os.path.join(mixtures_path, 'mixture.wav'))
+                 for mixtures_path in mixtures_list[index * files_per_pass:(index + 1) * files_per_pass])
+             for index in sets],
+            rank, world_size
+        )
+
     def epoch_it():
-        for index in range(int(len(mixtures_list) / files_per_pass)):
+        for index in sets:
             mix, voice_true = _get_data_training(
                 current_set=index + 1, set_size=files_per_pass,
                 mixtures_list=mixtures_list, sources_list=sources_list,
@@ -89,7 +106,7 @@ def data_feeder_training(window_size, fft_size, hop_size, seq_length, context_le
 
 
 def data_feeder_testing(window_size, fft_size, hop_size, seq_length, context_length,
-                        batch_size, debug, sources_list=None):
+                        batch_size, debug, sources_list=None, stereo=None):
     """Provides an iterator over the testing examples.
 
     :param window_size: The window size to be used for the time-frequency transformation.
@@ -108,10 +125,65 @@ def data_feeder_testing(window_size, fft_size, hop_size, seq_length, context_len
     :type debug: bool
     :param sources_list: The file list provided for using the MaD-TwinNet.
     :type sources_list: list[str]
+    :param stereo: The channels of the files to be separated, i.e. `lr`\
+                   (left and right) or `ms` (mid and side), or None for the\
+                   mono version. The sequences of the channels are one after\
+                   the other, and the mix has a column per channel.
+    :type stereo: str | None
     :return: An iterator that will provide the input and target values.\
              The iterator yields (mix, mix magnitude, mix phase, voice true, bg true) values.
     :rtype: callable
+    :raises ValueError: When the sequence length is not greater than twice the context length.
     """
+    nb_examples, read_example = data_reader_testing(
+        window_size=window_size, fft_size=fft_size, hop_size=hop_size,
+        seq_length=seq_length, context_length=context_length,
+        batch_size=batch_size, debug=debug, sources_list=sources_list, stereo=stereo
+    )
+
+    def testing_it():
+
+        for index in range(nb_examples):
+            yield read_example(index)
+
+    return testing_it
+
+
+def data_reader_testing(window_size, fft_size, hop_size, seq_length, context_length,
+                        batch_size, debug, sources_list=None, stereo=None):
+    """Provides random access to the testing examples, e.g. for reading\
+    them from more than one thread.
+
+    :param window_size: The window size to be used for the time-frequency transformation.
+    :type window_size: int
+    :param fft_size: The size of the FFT in samples.
+    :type fft_size: int
+    :param hop_size: The hop size in samples.
+    :type hop_size: int
+    :param seq_length: The sequence length in frames.
+    :type seq_length: int
+    :param context_length: The context length in frames.
+    :type context_length: int
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :param debug: A flag to indicate debug
+    :type debug: bool
+    :param sources_list: The file list provided for using the MaD-TwinNet.
+    :type sources_list: list[str]
+    :param stereo: The channels of the files to be separated, i.e. `lr`\
+                   (left and right) or `ms` (mid and side), or None for the\
+                   mono version (see :func:`data_feeder_testing`).
+    :type stereo: str | None
+    :return: The amount of examples and a function that reads the example\
+             with the given index, returning (mix, mix magnitude, mix phase,\
+             voice true, bg true) values.
+    :rtype: (int, callable)
+    :raises ValueError: When the sequence length is not greater than twice the context length.
+    """
+    if seq_length <= 2 * context_length:
+        raise ValueError('The sequence length ({}) must be greater than twice the '
+                         'context length ({}).'.format(seq_length, context_length))
+
     if sources_list is None:
         usage_case = False
         sources_list = _get_files_lists('testing')[-1]
@@ -119,25 +191,24 @@ def data_feeder_testing(window_size, fft_size, hop_size, seq_length, context_len
         usage_case = True
     hamming_window = hamming(window_size, True)
 
-    def testing_it():
+    def read_example(index):
+        return _get_data_testing(
+            sources_parent_path=sources_list[index],
+            window_values=hamming_window, fft_size=fft_size, hop=hop_size,
+            seq_length=seq_length, context_length=context_length,
+            batch_size=batch_size, usage_case=usage_case, stereo=stereo
+        )
 
-        for index in range(len(sources_list)):
-            yield _get_data_testing(
-                sources_parent_path=sources_list[index],
-                window_values=hamming_window, fft_size=fft_size, hop=hop_size,
-                seq_length=seq_length, context_length=context_length,
-                batch_size=batch_size, usage_case=usage_case
-            )
+    nb_examples = min(len(sources_list), 1) if debug else len(sources_list)
 
-            if debug:
-                break
-
-    return testing_it
+    return nb_examples, read_example
 
 
 def data_process_results_testing(index, voice_true, bg_true, voice_predicted,
                                  window_size, mix, mix_magnitude, mix_phase, hop,
-                                 context_length, output_file_name=None):
+                                 context_length, output_file_name=None, metrics_pool=None,
+                                 metrics_function=bss_eval_metrics, mask_file_name=None,
+                                 stereo=None):
     """Calculates SDR and SIR and creates the resulting audio files.
 
     :param index: The index of the current source/track.
@@ -164,11 +235,40 @@ def data_process_results_testing(index, voice_true, bg_true, voice_predicted,
                              and background music. If this argument is not
                              None, then the function just synthesizes the
                              voice and the background music, and saves them.
+                             A third file name, if given, is the one of the
+                             mask store (as the `mask_file_name`).
     :type output_file_name: list[str] | None
+    :param metrics_pool: The pool to calculate the metrics at. If this\
+                         argument is not None, then the signals are submitted\
+                         to the pool and the function returns None values.
+    :type metrics_pool: helpers.metrics.MetricsPool | None
+    :param metrics_function: The function that calculates the metrics inline,\
+                             e.g. :func:`helpers.metrics.fast_metrics` for the\
+                             SDR and SI-SDR instead of the BSS-eval SDR and SIR.
+    :type metrics_function: callable
+    :param mask_file_name: The file name of the mask store, to save the\
+                           predicted voice magnitude, the mixture phase, and\
+                           the mixture at (see :mod:`helpers.mask_store`).\
+                           If None, they are not saved.
+    :type mask_file_name: str | None
+    :param stereo: The channels of the mixture (`lr` or `ms`, see\
+                   :func:`data_feeder_testing`), for the usage case with a\
+                   mixture with a column per channel. The outputs are left\
+                   and right.
+    :type stereo: str | None
     :return: The values of SDR and SIR for each of the frames in\
              the current track, for both voice and background music.
     :rtype: (list[numpy.core.multiarray.ndarray], list[numpy.core.multiarray.ndarray])
     """
+    if stereo is not None:
+        voice_hat, bg_hat = _synthesize_channels(
+            voice_predicted, mix, mix_phase, window_size, hop, context_length, stereo)
+
+        wav_write(voice_hat, file_name=output_file_name[0], **wav_quality)
+        wav_write(bg_hat, file_name=output_file_name[1], **wav_quality)
+
+        return None, None
+
     voice_predicted.shape = (voice_predicted.shape[0] * voice_predicted.shape[1], window_size)
     mix_magnitude, mix_phase = _context_based_reshaping(mix_magnitude, mix_phase, context_length, window_size)
 
@@ -190,6 +290,15 @@ def data_process_results_testing(index, voice_true, bg_true, voice_predicted,
     # Background music estimation
     bg_hat = mix[:min_len] - voice_hat[:min_len]
 
+    if mask_file_name is None and output_file_name is not None and len(output_file_name) > 2:
+        mask_file_name = output_file_name[2]
+
+    if mask_file_name is not None:
+        save_mask(
+            mask_file_name, voice_predicted, mix_phase, mix[:min_len], window_size, hop,
+            wav_quality['sampling_rate'], **mask_constants
+        )
+
     if output_file_name is None:
         voice_hat_path = output_audio_paths['voice_predicted'].format(p=example_index)
         bg_hat_path = output_audio_paths['bg_predicted'].format(p=example_index)
@@ -198,10 +307,19 @@ def data_process_results_testing(index, voice_true, bg_true, voice_predicted,
         wav_write(mix, file_name=output_audio_paths['mix'].format(p=example_index), **wav_quality)
 
         # Metrics calculation
-        sdr, sir = _get_me_the_metrics(bss_eval.bss_eval_images_framewise(
-            [voice_true[:min_len], bg_true[:min_len]],
-            [voice_hat[:min_len], bg_hat[:min_len]]
-        ))
+        if metrics_pool is None:
+            sdr, sir = metrics_function(
+                [voice_true[:min_len], bg_true[:min_len]],
+                [voice_hat[:min_len], bg_hat[:min_len]]
+            )
+        else:
+            metrics_pool.submit(
+                index,
+                [voice_true[:min_len], bg_true[:min_len]],
+                [voice_hat[:min_len], bg_hat[:min_len]]
+            )
+            sdr = None
+            sir = None
 
     else:
         voice_hat_path = output_file_name[0]
@@ -210,12 +328,23 @@ def data_process_results_testing(index, voice_true, bg_true, voice_predicted,
         sdr = None
         sir = None
 
-    wav_write(voice_hat, file_name=voice_hat_path, **wav_quality)
+    wav_write(voice_hat[:min_len], file_name=voice_hat_path, **wav_quality)
     wav_write(bg_hat, file_name=bg_hat_path, **wav_quality)
 
     return sdr, sir
 
 
+def data_durations_testing():
+    """Gives the durations of the testing tracks, in the order of the\
+    indices of :func:`data_reader_testing`, from the headers of the files.
+
+    :return: The durations in seconds.
+    :rtype: list[float]
+    """
+    return [wav_duration(os.path.join(sources_parent_path, 'vocals.wav'))
+            for sources_parent_path in _get_files_lists('testing')[-1]]
+
+
 def _get_files_lists(subset):
     """Getting the files lists.
 
@@ -249,7 +378,7 @@ def _context_based_reshaping(mix, voice, context_length, window_size):
     return mix, voice
 
 
-def _make_overlap_sequences(mixture, voice, bg, l_size, o_lap, b_size):
+def _make_overlap_sequences(mixture, voice, bg, l_size, o_lap, b_size, inference=False):
     """Makes the overlap sequences to be used for time-frequency transformation.
 
     :param mixture: The mixture signal
@@ -264,12 +393,25 @@ def _make_overlap_sequences(mixture, voice, bg, l_size, o_lap, b_size):
     :type o_lap: int
     :param b_size: The batch size
     :type b_size: int
+    :param inference: The sequences are for the inference, so they must\
+                      cover all the frames of the input.
+    :type inference: bool
     :return: The overlapping sequences
     :rtype: numpy.core.multiarray.ndarray
     """
-    trim_frame = mixture.shape[0] % (l_size - o_lap)
-    trim_frame -= (l_size - o_lap)
-    trim_frame = np.abs(trim_frame)
+    step = l_size - o_lap
+
+    if inference:
+        # The sequences are as few as possible, but the frames that they give
+        # as output (i.e. without the first and last o_lap / 2 frames) must
+        # cover all the frames of the input. Padding is done only to complete
+        # the last sequence.
+        nb_sequences = max(int(np.ceil((mixture.shape[0] - o_lap // 2) / float(step))), 1)
+        trim_frame = max((nb_sequences - 1) * step + l_size - mixture.shape[0], 0)
+    else:
+        # Padding to a multiple of the step, without the last sequence
+        trim_frame = step - mixture.shape[0] % step
+        nb_sequences = (mixture.shape[0] + trim_frame) // step - 1
 
     if trim_frame != 0:
         mixture = np.pad(mixture, ((0, trim_frame), (0, 0)), 'constant', constant_values=(0, 0))
@@ -278,24 +420,21 @@ def _make_overlap_sequences(mixture, voice, bg, l_size, o_lap, b_size):
 
     mixture = stride_tricks.as_strided(
         mixture,
-        shape=(int(mixture.shape[0] / (l_size - o_lap)), l_size, mixture.shape[1]),
-        strides=(mixture.strides[0] * (l_size - o_lap), mixture.strides[0], mixture.strides[1])
+        shape=(nb_sequences, l_size, mixture.shape[1]),
+        strides=(mixture.strides[0] * step, mixture.strides[0], mixture.strides[1])
     )
-    mixture = mixture[:-1, :, :]
 
     voice = stride_tricks.as_strided(
         voice,
-        shape=(int(voice.shape[0] / (l_size - o_lap)), l_size, voice.shape[1]),
-        strides=(voice.strides[0] * (l_size - o_lap), voice.strides[0], voice.strides[1])
+        shape=(nb_sequences, l_size, voice.shape[1]),
+        strides=(voice.strides[0] * step, voice.strides[0], voice.strides[1])
     )
-    voice = voice[:-1, :, :]
 
     bg = stride_tricks.as_strided(
         bg,
-        shape=(int(bg.shape[0] / (l_size - o_lap)), l_size, bg.shape[1]),
-        strides=(bg.strides[0] * (l_size - o_lap), bg.strides[0], bg.strides[1])
+        shape=(nb_sequences, l_size, bg.shape[1]),
+        strides=(bg.strides[0] * step, bg.strides[0], bg.strides[1])
     )
-    bg = bg[:-1, :, :]
 
     b_trim_frame = (mixture.shape[0] % b_size)
     if b_trim_frame != 0:
@@ -372,7 +511,7 @@ def _get_data_training(current_set, set_size, mixtures_list, sources_list,
 
 
 def _get_data_testing(sources_parent_path, window_values, fft_size, hop,
-                      seq_length, context_length, batch_size, usage_case):
+                      seq_length, context_length, batch_size, usage_case, stereo=None):
     """Gets the actual input and output data for testing.
 
     :param sources_parent_path: The parent path of the sources
@@ -391,6 +530,9 @@ def _get_data_testing(sources_parent_path, window_values, fft_size, hop,
     :type batch_size: int
     :param usage_case: Flag to indicate that currently we are just using it.
     :type usage_case: bool
+    :param stereo: The channels to be separated (`lr` or `ms`), or None\
+                   for the mono version.
+    :type stereo: str | None
     :return: The actual input and target value.
     :rtype: numpy.core.multiarray.ndarray
     """
@@ -403,18 +545,112 @@ def _get_data_testing(sources_parent_path, window_values, fft_size, hop,
         bg_true = np.sum(bass + drums + others, axis=-1) * 0.5
         voice_true = np.sum(voice, axis=-1) * 0.5
         mix = np.sum(bass + drums + others + voice, axis=-1) * 0.5
-    else:
+    elif stereo is None:
         mix = wav_read(sources_parent_path, mono=True)[0]
         voice_true = None
         bg_true = None
 
-    mix_magnitude, mix_phase = stft(mix, window_values, fft_size, hop)
+        # A mono file is read with one column
+        if mix.ndim == 2:
+            mix = mix[:, 0]
+    else:
+        mix = _stereo_channels(wav_read(sources_parent_path, mono=False)[0], stereo)
+        voice_true = None
+        bg_true = None
+
+    if stereo is None:
+        mix_magnitude, mix_phase = stft(mix, window_values, fft_size, hop)
+
+        # Data reshaping (magnitude and phase)
+        mix_magnitude, mix_phase, _ = _make_overlap_sequences(
+            mix_magnitude, mix_phase, mix_phase,
+            seq_length, context_length * 2, batch_size, inference=True)
+    else:
+        # The sequences of all the channels, to be predicted together
+        channels = []
+        for channel in mix.T:
+            channel_magnitude, channel_phase = stft(channel, window_values, fft_size, hop)
+            channels.append(_make_overlap_sequences(
+                channel_magnitude, channel_phase, channel_phase,
+                seq_length, context_length * 2, batch_size, inference=True)[:2])
 
-    # Data reshaping (magnitude and phase)
-    mix_magnitude, mix_phase, _ = _make_overlap_sequences(
-        mix_magnitude, mix_phase, mix_phase,
-        seq_length, context_length * 2, batch_size)
+        mix_magnitude = np.concatenate([magnitude for magnitude, _ in channels])
+        mix_phase = np.concatenate([phase for _, phase in channels])
 
     return mix, mix_magnitude, mix_phase, voice_true, bg_true
 
+
+def _stereo_channels(samples, stereo):
+    """Makes the channels to be separated from the samples of a file.
+
+    :param samples: The samples, with a column per channel (or 1-D for\
+                    mono files).
+    :type samples: numpy.core.multiarray.ndarray
+    :param stereo: `lr` for the channels as they are, or `ms` for the mid\
+                   (i.e. the mono version) and the side of two channels.
+    :type stereo: str
+    :return: The channels, as columns.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+
+    if stereo == 'ms' and samples.shape[1] == 2:
+        return np.stack([
+            (samples[:, 0] + samples[:, 1]) * 0.5,
+            (samples[:, 0] - samples[:, 1]) * 0.5
+        ], axis=1)
+
+    return samples
+
+
+def _synthesize_channels(voice_predicted, mix, mix_phase, window_size, hop, context_length,
+                         stereo):
+    """Synthesizes the voice and the background music of each channel,\
+    as :func:`data_process_results_testing` does for one channel.
+
+    :param voice_predicted: The predicted voice, with the sequences of the\
+                            channels one after the other.
+    :type voice_predicted: numpy.core.multiarray.ndarray
+    :param mix: The mixture, with a column per channel.
+    :type mix: numpy.core.multiarray.ndarray
+    :param mix_phase: The mixture phase, with the sequences of the channels\
+                      one after the other.
+    :type mix_phase: numpy.core.multiarray.ndarray
+    :param window_size: The window size in samples.
+    :type window_size: int
+    :param hop: The hop size in samples.
+    :type hop: int
+    :param context_length: The context length in frames.
+    :type context_length: int
+    :param stereo: The channels (`lr` or `ms`). The mid and side are\
+                   converted back to left and right.
+    :type stereo: str
+    :return: The voice and the background music, with a column per channel.
+    :rtype: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+    """
+    nb_channels = mix.shape[1]
+    voice_hat = []
+
+    for voice_channel, phase_channel in zip(
+            np.split(voice_predicted, nb_channels), np.split(mix_phase, nb_channels)):
+        voice_channel = voice_channel.reshape(-1, window_size)
+        _, phase_channel = _context_based_reshaping(
+            phase_channel, phase_channel, context_length, window_size)
+
+        voice_hat.append(i_stft(voice_channel, phase_channel, window_size, hop))
+
+    # Removing the samples that no estimation exists
+    mix = mix[context_length * hop:]
+    min_len = min(len(mix), len(voice_hat[0]))
+
+    voice_hat = np.stack([channel[:min_len] for channel in voice_hat], axis=1)
+    bg_hat = mix[:min_len] - voice_hat
+
+    if stereo == 'ms' and nb_channels == 2:
+        voice_hat = np.stack([voice_hat[:, 0] + voice_hat[:, 1], voice_hat[:, 0] - voice_hat[:, 1]], axis=1)
+        bg_hat = np.stack([bg_hat[:, 0] + bg_hat[:, 1], bg_hat[:, 0] - bg_hat[:, 1]], axis=1)
+
+    return voice_hat, bg_hat
+
 # EOF
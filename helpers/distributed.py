@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Data-parallel training with `torch.distributed` (gloo backend, CPU).
+
+Each process (rank) has its own copy of the modules and of the optimizer,\
+and gets only its shard of the training data. After the backward pass,\
+the gradients are averaged over the processes, with one all-reduce of all\
+of them (flattened to one buffer). Thus, all the processes clip the same\
+gradients and make the same optimizer step, and their parameters stay\
+the same.
+
+The processes can have a different amount of batches in an epoch. A\
+process without a batch takes part in the all-reduce with zero gradients,\
+and the gradients are averaged over the processes that had a batch. The\
+epoch ends when no process has a batch.
+"""
+
+import torch
+import torch.distributed as dist
+from torch.autograd import Variable
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['init_distributed', 'broadcast_parameters', 'all_reduce_gradients', 'all_reduce_sums',
+           'all_gather_values']
+
+
+def init_distributed(rank, world_size, init_method, backend='gloo'):
+    """Initializes the process group of the distributed training.
+
+    :param rank: The rank of the process.
+    :type rank: int
+    :param world_size: The amount of processes.
+    :type world_size: int
+    :param init_method: The URL of the initialization, e.g.\
+                        `tcp://127.0.0.1:29500`.
+    :type init_method: str
+    :param backend: The backend of `torch.distributed`.
+    :type backend: str
+    """
+    dist.init_process_group(backend, init_method=init_method, world_size=world_size, rank=rank)
+
+
+def broadcast_parameters(parameters):
+    """Copies the parameters of the process with rank 0 to all the\
+    processes, so that all of them start from the same parameters.
+
+    :param parameters: The parameters.
+    :type parameters: list[torch.nn.Parameter]
+    """
+    for parameter in parameters:
+        dist.broadcast(parameter.data, 0)
+
+
+def all_reduce_gradients(parameters, has_batch):
+    """Averages the gradients of the parameters over the processes that\
+    had a batch.
+
+    :param parameters: The parameters, in the same order at all the processes.
+    :type parameters: list[torch.nn.Parameter]
+    :param has_batch: If this process had a batch. If not, its gradients\
+                      are taken as zero.
+    :type has_batch: bool
+    :return: The amount of processes that had a batch.
+    :rtype: int
+    """
+    for parameter in parameters:
+        if parameter.grad is None:
+            parameter.grad = Variable(parameter.data.new(parameter.data.size()).zero_())
+        elif not has_batch:
+            parameter.grad.data.zero_()
+
+    # All the gradients and the count of processes with a batch, at one buffer
+    flat = torch.cat(
+        [parameter.grad.data.contiguous().view(-1) for parameter in parameters] +
+        [parameters[0].data.new([1. if has_batch else 0.])]
+    )
+
+    dist.all_reduce(flat)
+
+    nb_ranks = int(round(float(flat[-1])))
+
+    if nb_ranks > 0:
+        flat /= nb_ranks
+
+        offset = 0
+        for parameter in parameters:
+            numel = parameter.grad.data.numel()
+            parameter.grad.data.copy_(flat[offset:offset + numel].view_as(parameter.grad.data))
+            offset += numel
+
+    return nb_ranks
+
+
+def all_reduce_sums(values):
+    """Sums values over the processes.
+
+    :param values: The values of this process.
+    :type values: list[float]
+    :return: The sums.
+    :rtype: list[float]
+    """
+    sums = torch.DoubleTensor(values)
+    dist.all_reduce(sums)
+
+    return sums.tolist()
+
+
+def all_gather_values(values):
+    """Gathers the values of all the processes.
+
+    :param values: The values of this process. All the processes must\
+                   have the same amount of values.
+    :type values: list[float]
+    :return: The values of each process, in the order of their ranks.
+    :rtype: list[list[float]]
+    """
+    values = torch.DoubleTensor(values)
+    gathered = [values.new(values.size()) for _ in range(dist.get_world_size())]
+    dist.all_gather(gathered, values)
+
+    return [rank_values.tolist() for rank_values in gathered]
+
+# EOF
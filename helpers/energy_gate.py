@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Energy-gated inference, for recordings with silent or near-silent parts.
+
+The sequences with all their frames (context frames included) below a\
+level threshold are not given to the MaD. Their predicted voice magnitude\
+is zero, i.e. their voice is silent and their background music is the\
+mixture. The level of a frame is the one of the mixture magnitude, in dB\
+relative to full scale (i.e. 10 * log10 of the mean square of the\
+windowed samples, with -3 dB for a full scale sine).
+"""
+
+import time
+
+import numpy as np
+from scipy.signal import hamming
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['EnergyGate', 'frame_levels']
+
+
+def frame_levels(mix_magnitude, window_size):
+    """Calculates the level of each frame of the mixture magnitude.
+
+    :param mix_magnitude: The mixture magnitude, as given by\
+                          :func:`helpers.signal_transforms.stft`, of any\
+                          shape with the frequency bins last.
+    :type mix_magnitude: numpy.core.multiarray.ndarray
+    :param window_size: The window size in samples.
+    :type window_size: int
+    :return: The levels in dB.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    # Half of the energy of the window, as the spectrum is one-sided
+    window_energy = np.sum(hamming(window_size, True) ** 2) / 2.
+
+    with np.errstate(divide='ignore'):
+        return 10. * np.log10(np.sum(np.square(mix_magnitude, dtype=np.float64), axis=-1) / window_energy)
+
+
+class EnergyGate(object):
+    def __init__(self, mad, threshold, window_size, context_length):
+        """Predicts the voice magnitude with the `mad`, only for the\
+        sequences with a frame at or above the `threshold`.
+
+        :param mad: The MaD.
+        :type mad: modules.MaD
+        :param threshold: The level threshold in dB.
+        :type threshold: float
+        :param window_size: The window size in samples.
+        :type window_size: int
+        :param context_length: The context length in frames.
+        :type context_length: int
+        """
+        self._mad = mad
+        self._window_size = window_size
+        self._context_length = context_length
+
+        self.threshold = threshold
+        self.nb_sequences = 0
+        self.nb_skipped = 0
+        self.predict_time = 0.
+
+    def predict(self, mix_magnitude, batch_size):
+        """As :meth:`modules.MaD.predict`. The batches have only the\
+        sequences above the threshold.
+
+        :param mix_magnitude: The overlapping sequences of the mixture magnitude.
+        :type mix_magnitude: numpy.core.multiarray.ndarray
+        :param batch_size: The batch size.
+        :type batch_size: int
+        :return: The predicted voice magnitude, without the context frames.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        return self._gate(mix_magnitude, lambda active: self._mad.predict(active, batch_size))
+
+    def predict_batch(self, mix_magnitude):
+        """As :meth:`modules.MaD.predict_batch`.
+
+        :param mix_magnitude: The batch of sequences of the mixture magnitude.
+        :type mix_magnitude: numpy.core.multiarray.ndarray
+        :return: The predicted voice magnitude, without the context frames.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        return self._gate(mix_magnitude, self._mad.predict_batch)
+
+    def time_saved(self):
+        """Estimates the time that the skipped sequences would take, from\
+        the mean time of the predicted ones.
+
+        :return: The time in seconds.
+        :rtype: float
+        """
+        nb_predicted = self.nb_sequences - self.nb_skipped
+
+        return self.nb_skipped * self.predict_time / nb_predicted if nb_predicted > 0 else 0.
+
+    def _gate(self, mix_magnitude, predict):
+        """Predicts the voice magnitude of the sequences above the threshold.
+
+        :param mix_magnitude: The overlapping sequences of the mixture magnitude.
+        :type mix_magnitude: numpy.core.multiarray.ndarray
+        :param predict: The function that predicts the voice magnitude of\
+                        the given sequences.
+        :type predict: callable
+        :return: The predicted voice magnitude, without the context frames.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        active = np.max(frame_levels(mix_magnitude, self._window_size), axis=1) >= self.threshold
+
+        voice_predicted = np.zeros(
+            (
+                mix_magnitude.shape[0],
+                mix_magnitude.shape[1] - self._context_length * 2,
+                mix_magnitude.shape[2]
+            ),
+            dtype=np.float32
+        )
+
+        if active.any():
+            s_time = time.time()
+            voice_predicted[active] = predict(np.ascontiguousarray(mix_magnitude[active]))
+            self.predict_time += time.time() - s_time
+
+        self.nb_sequences += len(active)
+        self.nb_skipped += int(np.sum(~active))
+
+        return voice_predicted
+
+# EOF
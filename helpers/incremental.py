@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Incremental re-separation of edited files.
+
+The mask store of a file (see :mod:`helpers.mask_store`) keeps also a\
+fingerprint (a hash) of each frame of the mixture, i.e. of its magnitude\
+and phase. When the file is separated again (e.g. after a fade or a\
+splice), only the sequences with a changed frame (context frames\
+included) are predicted, and the predicted voice magnitude of the rest\
+is taken from the store. Then, only the samples that the changed frames\
+overlap are synthesized again, and the rest of the samples are taken\
+from the previous outputs.
+
+The outputs are the same as the ones of a separation of the whole file,\
+because the sequences are predicted independently and the overlap-add\
+of a part of the frames is done in the same order as the one of all the\
+frames.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+from scipy.io.wavfile import read, write
+
+from helpers.data_feeder import data_feeder_testing
+from helpers.mask_store import save_mask
+from helpers.signal_transforms import overlap_add
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['frame_hashes', 'incremental_separate']
+
+
+def frame_hashes(mix_magnitude, mix_phase, step):
+    """Makes the fingerprints of the frames of the overlapping sequences\
+    of a mixture, i.e. of each frame once.
+
+    :param mix_magnitude: The overlapping sequences of the mixture magnitude.
+    :type mix_magnitude: numpy.core.multiarray.ndarray
+    :param mix_phase: The overlapping sequences of the mixture phase.
+    :type mix_phase: numpy.core.multiarray.ndarray
+    :param step: The step of the sequences in frames.
+    :type step: int
+    :return: The fingerprints of the frames.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    nb_sequences, seq_length = mix_magnitude.shape[:2]
+    frames = [(index, f_index) for index in range(nb_sequences) for f_index in range(step)]
+    frames.extend((nb_sequences - 1, f_index) for f_index in range(step, seq_length))
+
+    hashes = np.zeros(len(frames), dtype=np.uint64)
+
+    for frame, (index, f_index) in enumerate(frames):
+        frame_hash = hashlib.sha1(mix_magnitude[index, f_index].tobytes())
+        frame_hash.update(mix_phase[index, f_index].tobytes())
+        hashes[frame] = np.frombuffer(frame_hash.digest()[:8], dtype='<u8')[0]
+
+    return hashes
+
+
+def incremental_separate(predict, source, output_file_names, window_size, fft_size, hop,
+                         seq_length, context_length, batch_size, fingerprint, wav_quality):
+    """Separates a file again, using the mask store of its previous\
+    separation. Without a (matching) mask store, the whole file is\
+    separated. The new mask store is saved in `float32`, so that the\
+    predicted voice magnitude of the next separation is exact.
+
+    :param predict: The function that predicts the voice magnitude of\
+                    overlapping sequences, in batches (e.g.\
+                    :meth:`modules.MaD.predict`).
+    :type predict: callable
+    :param source: The file name.
+    :type source: str
+    :param output_file_names: The output file names, for the voice, the\
+                              background music, and the mask store.
+    :type output_file_names: list[str]
+    :param window_size: The window size in samples.
+    :type window_size: int
+    :param fft_size: The size of the FFT in samples.
+    :type fft_size: int
+    :param hop: The hop size in samples.
+    :type hop: int
+    :param seq_length: The sequence length in frames.
+    :type seq_length: int
+    :param context_length: The context length in frames.
+    :type context_length: int
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :param fingerprint: The fingerprint of the run (i.e. of the weights, the\
+                        hyper-parameters, and the settings). The mask store\
+                        of a different run is not used.
+    :type fingerprint: str
+    :param wav_quality: The sampling rate and the number of bits.
+    :type wav_quality: dict
+    :return: The duration of the file in seconds, the amount of predicted\
+             sequences, the amount of sequences, the amount of synthesized\
+             samples, and the amount of samples of the outputs.
+    :rtype: (float, int, int, int, int)
+    :raises ValueError: When the number of bits is not 16.
+    """
+    if wav_quality['nb_bits'] != 16:
+        raise ValueError('Could not handle {} number of bits'.format(wav_quality['nb_bits']))
+
+    step = seq_length - 2 * context_length
+
+    testing_it = data_feeder_testing(
+        window_size=window_size, fft_size=fft_size, hop_size=hop, seq_length=seq_length,
+        context_length=context_length, batch_size=1, debug=False, sources_list=[source]
+    )
+
+    mix, mix_magnitude, mix_phase, _, _ = next(testing_it())
+
+    # The samples are subtracted from the 1-D voice, so a mono file read
+    # with one column must not broadcast against it
+    mix = mix.reshape(-1)
+
+    duration = len(mix) / float(wav_quality['sampling_rate'])
+    nb_sequences = mix_magnitude.shape[0]
+    hashes = frame_hashes(mix_magnitude, mix_phase, step)
+
+    # Removing the samples that no estimation exists
+    mix = mix[context_length * hop:]
+    min_len = min(len(mix), nb_sequences * step * hop + window_size - 6 * hop - 1)
+
+    previous = _load_previous(output_file_names, fingerprint, seq_length, context_length)
+
+    # The changed frames, and the sequences that have any of them
+    changed = np.ones(len(hashes), dtype=bool)
+    if previous is not None:
+        nb_common = min(len(hashes), len(previous['frame_hashes']))
+        changed[:nb_common] = hashes[:nb_common] != previous['frame_hashes'][:nb_common]
+
+    changed_sequences = [
+        index for index in range(nb_sequences)
+        if changed[index * step:index * step + seq_length].any()
+    ]
+
+    voice_predicted = np.zeros((nb_sequences * step, window_size), dtype=np.float32)
+    if previous is not None:
+        nb_common = min(len(voice_predicted), len(previous['voice_magnitude']))
+        voice_predicted[:nb_common] = previous['voice_magnitude'][:nb_common]
+
+    if len(changed_sequences) > 0:
+        predicted = predict(np.ascontiguousarray(mix_magnitude[changed_sequences]), batch_size)
+
+        for index, sequence in zip(changed_sequences, predicted):
+            voice_predicted[index * step:(index + 1) * step] = sequence
+
+    phase = np.ascontiguousarray(mix_phase[:, context_length:-context_length, :], dtype=np.float32)
+    phase.shape = (phase.shape[0] * phase.shape[1], window_size)
+
+    # The samples that the predicted frames overlap, the samples that are
+    # not in the previous outputs, and the samples of a changed mixture
+    affected = np.zeros(min_len, dtype=bool)
+    for index in changed_sequences:
+        affected[max(index * step * hop - 3 * hop, 0):
+                 ((index + 1) * step - 1) * hop + window_size - 3 * hop] = True
+
+    voice = np.zeros(min_len, dtype=np.int16)
+    bg = np.zeros(min_len, dtype=np.int16)
+
+    if previous is not None:
+        nb_common = min(min_len, len(previous['mix']))
+        affected[nb_common:] = True
+        affected[:nb_common] |= mix[:nb_common] != previous['mix'][:nb_common]
+
+        voice[:nb_common] = previous['voice'][:nb_common]
+        bg[:nb_common] = previous['bg'][:nb_common]
+
+    for start, end in _ranges(affected):
+        voice_hat = _synthesize(voice_predicted, phase, start + 3 * hop, end + 3 * hop, window_size, hop)
+        voice[start:end] = np.int16(voice_hat * (2 ** 15 - 1))
+        bg[start:end] = np.int16((mix[start:end] - voice_hat) * (2 ** 15 - 1))
+
+    write(output_file_names[0], wav_quality['sampling_rate'], voice)
+    write(output_file_names[1], wav_quality['sampling_rate'], bg)
+
+    save_mask(
+        output_file_names[2], voice_predicted, phase, mix[:min_len], window_size, hop,
+        wav_quality['sampling_rate'], dtype='float32', frame_hashes=hashes,
+        fingerprint=fingerprint, seq_length=seq_length, context_length=context_length
+    )
+
+    return duration, len(changed_sequences), nb_sequences, int(np.sum(affected)), min_len
+
+
+def _load_previous(output_file_names, fingerprint, seq_length, context_length):
+    """Loads the mask store and the outputs of the previous separation.
+
+    :param output_file_names: The output file names, for the voice, the\
+                              background music, and the mask store.
+    :type output_file_names: list[str]
+    :param fingerprint: The fingerprint of the run.
+    :type fingerprint: str
+    :param seq_length: The sequence length in frames.
+    :type seq_length: int
+    :param context_length: The context length in frames.
+    :type context_length: int
+    :return: The frame fingerprints, the predicted voice magnitude, the\
+             mixture, and the voice and background music samples, or None\
+             if there is no mask store of the same run with fingerprints.
+    :rtype: dict | None
+    """
+    if not all(os.path.isfile(file_name) for file_name in output_file_names):
+        return None
+
+    with np.load(output_file_names[2]) as store:
+        if 'frame_hashes' not in store.files or store['voice_magnitude'].dtype != np.float32 or \
+                str(store['fingerprint']) != fingerprint or \
+                int(store['seq_length']) != seq_length or \
+                int(store['context_length']) != context_length:
+            return None
+
+        previous = {
+            'frame_hashes': store['frame_hashes'],
+            'voice_magnitude': store['voice_magnitude'],
+            'mix': store['mix']
+        }
+
+    previous['voice'] = read(output_file_names[0])[1]
+    previous['bg'] = read(output_file_names[1])[1]
+
+    if previous['voice'].dtype != np.int16 or previous['bg'].dtype != np.int16 or \
+            not len(previous['voice']) == len(previous['bg']) == len(previous['mix']):
+        return None
+
+    return previous
+
+
+def _ranges(mask):
+    """Gives the ranges of consecutive True values of a mask.
+
+    :param mask: The mask.
+    :type mask: numpy.core.multiarray.ndarray
+    :return: The start (inclusive) and end (exclusive) of each range.
+    :rtype: list[(int, int)]
+    """
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def _synthesize(magnitude_spect, phase, start, end, window_size, hop):
+    """Synthesizes the samples from `start` to `end` of the overlap-add of\
+    all the frames, with only the frames that overlap them. The additions\
+    are in the same order as in :func:`helpers.signal_transforms.i_stft`.
+
+    :param magnitude_spect: Magnitude spectrum.
+    :type magnitude_spect: numpy.core.multiarray.ndarray
+    :param phase: Phase spectrum.
+    :type phase: numpy.core.multiarray.ndarray
+    :param start: The first sample.
+    :type start: int
+    :param end: The sample after the last one.
+    :type end: int
+    :param window_size: Synthesis window size in samples.
+    :type window_size: int
+    :param hop: Hop size in samples.
+    :type hop: int
+    :return: The samples.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    f_start = max((start - window_size) // hop + 1, 0)
+    f_end = min((end - 1) // hop + 1, magnitude_spect.shape[0])
+
+    time_domain_signal = np.zeros(end - f_start * hop + window_size)
+
+    overlap_add(time_domain_signal, magnitude_spect[f_start:f_end], phase[f_start:f_end],
+                window_size, hop)
+
+    return time_domain_signal[start - f_start * hop:end - f_start * hop]
+
+# EOF
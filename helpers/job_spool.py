@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A durable spool of separation jobs, in an SQLite database.
+
+Each job is one input file. Workers (possibly at different processes)\
+claim the jobs atomically, and record their completion or failure.\
+Failed jobs are claimed again, up to a maximum amount of attempts.
+"""
+
+import os
+import socket
+import sqlite3
+import time
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['JobSpool', 'job_statuses']
+
+job_statuses = ('pending', 'running', 'done', 'failed')
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    duration REAL,
+    process_time REAL,
+    error TEXT,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+'''
+
+
+class JobSpool(object):
+    def __init__(self, file_name):
+        """A job spool at the SQLite database `file_name`. The database is\
+        created if it does not exist.
+
+        :param file_name: The file name of the database.
+        :type file_name: str
+        """
+        directory = os.path.dirname(file_name)
+        if directory != '' and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        # Transactions are explicit, so that claiming a job is atomic
+        self._connection = sqlite3.connect(file_name, timeout=60, isolation_level=None)
+        self._connection.executescript(_schema)
+        self.worker = '{}:{}'.format(socket.gethostname(), os.getpid())
+
+    def close(self):
+        """Closes the database.
+        """
+        self._connection.close()
+
+    def enqueue(self, sources):
+        """Adds jobs for the `sources`. Files that already have a job are\
+        not added again.
+
+        :param sources: The file names.
+        :type sources: list[str]
+        :return: The amount of added jobs.
+        :rtype: int
+        """
+        now = time.time()
+
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            nb_before = self._count()
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO jobs (source, enqueued_at) VALUES (?, ?)',
+                [(source, now) for source in sources]
+            )
+            nb_added = self._count() - nb_before
+            self._connection.execute('COMMIT')
+        except Exception:
+            self._connection.execute('ROLLBACK')
+            raise
+
+        return nb_added
+
+    def claim(self, max_attempts):
+        """Claims the next job, i.e. the first pending job or, if there is\
+        none, the first failed job with less than `max_attempts` attempts.
+
+        :param max_attempts: The maximum amount of attempts for a job.
+        :type max_attempts: int
+        :return: The id and the file name of the job, or None if there are\
+                 no jobs to claim.
+        :rtype: (int, str) | None
+        """
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            job = self._connection.execute(
+                "SELECT id, source FROM jobs WHERE status = 'pending' OR "
+                "(status = 'failed' AND attempts < ?) "
+                "ORDER BY status = 'failed', id LIMIT 1",
+                (max_attempts,)
+            ).fetchone()
+
+            if job is not None:
+                self._connection.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, "
+                    "started_at = ?, finished_at = NULL WHERE id = ?",
+                    (self.worker, time.time(), job[0])
+                )
+            self._connection.execute('COMMIT')
+        except Exception:
+            self._connection.execute('ROLLBACK')
+            raise
+
+        return job
+
+    def complete(self, job_id, duration, process_time):
+        """Records that a job is done, if it is still running at this worker\
+        (i.e. it was not set back to pending meanwhile).
+
+        :param job_id: The id of the job.
+        :type job_id: int
+        :param duration: The duration of the file, in seconds.
+        :type duration: float
+        :param process_time: The processing time, in seconds.
+        :type process_time: float
+        :return: If the job was recorded as done.
+        :rtype: bool
+        """
+        return self._connection.execute(
+            "UPDATE jobs SET status = 'done', duration = ?, process_time = ?, error = NULL, "
+            "finished_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (duration, process_time, time.time(), job_id, self.worker)
+        ).rowcount > 0
+
+    def fail(self, job_id, error):
+        """Records that a job failed, if it is still running at this worker\
+        (i.e. it was not set back to pending meanwhile).
+
+        :param job_id: The id of the job.
+        :type job_id: int
+        :param error: The error.
+        :type error: str
+        :return: If the job was recorded as failed.
+        :rtype: bool
+        """
+        return self._connection.execute(
+            "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (error, time.time(), job_id, self.worker)
+        ).rowcount > 0
+
+    def requeue(self, statuses, max_age=0):
+        """Sets jobs back to pending, e.g. the running jobs of workers that\
+        crashed, or failed jobs after a fix. The attempts are reset.
+
+        :param statuses: The statuses of the jobs to be set back to pending.
+        :type statuses: list[str]
+        :param max_age: Only jobs started more than `max_age` seconds ago are\
+                        set back to pending.
+        :type max_age: float
+        :return: The amount of jobs set back to pending.
+        :rtype: int
+        """
+        return self._connection.execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, worker = NULL WHERE status IN "
+            "({}) AND IFNULL(started_at, 0) <= ?".format(','.join('?' * len(statuses))),
+            list(statuses) + [time.time() - max_age]
+        ).rowcount
+
+    def stats(self, max_attempts):
+        """Gives the statistics of the spool.
+
+        The throughput is the amount of done jobs (and of audio duration) per\
+        second, from the start of the first done job to the end of the last\
+        one. The estimated time to finish the remaining jobs is based on it.
+
+        :param max_attempts: The maximum amount of attempts for a job, for\
+                             counting the failed jobs that will be retried.
+        :type max_attempts: int
+        :return: The statistics.
+        :rtype: dict
+        """
+        counts = dict(self._connection.execute(
+            'SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        nb_retriable = self._connection.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = 'failed' AND attempts < ?",
+            (max_attempts,)
+        ).fetchone()[0]
+        first_start, last_end, total_duration, total_process_time = self._connection.execute(
+            "SELECT MIN(started_at), MAX(finished_at), SUM(duration), SUM(process_time) "
+            "FROM jobs WHERE status = 'done'"
+        ).fetchone()
+
+        stats = {status: counts.get(status, 0) for status in job_statuses}
+        stats.update({
+            'retriable': nb_retriable,
+            'remaining': stats['pending'] + stats['running'] + nb_retriable,
+            'done_duration': total_duration or 0.,
+            'done_process_time': total_process_time or 0.,
+            'throughput': None, 'throughput_duration': None, 'eta': None
+        })
+
+        if stats['done'] > 0 and last_end > first_start:
+            elapsed = last_end - first_start
+            stats['throughput'] = stats['done'] / elapsed
+            stats['throughput_duration'] = stats['done_duration'] / elapsed
+            stats['eta'] = stats['remaining'] / stats['throughput']
+
+        return stats
+
+    def errors(self, limit):
+        """Gives the last errors of the failed jobs.
+
+        :param limit: The maximum amount of errors.
+        :type limit: int
+        :return: The file names, attempts, and errors of the failed jobs.
+        :rtype: list[(str, int, str)]
+        """
+        return self._connection.execute(
+            "SELECT source, attempts, error FROM jobs WHERE status = 'failed' "
+            "ORDER BY finished_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+    def _count(self):
+        """Counts the jobs.
+
+        :return: The amount of jobs.
+        :rtype: int
+        """
+        return self._connection.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+# EOF
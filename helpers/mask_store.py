@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Storage of the predicted voice magnitude, for re-rendering separations.
+
+The store of one file has the predicted (i.e. denoised) voice magnitude,\
+the mixture phase, and the mixture, as a compressed .npz file. From it,\
+any combination of the voice and the background music is synthesized\
+with :func:`helpers.signal_transforms.i_stft`, without the MaD. With the\
+`float32` data type, the voice and the background music are the same as\
+the ones of the separation.
+"""
+
+import numpy as np
+
+from helpers.signal_transforms import i_stft
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['save_mask', 'render_mask']
+
+
+def save_mask(file_name, voice_magnitude, mix_phase, mix, window_size, hop, sampling_rate,
+              dtype='float16', **extra):
+    """Saves the store of one file.
+
+    :param file_name: The file name of the store (.npz).
+    :type file_name: str
+    :param voice_magnitude: The predicted voice magnitude, without the\
+                            context frames.
+    :type voice_magnitude: numpy.core.multiarray.ndarray
+    :param mix_phase: The mixture phase of the frames of `voice_magnitude`.
+    :type mix_phase: numpy.core.multiarray.ndarray
+    :param mix: The mixture, from the first sample of the voice on.
+    :type mix: numpy.core.multiarray.ndarray
+    :param window_size: The window size in samples.
+    :type window_size: int
+    :param hop: The hop size in samples.
+    :type hop: int
+    :param sampling_rate: The sampling rate.
+    :type sampling_rate: int
+    :param dtype: The data type of the magnitude and the phase, i.e.\
+                  `float16` (half the size) or `float32` (exact).
+    :type dtype: str
+    :param extra: Other values to be saved, e.g. the fingerprints of the\
+                  frames (see :mod:`helpers.incremental`).
+    :type extra: dict
+    """
+    np.savez_compressed(
+        file_name,
+        voice_magnitude=voice_magnitude.astype(dtype),
+        mix_phase=mix_phase.astype(dtype),
+        # The mixture is kept exact along with an exact magnitude
+        mix=mix.astype(np.float64 if dtype == 'float32' else np.float32),
+        window_size=window_size, hop=hop, sampling_rate=sampling_rate, **extra
+    )
+
+
+def render_mask(file_name, voice_gain=1., bg_gain=1.):
+    """Synthesizes a combination of the voice and the background music\
+    from the store of one file.
+
+    :param file_name: The file name of the store (.npz).
+    :type file_name: str
+    :param voice_gain: The gain of the voice (linear).
+    :type voice_gain: float
+    :param bg_gain: The gain of the background music (linear).
+    :type bg_gain: float
+    :return: The combination and the sampling rate.
+    :rtype: (numpy.core.multiarray.ndarray, int)
+    """
+    with np.load(file_name) as store:
+        mix = store['mix'].astype(np.float64)
+        voice_hat = i_stft(
+            store['voice_magnitude'].astype(np.float32), store['mix_phase'].astype(np.float32),
+            int(store['window_size']), int(store['hop'])
+        )[:len(mix)]
+        sampling_rate = int(store['sampling_rate'])
+
+    # The background music as at the separation
+    bg_hat = mix - voice_hat
+
+    if bg_gain == 0:
+        return voice_gain * voice_hat, sampling_rate
+    elif voice_gain == 0:
+        return bg_gain * bg_hat, sampling_rate
+
+    return voice_gain * voice_hat + bg_gain * bg_hat, sampling_rate
+
+# EOF
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Calculation of the separation metrics, inline or at a pool of\
+worker processes.
+
+The fast metrics (SDR and SI-SDR) are calculated on the frames of the\
+BSS-eval (30 seconds long, with a hop of 15 seconds), but without the\
+distortion filters of the BSS-eval. Thus, they are only for quick checks.\
+The BSS-eval metrics are the official ones.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from multiprocessing import Pool
+from operator import itemgetter
+
+import numpy as np
+from mir_eval import separation as bss_eval
+from numpy.lib import stride_tricks
+
+from helpers.settings import wav_quality
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['bss_eval_metrics', 'fast_metrics', 'MetricsPool']
+
+_get_me_the_metrics = itemgetter(0, 2)
+
+# The frames of the framewise BSS-eval of mir_eval
+_frame_length = 30 * wav_quality['sampling_rate']
+_frame_hop = 15 * wav_quality['sampling_rate']
+
+
+def bss_eval_metrics(references, estimates):
+    """Calculates the framewise SDR and SIR with the BSS-eval images.
+
+    :param references: The true signals (voice and background music).
+    :type references: list[numpy.core.multiarray.ndarray]
+    :param estimates: The estimated signals, in the order of the references.
+    :type estimates: list[numpy.core.multiarray.ndarray]
+    :return: The SDR and SIR for each of the frames, for each of the signals.
+    :rtype: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+    """
+    return _get_me_the_metrics(bss_eval.bss_eval_images_framewise(references, estimates))
+
+
+def fast_metrics(references, estimates):
+    """Calculates the framewise SDR and scale-invariant SDR (SI-SDR),\
+    on the frames of the framewise BSS-eval.
+
+    As with the BSS-eval, the metrics of a frame where any of the signals\
+    is silent are NaN, and the whole signals are one frame if they are\
+    too short for two frames.
+
+    :param references: The true signals (voice and background music).
+    :type references: list[numpy.core.multiarray.ndarray]
+    :param estimates: The estimated signals, in the order of the references.
+    :type estimates: list[numpy.core.multiarray.ndarray]
+    :return: The SDR and SI-SDR for each of the frames, for each of the signals.
+    :rtype: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+    """
+    references = np.asarray(references, dtype=np.float64)
+    estimates = np.asarray(estimates, dtype=np.float64)
+    errors = references - estimates
+
+    nb_frames = int(np.floor((references.shape[1] - _frame_length + _frame_hop) / _frame_hop))
+
+    if nb_frames < 2:
+        references, estimates, errors = [
+            signals[:, np.newaxis, :] for signals in (references, estimates, errors)
+        ]
+    else:
+        references, estimates, errors = [
+            stride_tricks.as_strided(
+                signals,
+                shape=(signals.shape[0], nb_frames, _frame_length),
+                strides=(signals.strides[0], signals.strides[1] * _frame_hop, signals.strides[1]),
+                writeable=False
+            ) for signals in (references, estimates, errors)
+        ]
+
+    references_energy = np.einsum('ijk,ijk->ij', references, references)
+    estimates_energy = np.einsum('ijk,ijk->ij', estimates, estimates)
+    errors_energy = np.einsum('ijk,ijk->ij', errors, errors)
+    correlation = np.einsum('ijk,ijk->ij', references, estimates)
+
+    silent = np.any(np.all(references == 0, axis=-1), axis=0) | \
+        np.any(np.all(estimates == 0, axis=-1), axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # The scaled reference is the projection of the estimate on the reference
+        target_energy = correlation ** 2 / references_energy
+        residual_energy = np.maximum(estimates_energy - target_energy, np.finfo(np.float64).tiny)
+
+        sdr = 10 * np.log10(references_energy / errors_energy)
+        si_sdr = 10 * np.log10(target_energy / residual_energy)
+
+    sdr[:, silent] = np.nan
+    si_sdr[:, silent] = np.nan
+
+    return sdr, si_sdr
+
+
+def _metrics_from_file(file_name, metrics_function):
+    """Calculates the metrics of the signals at a file, at a worker of the pool.
+
+    :param file_name: The .npy file with the references and the estimates,\
+                      stacked in this order.
+    :type file_name: str
+    :param metrics_function: The function that calculates the metrics.
+    :type metrics_function: callable
+    :return: The two metrics for each of the frames, for each of the signals.
+    :rtype: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+    """
+    signals = np.load(file_name, mmap_mode='r')
+    nb_signals = signals.shape[0] // 2
+
+    try:
+        return metrics_function(
+            [np.asarray(signal) for signal in signals[:nb_signals]],
+            [np.asarray(signal) for signal in signals[nb_signals:]]
+        )
+    finally:
+        del signals
+        os.remove(file_name)
+
+
+class MetricsPool(object):
+    def __init__(self, nb_workers, metrics_function=bss_eval_metrics, max_pending=None):
+        """A pool of worker processes that calculate the metrics of\
+        the tracks, while the main process goes on with the next tracks.
+
+        The signals are given to the workers through temporary .npy files,\
+        which are memory mapped by the workers and removed after the\
+        calculation. At most `max_pending` tracks wait for their metrics,\
+        so that the temporary files do not fill the disk when the metrics\
+        are slower than the inference.
+
+        :param nb_workers: The amount of worker processes.
+        :type nb_workers: int
+        :param metrics_function: The function that calculates the metrics,\
+                                 i.e. :func:`bss_eval_metrics` or :func:`fast_metrics`.
+        :type metrics_function: callable
+        :param max_pending: The maximum amount of submitted tracks that wait\
+                            for their metrics. If None, two per worker.
+        :type max_pending: int | None
+        """
+        self._metrics_function = metrics_function
+        self._pool = Pool(processes=nb_workers)
+        self._pending = threading.BoundedSemaphore(
+            2 * nb_workers if max_pending is None else max_pending)
+        self._temp_dir = tempfile.mkdtemp(prefix='mad_metrics_')
+        self._results = {}
+
+    def submit(self, index, references, estimates):
+        """Submits the signals of a track for the calculation of the metrics.\
+        Waits while the maximum amount of tracks wait for their metrics.
+
+        :param index: The index of the track.
+        :type index: int
+        :param references: The true signals (voice and background music).
+        :type references: list[numpy.core.multiarray.ndarray]
+        :param estimates: The estimated signals, in the order of the references.
+        :type estimates: list[numpy.core.multiarray.ndarray]
+        """
+        self._pending.acquire()
+
+        try:
+            file_name = os.path.join(self._temp_dir, '{:04d}.npy'.format(index))
+            np.save(file_name, np.stack(references + estimates))
+
+            self._results[index] = self._pool.apply_async(
+                _metrics_from_file, (file_name, self._metrics_function),
+                callback=self._release, error_callback=self._release)
+        except Exception:
+            self._pending.release()
+            raise
+
+    def ready(self):
+        """Gives the metrics of the submitted tracks that are finished,\
+        without waiting for the rest.
+
+        :return: An iterator yielding the index of each finished track and\
+                 its two metrics (e.g. SDR and SIR).
+        :rtype: collections.Iterable[(int, numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)]
+        """
+        for index in sorted(self._results):
+            if self._results[index].ready():
+                first_metric, second_metric = self._results.pop(index).get()
+                yield index, first_metric, second_metric
+
+    def gather(self):
+        """Waits for the metrics of all the submitted tracks.
+
+        :return: An iterator yielding, in the order of the indices, the\
+                 index of each track and its two metrics (e.g. SDR and SIR).
+        :rtype: collections.Iterable[(int, numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)]
+        """
+        for index in sorted(self._results):
+            first_metric, second_metric = self._results.pop(index).get()
+            yield index, first_metric, second_metric
+
+    def close(self):
+        """Stops the workers and removes the temporary files.
+        """
+        self._pool.terminate()
+        self._pool.join()
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+
+    def _release(self, _):
+        """Lets one more track be submitted, when the metrics of a track\
+        are calculated (and its temporary file is removed).
+
+        :param _: The result or the error of the calculation.
+        :type _: object
+        """
+        self._pending.release()
+
+# EOF
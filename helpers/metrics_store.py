@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""An appendable store of the per-frame metrics of the testing tracks.
+
+The store is a directory with one .npz file per track and an index file.\
+Each .npz file has one column (i.e. array) per metric and source (e.g.\
+`sdr_voice`, `sir_bg`). The index file has one JSON line per track, with\
+the track id, the amount of frames, the processing time, the .npz file\
+name, and the fingerprint of the run. A track is appended as soon as its\
+metrics are ready, so an interrupted run keeps the metrics of the finished\
+tracks.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['MetricsStore']
+
+_index_file_name = 'index.jsonl'
+_sources_names = ('voice', 'bg')
+
+
+class MetricsStore(object):
+    def __init__(self, directory):
+        """A store of per-frame metrics at the `directory`.
+
+        :param directory: The directory of the store. It is created if\
+                          it does not exist.
+        :type directory: str
+        """
+        self.directory = directory
+        self._index_path = os.path.join(directory, _index_file_name)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def clear(self):
+        """Removes all the tracks from the store.
+        """
+        for file_name in os.listdir(self.directory):
+            if file_name == _index_file_name or file_name.endswith('.npz'):
+                os.remove(os.path.join(self.directory, file_name))
+
+    def append(self, track_id, metrics, process_time, fingerprint=None):
+        """Appends the metrics of a track. If the track exists in the\
+        store, the new metrics replace the old ones.
+
+        :param track_id: The id of the track.
+        :type track_id: int
+        :param metrics: The metrics, with their names as keys (e.g. `sdr`)\
+                        and arrays of shape (sources, frames) as values, with\
+                        the voice and the background music as sources.
+        :type metrics: dict[str, numpy.core.multiarray.ndarray]
+        :param process_time: The processing time of the track, in seconds.
+        :type process_time: float
+        :param fingerprint: The fingerprint of the run (see :mod:`helpers.resume`).
+        :type fingerprint: str | None
+        """
+        columns = {}
+        for name, values in metrics.items():
+            for source_name, source_values in zip(_sources_names, values):
+                columns['{}_{}'.format(name, source_name)] = np.asarray(source_values, dtype=np.float64)
+
+        nb_frames = len(next(iter(columns.values())))
+        file_name = 'track_{:04d}.npz'.format(track_id)
+
+        # The .npz file is complete before the index points to it
+        tmp_path = os.path.join(self.directory, 'tmp_{}'.format(file_name))
+        np.savez(tmp_path, **columns)
+        os.replace(tmp_path, os.path.join(self.directory, file_name))
+
+        with self._open_index() as f:
+            f.write(json.dumps({
+                'track': track_id, 'frames': nb_frames,
+                'time': process_time, 'file': file_name,
+                'fingerprint': fingerprint
+            }) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def merge(self, other):
+        """Copies all the tracks of another store to this store. Tracks\
+        that exist in both stores are replaced.
+
+        :param other: The other store.
+        :type other: MetricsStore
+        :return: The ids of the copied tracks.
+        :rtype: list[int]
+        """
+        records = other.tracks()
+
+        for track_id in sorted(records):
+            record = records[track_id]
+            file_name = 'track_{:04d}.npz'.format(track_id)
+
+            tmp_path = os.path.join(self.directory, 'tmp_{}'.format(file_name))
+            shutil.copyfile(os.path.join(other.directory, record['file']), tmp_path)
+            os.replace(tmp_path, os.path.join(self.directory, file_name))
+
+            with self._open_index() as f:
+                f.write(json.dumps(dict(record, file=file_name)) + '\n')
+
+        return sorted(records)
+
+    def _open_index(self):
+        """Opens the index for appending. An incomplete last line (from an\
+        interrupted append) is ended first, so that the next record is on\
+        a line of its own.
+
+        :return: The index file, opened for appending.
+        :rtype: file
+        """
+        partial_line = False
+
+        if os.path.isfile(self._index_path) and os.path.getsize(self._index_path) > 0:
+            with open(self._index_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                partial_line = f.read(1) != b'\n'
+
+        f = open(self._index_path, 'a')
+
+        if partial_line:
+            f.write('\n')
+
+        return f
+
+    def tracks(self):
+        """Reads the index of the store.
+
+        :return: The records of the tracks, by track id. For a track\
+                 appended more than once, the last record is returned.
+        :rtype: dict[int, dict]
+        """
+        records = {}
+
+        if not os.path.isfile(self._index_path):
+            return records
+
+        with open(self._index_path) as f:
+            for line in f:
+                # An incomplete last line is from an interrupted append
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                records[record['track']] = record
+
+        return records
+
+    def read(self, column, track_ids=None):
+        """Reads one column for some tracks, without reading the other columns.
+
+        :param column: The column, e.g. `sdr_voice`.
+        :type column: str
+        :param track_ids: The ids of the tracks. If None, all tracks are read.
+        :type track_ids: list[int] | None
+        :return: The values of the column, by track id.
+        :rtype: dict[int, numpy.core.multiarray.ndarray]
+        """
+        records = self.tracks()
+
+        if track_ids is None:
+            track_ids = sorted(records)
+
+        values = {}
+        for track_id in track_ids:
+            with np.load(os.path.join(self.directory, records[track_id]['file'])) as track_file:
+                values[track_id] = track_file[column]
+
+        return values
+
+    def columns(self):
+        """Gives the columns of the store.
+
+        :return: The names of the columns.
+        :rtype: list[str]
+        """
+        records = self.tracks()
+
+        if len(records) == 0:
+            return []
+
+        with np.load(os.path.join(self.directory, next(iter(records.values()))['file'])) as track_file:
+            return sorted(track_file.files)
+
+    def median(self, column, track_ids=None):
+        """Calculates the median of a column over the frames of some\
+        tracks, ignoring the NaN values.
+
+        :param column: The column, e.g. `sdr_voice`.
+        :type column: str
+        :param track_ids: The ids of the tracks. If None, all tracks are used.
+        :type track_ids: list[int] | None
+        :return: The median.
+        :rtype: float
+        """
+        values = list(self.read(column, track_ids).values())
+
+        if len(values) == 0:
+            return np.nan
+
+        return float(np.nanmedian(np.concatenate(values)))
+
+# EOF
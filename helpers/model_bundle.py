@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Single-file bundle of the MaD weights and hyper-parameters.
+
+The bundle has the following layout:
+
+* 8 bytes of the magic string `MADTWIN\\x00`,
+* 8 bytes with the length of the header, as little-endian unsigned integer,
+* the header, as UTF-8 JSON, and
+* the weights, as raw tensors, each one starting at an offset that is\
+  multiple of 64 bytes.
+
+The header holds the version of the format, the hyper-parameters that\
+were used for the weights, and the dtype, shape, and offset of each tensor.\
+Reading the bundle is done with :class:`numpy.memmap`, i.e. there is no\
+unpickling and the pages of the file are shared between processes.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['write_bundle', 'read_bundle', 'bundle_version']
+
+bundle_version = 1
+
+_magic = b'MADTWIN\x00'
+_header_len_format = '<Q'
+_alignment = 64
+
+# The hyper-parameters that must match the ones used for the weights.
+_checked_hyper_parameters = [
+    'window_size', 'fft_size', 'hop_size', 'context_length',
+    'reduced_dim', 'original_input_dim', 'rnn_enc_output_dim'
+]
+
+
+def _aligned(offset):
+    """Rounds up an offset to the alignment of the bundle.
+
+    :param offset: The offset in bytes.
+    :type offset: int
+    :return: The aligned offset.
+    :rtype: int
+    """
+    return -(-offset // _alignment) * _alignment
+
+
+def write_bundle(file_name, weights, hyper_parameters):
+    """Writes the weights and the hyper-parameters to a bundle.
+
+    :param file_name: The file name of the bundle.
+    :type file_name: str
+    :param weights: The weights, with keys `<module>.<parameter>`.
+    :type weights: dict[str, numpy.core.multiarray.ndarray]
+    :param hyper_parameters: The hyper-parameters used for the weights.
+    :type hyper_parameters: dict
+    """
+    weights = {k: np.ascontiguousarray(v, dtype=np.float32) for k, v in weights.items()}
+    tensors = {}
+
+    # The offsets are relative to the end of the header, which is not
+    # yet known. They become absolute below, and the space reserved for
+    # the header accounts for the extra digits of the absolute offsets.
+    offset = 0
+    for name in sorted(weights.keys()):
+        offset = _aligned(offset)
+        tensors[name] = {
+            'dtype': weights[name].dtype.str,
+            'shape': list(weights[name].shape),
+            'offset': offset
+        }
+        offset += weights[name].nbytes
+
+    header = {'version': bundle_version, 'hyper_parameters': hyper_parameters, 'tensors': tensors}
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    data_start = _aligned(
+        len(_magic) + struct.calcsize(_header_len_format) +
+        len(header_bytes) + 20 * len(tensors)
+    )
+
+    for name in tensors.keys():
+        tensors[name]['offset'] += data_start
+
+    header_bytes = json.dumps(header, sort_keys=True).encode('utf-8')
+    header_end = len(_magic) + struct.calcsize(_header_len_format) + len(header_bytes)
+
+    if header_end > data_start:
+        raise ValueError('The header of the bundle does not fit in the reserved space.')
+
+    with open(file_name, 'wb') as f:
+        f.write(_magic)
+        f.write(struct.pack(_header_len_format, len(header_bytes)))
+        f.write(header_bytes)
+
+        for name in sorted(weights.keys()):
+            f.write(b'\x00' * (tensors[name]['offset'] - f.tell()))
+            f.write(weights[name].tobytes())
+
+
+def read_bundle(file_name, hyper_parameters=None):
+    """Reads a bundle, through memory mapping.
+
+    :param file_name: The file name of the bundle.
+    :type file_name: str
+    :param hyper_parameters: The hyper-parameters that the weights must\
+                             agree with. If None, no check is made.
+    :type hyper_parameters: dict | None
+    :return: The weights (read-only, memory mapped) and the header.
+    :rtype: (dict[str, numpy.core.multiarray.ndarray], dict)
+    :raises ValueError: When the file is not a bundle, its version is not\
+                        supported, or its hyper-parameters do not agree\
+                        with the `hyper_parameters`.
+    """
+    with open(file_name, 'rb') as f:
+        magic = f.read(len(_magic))
+        if magic != _magic:
+            raise ValueError('The file {} is not a MaD bundle.'.format(file_name))
+
+        header_len = struct.unpack(_header_len_format, f.read(struct.calcsize(_header_len_format)))[0]
+        header = json.loads(f.read(header_len).decode('utf-8'))
+
+    if header['version'] > bundle_version:
+        raise ValueError('The version {} of the bundle {} is not supported (max. {}).'.format(
+            header['version'], file_name, bundle_version))
+
+    if hyper_parameters is not None:
+        mismatches = ['{} (bundle: {}, settings: {})'.format(
+            k, header['hyper_parameters'].get(k), hyper_parameters[k])
+            for k in _checked_hyper_parameters
+            if header['hyper_parameters'].get(k) != hyper_parameters[k]]
+
+        if len(mismatches) > 0:
+            raise ValueError('The hyper-parameters of the bundle {} do not agree with '
+                             'the settings: {}.'.format(file_name, ', '.join(mismatches)))
+
+    data = np.memmap(file_name, dtype=np.uint8, mode='r').view(np.ndarray)
+    weights = {}
+
+    for name, tensor in header['tensors'].items():
+        dtype = np.dtype(tensor['dtype'])
+        nb_bytes = int(np.prod(tensor['shape'])) * dtype.itemsize
+        weights[name] = data[tensor['offset']:tensor['offset'] + nb_bytes].view(dtype).reshape(tensor['shape'])
+
+    return weights, header
+
+# EOF
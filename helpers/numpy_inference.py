@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""NumPy implementation of the inference (forward) pass of the MaD.
+
+It follows exactly the computations of the :mod:`modules` (i.e. the\
+:class:`modules.RNNEnc`, :class:`modules.RNNDec`, :class:`modules.FNNMasker`,\
+and :class:`modules.FNNDenoiser`), but it does not need PyTorch. All the\
+computations are vectorized over the batch and the input projections of\
+the GRUs are calculated for all time-steps with one GEMM.
+"""
+
+import numpy as np
+
+from helpers.model_bundle import read_bundle
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['NumpyMaD', 'load_npz_weights']
+
+
+def load_npz_weights(file_name):
+    """Loads the weights of the MaD from an .npz file.
+
+    The keys of the file are `<module>.<parameter>`, where `<module>` is\
+    one of `rnn_enc`, `rnn_dec`, `fnn`, and `denoiser`, and `<parameter>`\
+    is the name of the parameter in the `state_dict` of the module.
+
+    :param file_name: The file name of the .npz file.
+    :type file_name: str
+    :return: The weights.
+    :rtype: dict[str, numpy.core.multiarray.ndarray]
+    """
+    with np.load(file_name) as npz_file:
+        return {k: npz_file[k].astype(np.float32) for k in npz_file.files}
+
+
+def _sigmoid(x):
+    """Logistic sigmoid, computed through `tanh` for numerical stability.
+
+    :param x: The input.
+    :type x: numpy.core.multiarray.ndarray
+    :return: The sigmoid of the input.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    return .5 * (np.tanh(.5 * x) + 1.)
+
+
+class _GRUCell(object):
+    def __init__(self, weight_ih, weight_hh, bias_ih, bias_hh):
+        """The GRU cell, with the same parametrization as the\
+        :class:`torch.nn.GRUCell`.
+
+        :param weight_ih: The input-hidden weights (3 * hidden, input).
+        :type weight_ih: numpy.core.multiarray.ndarray
+        :param weight_hh: The hidden-hidden weights (3 * hidden, hidden).
+        :type weight_hh: numpy.core.multiarray.ndarray
+        :param bias_ih: The input-hidden bias.
+        :type bias_ih: numpy.core.multiarray.ndarray
+        :param bias_hh: The hidden-hidden bias.
+        :type bias_hh: numpy.core.multiarray.ndarray
+        """
+        self.hidden_dim = weight_hh.shape[1]
+
+        # Transposed views, BLAS handles them without copying.
+        self._w_ih_t = weight_ih.T
+        self._w_hh_t = weight_hh.T
+        self._b_ih = bias_ih
+        self._b_hh = bias_hh
+
+    def input_projection(self, x):
+        """Calculates the input projections for all the time-steps at once.
+
+        :param x: The input (batch, time-steps, input).
+        :type x: numpy.core.multiarray.ndarray
+        :return: The input projections (batch, time-steps, 3 * hidden).
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        x_flat = np.ascontiguousarray(x).reshape(-1, x.shape[-1])
+        x_proj = np.dot(x_flat, self._w_ih_t)
+        x_proj += self._b_ih
+
+        return x_proj.reshape(x.shape[0], x.shape[1], -1)
+
+    def step(self, x_proj_t, h_t):
+        """One time-step of the GRU cell.
+
+        :param x_proj_t: The input projection for the time-step (batch, 3 * hidden).
+        :type x_proj_t: numpy.core.multiarray.ndarray
+        :param h_t: The previous hidden state (batch, hidden).
+        :type h_t: numpy.core.multiarray.ndarray
+        :return: The new hidden state.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        d = self.hidden_dim
+        h_proj = np.dot(h_t, self._w_hh_t)
+        h_proj += self._b_hh
+
+        r = _sigmoid(x_proj_t[:, :d] + h_proj[:, :d])
+        z = _sigmoid(x_proj_t[:, d:2 * d] + h_proj[:, d:2 * d])
+        n = np.tanh(x_proj_t[:, 2 * d:] + r * h_proj[:, 2 * d:])
+
+        return n + z * (h_t - n)
+
+
+class NumpyMaD(object):
+    def __init__(self, weights, context_length):
+        """The Masker and the Denoiser of the MaD TwinNet, in NumPy.
+
+        :param weights: The weights, with the keys used by\
+                        :func:`load_npz_weights`.
+        :type weights: dict[str, numpy.core.multiarray.ndarray]
+        :param context_length: The context length in frames.
+        :type context_length: int
+        """
+        self._context_length = context_length
+
+        self.gru_enc_f = self._make_gru(weights, 'rnn_enc.gru_enc_f')
+        self.gru_enc_b = self._make_gru(weights, 'rnn_enc.gru_enc_b')
+        self.gru_dec = self._make_gru(weights, 'rnn_dec.gru_dec')
+
+        self._fnn_w_t = weights['fnn.linear_layer.weight'].T
+        self._fnn_b = weights['fnn.linear_layer.bias']
+
+        self._den_enc_w_t = weights['denoiser.fnn_enc.weight'].T
+        self._den_enc_b = weights['denoiser.fnn_enc.bias']
+        self._den_dec_w_t = weights['denoiser.fnn_dec.weight'].T
+        self._den_dec_b = weights['denoiser.fnn_dec.bias']
+
+        self._reduced_dim = self.gru_enc_f.hidden_dim
+
+    @classmethod
+    def from_npz(cls, file_name, context_length):
+        """Creates the MaD from an exported .npz file.
+
+        :param file_name: The file name of the .npz file.
+        :type file_name: str
+        :param context_length: The context length in frames.
+        :type context_length: int
+        :return: The MaD.
+        :rtype: NumpyMaD
+        """
+        return cls(load_npz_weights(file_name), context_length)
+
+    @classmethod
+    def from_bundle(cls, file_name, hyper_parameters=None):
+        """Creates the MaD from a bundle. The weights are memory mapped,\
+        i.e. they are shared between processes that use the same bundle.
+
+        :param file_name: The file name of the bundle.
+        :type file_name: str
+        :param hyper_parameters: The hyper-parameters that the bundle must\
+                                 agree with. If None, no check is made.
+        :type hyper_parameters: dict | None
+        :return: The MaD.
+        :rtype: NumpyMaD
+        """
+        weights, header = read_bundle(file_name, hyper_parameters)
+        return cls(weights, header['hyper_parameters']['context_length'])
+
+    @staticmethod
+    def _make_gru(weights, prefix):
+        """Makes a GRU cell from the weights.
+
+        :param weights: The weights.
+        :type weights: dict[str, numpy.core.multiarray.ndarray]
+        :param prefix: The prefix of the keys of the GRU cell.
+        :type prefix: str
+        :return: The GRU cell.
+        :rtype: _GRUCell
+        """
+        return _GRUCell(*[weights['{}.{}'.format(prefix, p)]
+                          for p in ['weight_ih', 'weight_hh', 'bias_ih', 'bias_hh']])
+
+    def rnn_enc(self, v_in):
+        """The RNN encoder of the Masker.
+
+        :param v_in: The input magnitude spectrogram (batch, time-steps, features).
+        :type v_in: numpy.core.multiarray.ndarray
+        :return: The output of the RNN encoder (h_enc).
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        batch_size = v_in.shape[0]
+        seq_length = v_in.shape[1]
+        c = self._context_length
+        d = self._reduced_dim
+
+        v_tr = v_in[:, :, :d]
+        x_f = self.gru_enc_f.input_projection(v_tr)
+        x_b = self.gru_enc_b.input_projection(v_tr)
+
+        h_t_f = np.zeros((batch_size, d), dtype=np.float32)
+        h_t_b = np.zeros((batch_size, d), dtype=np.float32)
+        h_enc = np.empty((batch_size, seq_length - 2 * c, 2 * d), dtype=np.float32)
+
+        for t in range(seq_length):
+            h_t_f = self.gru_enc_f.step(x_f[:, t, :], h_t_f)
+            h_t_b = self.gru_enc_b.step(x_b[:, seq_length - t - 1, :], h_t_b)
+
+            if c <= t < seq_length - c:
+                h_enc[:, t - c, :d] = h_t_f + v_tr[:, t, :]
+                h_enc[:, t - c, d:] = h_t_b + v_tr[:, seq_length - t - 1, :]
+
+        return h_enc
+
+    def rnn_dec(self, h_enc):
+        """The RNN decoder of the Masker.
+
+        :param h_enc: The output of the RNN encoder.
+        :type h_enc: numpy.core.multiarray.ndarray
+        :return: The output of the RNN decoder (h_j_dec).
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        x_proj = self.gru_dec.input_projection(h_enc)
+        h_t_dec = np.zeros((h_enc.shape[0], self.gru_dec.hidden_dim), dtype=np.float32)
+        h_j_dec = np.empty((h_enc.shape[0], h_enc.shape[1], self.gru_dec.hidden_dim), dtype=np.float32)
+
+        for ts in range(h_enc.shape[1]):
+            h_t_dec = self.gru_dec.step(x_proj[:, ts, :], h_t_dec)
+            h_j_dec[:, ts, :] = h_t_dec
+
+        return h_j_dec
+
+    def fnn(self, h_j_dec, v_in):
+        """The FNN of the Masker.
+
+        :param h_j_dec: The output of the RNN decoder.
+        :type h_j_dec: numpy.core.multiarray.ndarray
+        :param v_in: The input magnitude spectrogram.
+        :type v_in: numpy.core.multiarray.ndarray
+        :return: The filtered magnitude spectrogram (v_j_filt_prime).
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        c = self._context_length
+        v_in_prime = v_in[:, c:-c, :]
+
+        m_j = np.dot(h_j_dec.reshape(-1, h_j_dec.shape[-1]), self._fnn_w_t)
+        m_j += self._fnn_b
+        np.maximum(m_j, 0., out=m_j)
+
+        return m_j.reshape(v_in_prime.shape) * v_in_prime
+
+    def denoiser(self, v_j_filt_prime):
+        """The FNN enc and FNN dec of the Denoiser.
+
+        :param v_j_filt_prime: The output of the Masker.
+        :type v_j_filt_prime: numpy.core.multiarray.ndarray
+        :return: The output of the Denoiser (v_j_filt).
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        v_flat = v_j_filt_prime.reshape(-1, v_j_filt_prime.shape[-1])
+
+        fnn_enc_output = np.dot(v_flat, self._den_enc_w_t)
+        fnn_enc_output += self._den_enc_b
+        np.maximum(fnn_enc_output, 0., out=fnn_enc_output)
+
+        fnn_dec_output = np.dot(fnn_enc_output, self._den_dec_w_t)
+        fnn_dec_output += self._den_dec_b
+        np.maximum(fnn_dec_output, 0., out=fnn_dec_output)
+
+        return fnn_dec_output.reshape(v_j_filt_prime.shape) * v_j_filt_prime
+
+    def forward(self, v_in):
+        """The forward pass of the Masker and the Denoiser.
+
+        :param v_in: The input magnitude spectrogram (batch, time-steps, features).
+        :type v_in: numpy.core.multiarray.ndarray
+        :return: The predicted voice magnitude spectrogram, without the context frames.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        v_in = np.asarray(v_in, dtype=np.float32)
+
+        h_enc = self.rnn_enc(v_in)
+        h_dec = self.rnn_dec(h_enc)
+        v_j_filt_prime = self.fnn(h_dec, v_in)
+
+        return self.denoiser(v_j_filt_prime)
+
+    def predict(self, mix_magnitude, batch_size):
+        """Predicts the voice magnitude spectrogram for all the sequences\
+        of a track, in batches. All sequences are processed, i.e. the\
+        last batch has the remaining sequences.
+
+        :param mix_magnitude: The overlapping sequences of the mixture magnitude.
+        :type mix_magnitude: numpy.core.multiarray.ndarray
+        :param batch_size: The batch size.
+        :type batch_size: int
+        :return: The predicted voice magnitude, without the context frames.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        voice_predicted = np.zeros(
+            (
+                mix_magnitude.shape[0],
+                mix_magnitude.shape[1] - self._context_length * 2,
+                mix_magnitude.shape[2]
+            ),
+            dtype=np.float32
+        )
+
+        # The last batch can have less than `batch_size` sequences.
+        for batch in range(int(np.ceil(mix_magnitude.shape[0] / float(batch_size)))):
+            b_start = batch * batch_size
+            b_end = (batch + 1) * batch_size
+
+            voice_predicted[b_start:b_end, :, :] = self.predict_batch(mix_magnitude[b_start:b_end, :, :])
+
+        return voice_predicted
+
+    def predict_batch(self, mix_magnitude):
+        """Predicts the voice magnitude spectrogram for one batch of sequences.
+
+        :param mix_magnitude: The batch of sequences of the mixture magnitude.
+        :type mix_magnitude: numpy.core.multiarray.ndarray
+        :return: The predicted voice magnitude, without the context frames.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        return self.forward(mix_magnitude)
+
+    def __call__(self, v_in):
+        return self.forward(v_in)
+
+# EOF
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A content-addressed cache of the outputs of the separation, on disk.
+
+The key of a file is the hash of its decoded (mono) audio, together with\
+the fingerprint of the run (i.e. the weights, the hyper-parameters, and\
+the settings). Thus, identical audio under different file names, or\
+re-uploaded, is separated only once. The cache has a maximum size, and\
+the least recently used outputs are removed first. The index of the\
+outputs is an SQLite database, so many processes can use the same cache.
+"""
+
+import hashlib
+import os
+import shutil
+import sqlite3
+import time
+
+from helpers.audio_io import wav_read_chunks
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['OutputCache']
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS outputs (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outputs_used_at ON outputs (used_at);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+'''
+
+# The samples that are hashed at a time
+_chunk_size = 2 ** 18
+
+
+class OutputCache(object):
+    def __init__(self, directory, max_size, mono=True):
+        """A cache at the `directory`, which is created if it does not exist.
+
+        :param directory: The directory of the cache.
+        :type directory: str
+        :param max_size: The maximum size of the outputs, in bytes.
+        :type max_size: int
+        :param mono: The keys are of the mono version of the audio. If False,\
+                     they are of all the channels (e.g. for the stereo mode).
+        :type mono: bool
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.directory = directory
+        self.max_size = max_size
+        self.mono = mono
+
+        # Transactions are explicit, so that the copies from and to the
+        # cache are not interleaved with the removals of other processes
+        self._connection = sqlite3.connect(
+            os.path.join(directory, 'index.sqlite'), timeout=60, isolation_level=None)
+        self._connection.executescript(_schema)
+
+        self._keys = {}
+        self.nb_hits = 0
+        self.nb_misses = 0
+
+    def close(self):
+        """Closes the index.
+        """
+        self._connection.close()
+
+    def key(self, source, fingerprint):
+        """Makes the key of a file, from its decoded audio and the\
+        fingerprint of the run.
+
+        :param source: The file name.
+        :type source: str
+        :param fingerprint: The fingerprint of the run.
+        :type fingerprint: str
+        :return: The key.
+        :rtype: str
+        """
+        source_stat = os.stat(source)
+        file_id = (os.path.abspath(source), source_stat.st_size, source_stat.st_mtime, fingerprint)
+
+        if file_id not in self._keys:
+            key = hashlib.sha1(fingerprint.encode('utf-8'))
+
+            for chunk in wav_read_chunks(source, _chunk_size, mono=self.mono):
+                key.update(chunk.tobytes())
+
+            self._keys[file_id] = key.hexdigest()
+
+        return self._keys[file_id]
+
+    def get(self, key, output_file_names):
+        """Copies the cached outputs of the `key` to the `output_file_names`.
+
+        :param key: The key.
+        :type key: str
+        :param output_file_names: The output file names, for the voice and\
+                                  the background music.
+        :type output_file_names: list[str]
+        :return: True if the outputs were in the cache.
+        :rtype: bool
+        """
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            found = self._connection.execute(
+                'SELECT key FROM outputs WHERE key = ?', (key,)).fetchone() is not None
+            cached_file_names = self._file_names(key)
+
+            if found and all(os.path.isfile(file_name) for file_name in cached_file_names):
+                for cached_file_name, output_file_name in zip(cached_file_names, output_file_names):
+                    shutil.copyfile(cached_file_name, output_file_name)
+
+                self._connection.execute(
+                    'UPDATE outputs SET used_at = ? WHERE key = ?', (time.time(), key))
+            else:
+                found = False
+
+            self._connection.execute(
+                'UPDATE counters SET value = value + 1 WHERE name = ?',
+                ('hits' if found else 'misses',)
+            )
+            self._connection.execute('COMMIT')
+        except Exception:
+            self._connection.execute('ROLLBACK')
+            raise
+
+        if found:
+            self.nb_hits += 1
+        else:
+            self.nb_misses += 1
+
+        return found
+
+    def put(self, key, output_file_names):
+        """Adds the outputs of the `key` to the cache, and removes the least\
+        recently used outputs while the cache is larger than its maximum size.
+
+        :param key: The key.
+        :type key: str
+        :param output_file_names: The output file names, for the voice and\
+                                  the background music.
+        :type output_file_names: list[str]
+        """
+        cached_file_names = self._file_names(key)
+        tmp_file_names = ['{}.{}.tmp'.format(file_name, os.getpid()) for file_name in cached_file_names]
+
+        os.makedirs(os.path.dirname(cached_file_names[0]), exist_ok=True)
+
+        for output_file_name, tmp_file_name in zip(output_file_names, tmp_file_names):
+            shutil.copyfile(output_file_name, tmp_file_name)
+
+        now = time.time()
+
+        self._connection.execute('BEGIN IMMEDIATE')
+        try:
+            for tmp_file_name, cached_file_name in zip(tmp_file_names, cached_file_names):
+                os.replace(tmp_file_name, cached_file_name)
+
+            self._connection.execute(
+                'INSERT OR REPLACE INTO outputs (key, size, created_at, used_at) VALUES (?, ?, ?, ?)',
+                (key, sum(os.path.getsize(file_name) for file_name in cached_file_names), now, now)
+            )
+            self._evict()
+            self._connection.execute('COMMIT')
+        except Exception:
+            self._connection.execute('ROLLBACK')
+            raise
+        finally:
+            for tmp_file_name in tmp_file_names:
+                if os.path.isfile(tmp_file_name):
+                    os.remove(tmp_file_name)
+
+    def stats(self):
+        """Gives the statistics of the cache, i.e. the hits and misses of\
+        this instance and of all the processes, the evictions, the amount\
+        of outputs, and their size.
+
+        :return: The statistics.
+        :rtype: dict
+        """
+        counters = dict(self._connection.execute('SELECT name, value FROM counters').fetchall())
+        nb_entries, size = self._connection.execute(
+            'SELECT COUNT(*), IFNULL(SUM(size), 0) FROM outputs').fetchone()
+
+        return {
+            'hits': self.nb_hits, 'misses': self.nb_misses,
+            'total_hits': counters['hits'], 'total_misses': counters['misses'],
+            'evictions': counters['evictions'],
+            'entries': nb_entries, 'size': size, 'max_size': self.max_size
+        }
+
+    def _evict(self):
+        """Removes the least recently used outputs, while the cache is larger\
+        than its maximum size. Must be called in a transaction.
+        """
+        size = self._connection.execute('SELECT IFNULL(SUM(size), 0) FROM outputs').fetchone()[0]
+        nb_evictions = 0
+
+        for key, key_size in self._connection.execute(
+                'SELECT key, size FROM outputs ORDER BY used_at').fetchall():
+            if size <= self.max_size:
+                break
+
+            self._connection.execute('DELETE FROM outputs WHERE key = ?', (key,))
+
+            for file_name in self._file_names(key):
+                if os.path.isfile(file_name):
+                    os.remove(file_name)
+
+            size -= key_size
+            nb_evictions += 1
+
+        self._connection.execute(
+            "UPDATE counters SET value = value + ? WHERE name = 'evictions'", (nb_evictions,))
+
+    def _file_names(self, key):
+        """Makes the file names of the cached outputs of a key.
+
+        :param key: The key.
+        :type key: str
+        :return: The file names, for the voice and the background music.
+        :rtype: list[str]
+        """
+        prefix = os.path.join(self.directory, key[:2], key)
+
+        return ['{}_voice.wav'.format(prefix), '{}_bg_music.wav'.format(prefix)]
+
+# EOF
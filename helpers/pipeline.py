@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""A staged producer/consumer pipeline, with bounded queues between\
+the stages.
+
+Each stage is a callable applied to the output of the previous stage,\
+by one or more threads. The queues between the stages are bounded, so a\
+slow stage blocks the previous ones (backpressure). An exception at any\
+stage stops the pipeline and is raised to the consumer of the outputs.
+"""
+
+import queue
+import threading
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['pipeline']
+
+_end = object()
+_poll_interval = .1
+
+
+class _Pipeline(object):
+    def __init__(self, items, stages, queue_size):
+        """The state of a running pipeline.
+
+        :param items: The inputs of the first stage.
+        :type items: collections.Iterable
+        :param stages: The stages, as (callable, amount of threads).
+        :type stages: list[(callable, int)]
+        :param queue_size: The maximum amount of items in each queue.
+        :type queue_size: int
+        """
+        self.stages = stages
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+        self.stop = threading.Event()
+        self.error = None
+
+        self._lock = threading.Lock()
+        self._running = [nb_threads for _, nb_threads in stages]
+
+        self.threads = [threading.Thread(target=self._feed, args=(items,))]
+        for stage_index, (_, nb_threads) in enumerate(stages):
+            self.threads.extend([
+                threading.Thread(target=self._work, args=(stage_index,))
+                for _ in range(nb_threads)
+            ])
+
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    def _fail(self, error):
+        """Records the first error and stops the pipeline.
+
+        :param error: The error.
+        :type error: Exception
+        """
+        with self._lock:
+            if self.error is None:
+                self.error = error
+        self.stop.set()
+
+    def put(self, queue_index, item):
+        """Puts an item to a queue, blocking while the queue is full.
+
+        :param queue_index: The index of the queue.
+        :type queue_index: int
+        :param item: The item.
+        :type item: object
+        :return: False if the pipeline was stopped, True otherwise.
+        :rtype: bool
+        """
+        while not self.stop.is_set():
+            try:
+                self.queues[queue_index].put(item, timeout=_poll_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def get(self, queue_index):
+        """Gets an item from a queue, blocking while the queue is empty.
+
+        :param queue_index: The index of the queue.
+        :type queue_index: int
+        :return: The item, or the end marker if the pipeline was stopped.
+        :rtype: object
+        """
+        while not self.stop.is_set():
+            try:
+                return self.queues[queue_index].get(timeout=_poll_interval)
+            except queue.Empty:
+                pass
+        return _end
+
+    def _feed(self, items):
+        """Puts the inputs, with their indices, to the first queue.
+
+        :param items: The inputs.
+        :type items: collections.Iterable
+        """
+        try:
+            for item in enumerate(items):
+                if not self.put(0, item):
+                    return
+        except Exception as e:
+            self._fail(e)
+            return
+
+        for _ in range(self.stages[0][1]):
+            self.put(0, _end)
+
+    def _work(self, stage_index):
+        """The loop of a thread of a stage.
+
+        :param stage_index: The index of the stage.
+        :type stage_index: int
+        """
+        stage_callable = self.stages[stage_index][0]
+
+        while True:
+            item = self.get(stage_index)
+
+            if item is _end:
+                break
+
+            index, value = item
+
+            try:
+                output = stage_callable(value)
+            except Exception as e:
+                self._fail(e)
+                return
+
+            if not self.put(stage_index + 1, (index, output)):
+                return
+
+        # The last thread of the stage signals the end to the next stage.
+        with self._lock:
+            self._running[stage_index] -= 1
+            is_last = self._running[stage_index] == 0
+
+        if is_last:
+            nb_next = self.stages[stage_index + 1][1] if stage_index + 1 < len(self.stages) else 1
+            for _ in range(nb_next):
+                self.put(stage_index + 1, _end)
+
+
+def pipeline(items, stages, queue_size=2):
+    """Runs the `items` through the `stages` and yields the outputs of\
+    the last stage, in the order of the `items`.
+
+    While the consumer processes an output, the stages keep working on\
+    the next items, up to the size of the queues.
+
+    :param items: The inputs of the first stage.
+    :type items: collections.Iterable
+    :param stages: The stages, as (callable, amount of threads). Each\
+                   callable takes the output of the previous stage.
+    :type stages: list[(callable, int)]
+    :param queue_size: The maximum amount of items in each queue.
+    :type queue_size: int
+    :return: The outputs of the last stage.
+    :rtype: collections.Iterable
+    :raises Exception: The first exception raised at any stage.
+    """
+    running = _Pipeline(items, stages, queue_size)
+    pending = {}
+    next_index = 0
+
+    try:
+        while True:
+            item = running.get(len(stages))
+
+            if item is _end:
+                break
+
+            pending[item[0]] = item[1]
+
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+
+        if running.error is not None:
+            raise running.error
+    finally:
+        running.stop.set()
+
+# EOF
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Detection of the tracks that are already processed, for resuming\
+interrupted runs.
+
+A run has a fingerprint of the hyper-parameters, the inference settings,\
+and the contents of the weights. A track is processed if its output files\
+exist and its record has the fingerprint of the current run, so outputs\
+of other weights or settings are never reused.
+"""
+
+import hashlib
+import json
+import os
+
+from helpers.settings import hyper_parameters, model_bundle_path, output_states_path
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['run_fingerprint', 'source_fingerprint', 'is_processed', 'mark_processed']
+
+_chunk_size = 1 << 20
+
+
+def run_fingerprint(**settings):
+    """Makes the fingerprint of a run.
+
+    :param settings: The settings of the run that affect the outputs\
+                     (e.g. the sequence length of the inference).
+    :type settings: dict
+    :return: The fingerprint.
+    :rtype: str
+    """
+    fingerprint = hashlib.sha1(json.dumps(
+        {'hyper_parameters': hyper_parameters, 'settings': settings},
+        sort_keys=True
+    ).encode('utf-8'))
+
+    # The weights that are used, as at the loading of the MaD
+    if os.path.isfile(model_bundle_path):
+        weights_files = [model_bundle_path]
+    else:
+        weights_files = [output_states_path[k] for k in sorted(output_states_path)]
+
+    for file_name in weights_files:
+        with open(file_name, 'rb') as f:
+            for chunk in iter(lambda: f.read(_chunk_size), b''):
+                fingerprint.update(chunk)
+
+    return fingerprint.hexdigest()
+
+
+def source_fingerprint(fingerprint, source):
+    """Makes the fingerprint of a run for one input file, so that the\
+    outputs of a modified input file are not reused.
+
+    :param fingerprint: The fingerprint of the run.
+    :type fingerprint: str
+    :param source: The file name of the input file.
+    :type source: str
+    :return: The fingerprint.
+    :rtype: str
+    """
+    source_stat = os.stat(source)
+
+    return hashlib.sha1('{}|{}|{}|{}'.format(
+        fingerprint, os.path.abspath(source), source_stat.st_size, source_stat.st_mtime
+    ).encode('utf-8')).hexdigest()
+
+
+def is_processed(marker_file_name, fingerprint, output_file_names):
+    """Checks if a track is processed by a run with the `fingerprint`.
+
+    :param marker_file_name: The file name of the record of the track.
+    :type marker_file_name: str
+    :param fingerprint: The fingerprint.
+    :type fingerprint: str
+    :param output_file_names: The output files of the track.
+    :type output_file_names: list[str]
+    :return: True if the record has the fingerprint and all outputs exist.
+    :rtype: bool
+    """
+    if not all(os.path.isfile(file_name) for file_name in [marker_file_name] + output_file_names):
+        return False
+
+    try:
+        with open(marker_file_name) as f:
+            return json.load(f).get('fingerprint') == fingerprint
+    except ValueError:
+        return False
+
+
+def mark_processed(marker_file_name, fingerprint):
+    """Records that a track is processed, after all its outputs are written.
+
+    :param marker_file_name: The file name of the record of the track.
+    :type marker_file_name: str
+    :param fingerprint: The fingerprint.
+    :type fingerprint: str
+    """
+    tmp_file_name = '{}.tmp'.format(marker_file_name)
+
+    with open(tmp_file_name, 'w') as f:
+        json.dump({'fingerprint': fingerprint}, f)
+
+    os.replace(tmp_file_name, marker_file_name)
+
+# EOF
@@ -15,14 +15,36 @@ __all__ = [
     'output_audio_paths',
     'metrics_paths',
     'output_states_path',
+    'numpy_states_path',
+    'model_bundle_path',
+    'job_spool_path',
+    'output_cache_path',
+    'checkpoint_path',
     'training_output_string',
     'testing_output_string_per_example',
     'testing_output_string_all',
+    'testing_output_string_per_example_fast',
+    'testing_output_string_all_fast',
     'training_constants',
+    'inference_constants',
+    'service_constants',
+    'job_spool_constants',
+    'realtime_constants',
+    'output_cache_constants',
+    'mask_constants',
+    'energy_gate_constants',
+    'distributed_constants',
+    'checkpoint_constants',
     'wav_quality',
     'hyper_parameters',
     'usage_output_string_per_example',
-    'usage_output_string_total'
+    'usage_output_string_total',
+    'usage_output_string_realtime',
+    'usage_output_string_spool',
+    'usage_output_string_compute',
+    'usage_output_string_cache',
+    'usage_output_string_gate',
+    'testing_output_string_gate'
 ]
 
 
@@ -61,12 +83,20 @@ output_audio_paths = {
     'mix': os.path.join(
         _audio_files_path,
         'test_example_{placeholder}_mix_true{d}.wav'.format(
+            placeholder='{p:02d}', d=_debug_suffix)),
+    'mask': os.path.join(
+        _audio_files_path,
+        'test_example_{placeholder}_mask{d}.npz'.format(
             placeholder='{p:02d}', d=_debug_suffix))
 }
 
 metrics_paths = {
     'sdr': os.path.join(_metrics_path, 'sdr{}_p2.pckl'.format(_debug_suffix)),
-    'sir': os.path.join(_metrics_path, 'sir{}_p2.pckl'.format(_debug_suffix))
+    'sir': os.path.join(_metrics_path, 'sir{}_p2.pckl'.format(_debug_suffix)),
+    'sdr_fast': os.path.join(_metrics_path, 'sdr_fast{}_p2.pckl'.format(_debug_suffix)),
+    'si_sdr_fast': os.path.join(_metrics_path, 'si_sdr_fast{}_p2.pckl'.format(_debug_suffix)),
+    'store': os.path.join(_metrics_path, 'store{}'.format(_debug_suffix)),
+    'store_fast': os.path.join(_metrics_path, 'store_fast{}'.format(_debug_suffix))
 }
 
 output_states_path = {
@@ -76,6 +106,12 @@ output_states_path = {
     'denoiser': os.path.join(_states_path, 'denoiser{}.pt'.format(_debug_suffix)),
 }
 
+numpy_states_path = os.path.join(_states_path, 'mad{}.npz'.format(_debug_suffix))
+model_bundle_path = os.path.join(_states_path, 'mad{}.bundle'.format(_debug_suffix))
+job_spool_path = os.path.join(_outputs_path, 'jobs{}.sqlite'.format(_debug_suffix))
+output_cache_path = os.path.join(_outputs_path, 'cache{}'.format(_debug_suffix))
+checkpoint_path = os.path.join(_states_path, 'checkpoint{}.pt'.format(_debug_suffix))
+
 # Strings
 training_output_string = 'Epoch: {ep:3d} Losses: -- ' \
                          'Masker:{l_m:6.4f} | Denoiser:{l_d:6.4f} | ' \
@@ -90,8 +126,29 @@ testing_output_string_all = 'Median SDR:{sdr:6.2f} dB | ' \
                             'Median SIR:{sir:6.2f} dB | ' \
                             'Total time:{t:6.2f} sec(s)'
 
+testing_output_string_per_example_fast = 'Example: {e:2d}, Median -- ' \
+                                         'SDR:{sdr:6.2f} dB | SI-SDR:{si_sdr:6.2f} dB | ' \
+                                         'Time:{t:6.2f} sec(s)'
+
+testing_output_string_all_fast = 'Median SDR:{sdr:6.2f} dB | ' \
+                                 'Median SI-SDR:{si_sdr:6.2f} dB | ' \
+                                 'Total time:{t:6.2f} sec(s)'
+
 usage_output_string_per_example = '-- File {f} processed. Time: {t:6.2f} sec(s)'
 usage_output_string_total = '-- All files processed. Total time: {t:6.2f} sec(s)'
+usage_output_string_realtime = '-- Audio duration: {d:8.2f} sec(s) | Processing time: {t:8.2f} sec(s) | ' \
+                               'Real-time factor: {r:6.3f} ({x:6.2f}x faster than real-time)'
+usage_output_string_spool = '-- Jobs: {d:7d} done | {r:7d} remaining | {f:5d} failed | ' \
+                            'Throughput: {x:7.3f} file(s)/sec | ETA: {eta}'
+usage_output_string_compute = '-- Compute time per block of {b:6.1f} ms: mean {m:6.1f} ms | ' \
+                              '95th percentile {p:6.1f} ms | max {x:6.1f} ms | ' \
+                              'over the block duration: {o:d} of {n:d}'
+usage_output_string_cache = '-- Cache: {h:d} hit(s) | {m:d} miss(es) | Total: {th:d} hit(s), ' \
+                            '{tm:d} miss(es), {e:d} eviction(s) | {n:d} file(s), {s:.1f} of {x:.1f} MB'
+usage_output_string_gate = '-- Energy gate at {g:.1f} dB: {s:d} of {n:d} sequences skipped ({p:.1f}%) | ' \
+                           'Time saved: ~{t:.2f} sec(s)'
+testing_output_string_gate = '-- SDR impact of the energy gate: median SDR {g:6.2f} dB, ' \
+                             '{b:6.2f} dB without it ({d:+.2f} dB) for {n:d} track(s)'
 
 # Process constants
 training_constants = {
@@ -121,4 +178,67 @@ hyper_parameters.update({
     'rnn_enc_output_dim': 2 * hyper_parameters['reduced_dim']
 })
 
+# Inference constants. The sequence length of the inference does not
+# have to be the one of the training. Longer sequences mean less frames
+# that are processed only as context (2 * context_length per sequence).
+inference_constants = {
+    'seq_length': hyper_parameters['seq_length'],
+    'batch_size': training_constants['batch_size']
+}
+
+# Separation service constants. The service waits up to `max_wait` seconds
+# for sequences of other requests, to fill a batch. If `root` is not None,
+# only the files under the `root` directory can be given by their path.
+service_constants = {
+    'host': '127.0.0.1',
+    'port': 8765,
+    'max_wait': .01,
+    'root': None,
+    'latency_window': 1000
+}
+
+# Job spool constants. A failed job is retried until it has been tried
+# `max_attempts` times.
+job_spool_constants = {
+    'max_attempts': 3
+}
+
+# Real-time constants. The input is given in blocks of `block_size` samples,
+# and the sequences are as long as the `latency` (in seconds) allows.
+realtime_constants = {
+    'latency': .5,
+    'block_size': hyper_parameters['hop_size']
+}
+
+# Output cache constants. The least recently used outputs are removed when
+# the cache is larger than `max_size` bytes.
+output_cache_constants = {
+    'max_size': 10 * 2 ** 30
+}
+
+# Mask store constants. The predicted voice magnitude and the mixture phase
+# are saved as `float16` (half the size) or `float32` (exact re-rendering).
+mask_constants = {
+    'dtype': 'float16'
+}
+
+# Energy gate constants. The sequences with all their frames below the
+# `threshold` (in dB relative to full scale) are not given to the MaD.
+energy_gate_constants = {
+    'threshold': -60.
+}
+
+# Data-parallel training constants. The processes meet at the
+# `init_method` URL, e.g. the address and a free port of the first machine.
+distributed_constants = {
+    'backend': 'gloo',
+    'init_method': 'tcp://127.0.0.1:29500'
+}
+
+# Checkpoint constants. A checkpoint of the training is written at the end
+# of each epoch and, if `steps` is not 0, every `steps` steps.
+checkpoint_constants = {
+    'steps': 0
+}
+
 # EOF
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Deterministic splitting of a list of files to shards (e.g. one shard\
+per machine), with about the same total audio duration at each shard.
+
+The durations are read from the headers of the WAV files, without\
+reading the audio data.
+"""
+
+import argparse
+import os
+import struct
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['parse_shard', 'shard_argument', 'wav_duration', 'shard_indices']
+
+
+def parse_shard(shard):
+    """Parses a shard given as `i/N`, i.e. the i-th of N shards, with i\
+    starting from 0.
+
+    :param shard: The shard.
+    :type shard: str
+    :return: The index of the shard and the amount of shards.
+    :rtype: (int, int)
+    :raises ValueError: When the shard is not in the `i/N` form, with 0 <= i < N.
+    """
+    try:
+        shard_index, nb_shards = [int(i) for i in shard.split('/')]
+    except ValueError:
+        raise ValueError('The shard must be given as i/N, e.g. 0/4 (got {}).'.format(shard))
+
+    if not 0 <= shard_index < nb_shards:
+        raise ValueError('The shard index must be in [0, {}) (got {}).'.format(nb_shards, shard_index))
+
+    return shard_index, nb_shards
+
+
+def shard_argument(shard):
+    """Parses a shard given as a command line argument, as\
+    :func:`parse_shard`, for the `type` of an :mod:`argparse` argument.
+
+    :param shard: The shard.
+    :type shard: str
+    :return: The index of the shard and the amount of shards.
+    :rtype: (int, int)
+    :raises argparse.ArgumentTypeError: When the shard is not in the `i/N`\
+                                        form, with 0 <= i < N.
+    """
+    try:
+        return parse_shard(shard)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def wav_duration(file_name):
+    """Reads the duration of a WAV file from its header.
+
+    :param file_name: The file name of the WAV file.
+    :type file_name: str
+    :return: The duration in seconds.
+    :rtype: float
+    :raises ValueError: When the file is not a WAV file.
+    """
+    with open(file_name, 'rb') as f:
+        riff, _, wave_id = struct.unpack('<4sI4s', f.read(12))
+
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError('The file {} is not a WAV file.'.format(file_name))
+
+        byte_rate = None
+
+        while True:
+            chunk_header = f.read(8)
+
+            if len(chunk_header) < 8:
+                raise ValueError('The file {} has no data chunk.'.format(file_name))
+
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+
+            if chunk_id == b'fmt ':
+                byte_rate = struct.unpack('<HHII', f.read(12))[3]
+                f.seek(chunk_size - 12 + chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if byte_rate is None:
+                    raise ValueError('The file {} has no format chunk.'.format(file_name))
+
+                # The size at the header can be wrong for files written while streaming
+                data_size = min(chunk_size, os.path.getsize(file_name) - f.tell())
+
+                return data_size / float(byte_rate)
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+
+
+def shard_indices(durations, shard_index, nb_shards):
+    """Splits the files to shards with about the same total duration and\
+    gives the indices of the files of one shard.
+
+    The longest files are assigned first, each to the shard with the\
+    smallest total duration so far (the first such shard, on ties). Files\
+    of the same duration are taken in the order of their indices. Thus,\
+    the splitting depends only on the durations and is the same at all\
+    the machines.
+
+    :param durations: The durations of the files.
+    :type durations: list[float]
+    :param shard_index: The index of the shard.
+    :type shard_index: int
+    :param nb_shards: The amount of shards.
+    :type nb_shards: int
+    :return: The indices of the files of the shard, in increasing order.
+    :rtype: list[int]
+    """
+    totals = [0.] * nb_shards
+    assignment = [[] for _ in range(nb_shards)]
+
+    for index in sorted(range(len(durations)), key=lambda i: (-durations[i], i)):
+        target = min(range(nb_shards), key=lambda i: (totals[i], i))
+        totals[target] += durations[index]
+        assignment[target].append(index)
+
+    return sorted(assignment[shard_index])
+
+# EOF
@@ -6,7 +6,7 @@ from scipy import fftpack, signal
 
 __author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
 __docformat__ = 'reStructuredText'
-__all__ = ['stft', 'i_stft', 'ideal_ratio_masking']
+__all__ = ['stft', 'i_stft', 'stft_frames', 'overlap_add', 'ideal_ratio_masking']
 
 _eps = np.finfo(np.float32).tiny
 
@@ -44,22 +44,49 @@ def stft(x, windowing_func, fft_size, hop):
     :return: The short-time Fourier transform of the input signal.
     :rtype: numpy.core.multiarray.ndarray
     """
-    window_size = windowing_func.size
-
     x = np.append(np.zeros(3 * hop), x)
     x = np.append(x, np.zeros(3 * hop))
 
+    nb_frames = max((x.size - windowing_func.size) // hop + 1, 0)
+
+    xm_x = np.zeros((int(len(x) / hop), int(fft_size / 2) + 1), dtype=np.float32)
+    xp_x = np.zeros((int(len(x) / hop), int(fft_size / 2) + 1), dtype=np.float32)
+
+    xm_x[:nb_frames, :], xp_x[:nb_frames, :] = stft_frames(x, windowing_func, fft_size, hop, nb_frames)
+
+    return xm_x, xp_x
+
+
+def stft_frames(x, windowing_func, fft_size, hop, nb_frames):
+    """Short-time Fourier transform of the first `nb_frames` frames of\
+    `x`, without any padding. The frames are the ones that :func:`stft`\
+    computes for a signal, if `x` starts at a frame of the (padded) signal.
+
+    :param x: Input time domain signal.
+    :type x: numpy.core.multiarray.ndarray
+    :param windowing_func: The windowing function to be used.
+    :type windowing_func: numpy.core.multiarray.ndarray
+    :param fft_size: The fft size in samples.
+    :type fft_size: int
+    :param hop: The hop size in samples.
+    :type hop: int
+    :param nb_frames: The amount of frames.
+    :type nb_frames: int
+    :return: The magnitude and the phase of the frames.
+    :rtype: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+    """
+    window_size = windowing_func.size
+
     p_in = 0
-    p_end = x.size - window_size
     indx = 0
 
     if np.sum(windowing_func) != 0.:
         windowing_func = windowing_func / np.sqrt(fft_size)
 
-    xm_x = np.zeros((int(len(x) / hop), int(fft_size / 2) + 1), dtype=np.float32)
-    xp_x = np.zeros((int(len(x) / hop), int(fft_size / 2) + 1), dtype=np.float32)
+    xm_x = np.zeros((nb_frames, int(fft_size / 2) + 1), dtype=np.float32)
+    xp_x = np.zeros((nb_frames, int(fft_size / 2) + 1), dtype=np.float32)
 
-    while p_in <= p_end:
+    while indx < nb_frames:
         x_seg = x[p_in:p_in + window_size]
 
         mc_x, pc_x = _dft(x_seg, windowing_func, fft_size)
@@ -88,17 +115,48 @@ def i_stft(magnitude_spect, phase, window_size, hop):
     :return: Synthesized time-domain signal.
     :rtype: numpy.core.multiarray.ndarray
     """
-    rs = _gl_alg(window_size, hop, (window_size - 1) * 2)
-
     hw_1 = int(np.floor((window_size + 1) / 2))
     hw_2 = int(np.floor(window_size / 2))
 
+    # Initialise output array with zeros
+    time_domain_signal = np.zeros(magnitude_spect.shape[0] * hop + hw_1 + hw_2)
+
+    overlap_add(time_domain_signal, magnitude_spect, phase, window_size, hop)
+
+    # Delete the extra zeros that the analysis had placed
+    time_domain_signal = np.delete(time_domain_signal, range(3 * hop))
+    time_domain_signal = np.delete(
+        time_domain_signal,
+        range(time_domain_signal.size - (3 * hop + 1),
+              time_domain_signal.size)
+    )
+
+    return time_domain_signal
+
+
+def overlap_add(time_domain_signal, magnitude_spect, phase, window_size, hop):
+    """Synthesizes the frames of given magnitude and phase spectra, via\
+    iDFT, and adds them in place to `time_domain_signal`, the first frame\
+    at its start. The additions are done in the same order as in\
+    :func:`i_stft`, so consecutive calls for consecutive frames give the\
+    same signal as one call for all the frames.
+
+    :param time_domain_signal: The time-domain signal to add the frames to.
+    :type time_domain_signal: numpy.core.multiarray.ndarray
+    :param magnitude_spect: Magnitude spectrum.
+    :type magnitude_spect: numpy.core.multiarray.ndarray
+    :param phase: Phase spectrum.
+    :type phase: numpy.core.multiarray.ndarray
+    :param window_size: Synthesis window size in samples.
+    :type window_size: int
+    :param hop: Hop size in samples.
+    :type hop: int
+    """
+    rs = _gl_alg(window_size, hop, (window_size - 1) * 2)
+
     # Acquire the number of STFT frames
     nb_frames = magnitude_spect.shape[0]
 
-    # Initialise output array with zeros
-    time_domain_signal = np.zeros(nb_frames * hop + hw_1 + hw_2)
-
     # Initialise loop pointer
     pin = 0
 
@@ -113,16 +171,6 @@ def i_stft(magnitude_spect, phase, window_size, hop):
         # Advance pointer
         pin += hop
 
-    # Delete the extra zeros that the analysis had placed
-    time_domain_signal = np.delete(time_domain_signal, range(3 * hop))
-    time_domain_signal = np.delete(
-        time_domain_signal,
-        range(time_domain_signal.size - (3 * hop + 1),
-              time_domain_signal.size)
-    )
-
-    return time_domain_signal
-
 
 def _gl_alg(window_size, hop, fft_size=4096):
     """LSEE-MSTFT algorithm for computing the synthesis window.
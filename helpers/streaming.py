@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Separation of a signal that is given in parts, with bounded memory.
+
+The frames are computed as soon as their samples are given. Each batch\
+of sequences is predicted as soon as its frames (context frames included)\
+are available, and the voice and the background music are overlap-added\
+and given back as soon as they are final. Thus, the memory depends on\
+the batch size and not on the duration of the signal.
+
+The outputs are the same as the ones of :func:`helpers.data_feeder.\
+data_feeder_testing` and :func:`helpers.data_feeder.\
+data_process_results_testing` (in the usage case), i.e. the frames,\
+the sequences, and the overlap-add are the same.
+"""
+
+import numpy as np
+from numpy.lib import stride_tricks
+from scipy.signal import hamming
+
+from helpers.audio_io import wav_read_chunks, WavWriter
+from helpers.signal_transforms import stft_frames, overlap_add
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['StreamSeparator', 'stream_separate', 'algorithmic_latency']
+
+
+class StreamSeparator(object):
+    def __init__(self, predict_batch, window_size, fft_size, hop, seq_length,
+                 context_length, batch_size):
+        """Separates a mono signal that is given in parts, with\
+        :meth:`process`, and ends with :meth:`finish`.
+
+        The voice and the background music start at the sample\
+        `context_length * hop` of the signal, as for the other separation\
+        functions (the first frames are only context frames).
+
+        :param predict_batch: The function that predicts the voice magnitude\
+                              of a batch of sequences, without the context\
+                              frames, e.g. :meth:`modules.MaD.predict_batch`.
+        :type predict_batch: callable
+        :param window_size: The window size in samples.
+        :type window_size: int
+        :param fft_size: The FFT size in samples.
+        :type fft_size: int
+        :param hop: The hop size in samples.
+        :type hop: int
+        :param seq_length: The sequence length in frames.
+        :type seq_length: int
+        :param context_length: The context length in frames.
+        :type context_length: int
+        :param batch_size: The amount of sequences predicted at a time.
+        :type batch_size: int
+        """
+        self._predict_batch = predict_batch
+        self._window_size = window_size
+        self._fft_size = fft_size
+        self._hop = hop
+        self._seq_length = seq_length
+        self._context_length = context_length
+        self._batch_size = batch_size
+        self._step = seq_length - 2 * context_length
+        self._padding = 3 * hop
+        self._windowing_func = hamming(window_size, True)
+
+        # The signal with the padding of `helpers.signal_transforms.stft`,
+        # from the position `_signal_start`
+        self._signal = np.zeros(self._padding)
+        self._signal_start = 0
+
+        # The frames, from the frame `_frames_start`
+        self._magnitude = np.zeros((0, int(fft_size / 2) + 1), dtype=np.float32)
+        self._phase = np.zeros((0, int(fft_size / 2) + 1), dtype=np.float32)
+        self._frames_start = 0
+
+        # The overlap-add buffer, from the position `_ola_start`. The
+        # positions before `_ola_start` are given back.
+        self._time_domain_signal = np.zeros(0)
+        self._ola_start = 0
+
+        self.nb_samples = 0
+        self.nb_sequences = 0
+
+    def process(self, samples):
+        """Adds samples to the signal, and separates the sequences that\
+        can be separated.
+
+        :param samples: The samples.
+        :type samples: numpy.core.multiarray.ndarray
+        :return: The voice and the background music that are final.
+        :rtype: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+        """
+        self._signal = np.append(self._signal, samples)
+        self.nb_samples += len(samples)
+
+        self._compute_frames(self._padding + self.nb_samples)
+
+        nb_sequences = max((self._frames_end() - self._seq_length) // self._step + 1, 0)
+        outputs = []
+
+        while nb_sequences - self.nb_sequences >= self._batch_size:
+            outputs.append(self._separate(self.nb_sequences + self._batch_size))
+
+        return self._concatenate(outputs)
+
+    def finish(self):
+        """Ends the signal, and separates the remaining sequences.
+
+        :return: The remaining voice and background music.
+        :rtype: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+        """
+        signal_length = self.nb_samples + 2 * self._padding
+
+        # The frames and the sequences of `helpers.signal_transforms.stft`
+        # and `helpers.data_feeder._make_overlap_sequences`. The frames
+        # after the computed ones are zeros.
+        nb_rows = int(signal_length / self._hop)
+        nb_sequences = max(int(np.ceil((nb_rows - self._context_length) / float(self._step))), 1)
+
+        # The output of `helpers.signal_transforms.i_stft` starts at the
+        # padding, and the voice and the background music are trimmed to
+        # the mixture after the context frames.
+        voice_length = nb_sequences * self._step * self._hop + self._window_size - 1 - 2 * self._padding
+        output_length = max(min(self.nb_samples - self._context_length * self._hop, voice_length), 0)
+
+        self._signal = np.append(self._signal, np.zeros(self._padding))
+        self._compute_frames(signal_length)
+
+        nb_zero_frames = (nb_sequences - 1) * self._step + self._seq_length - self._frames_end()
+        if nb_zero_frames > 0:
+            self._magnitude = np.append(self._magnitude, np.zeros(
+                (nb_zero_frames, self._magnitude.shape[1]), dtype=np.float32), axis=0)
+            self._phase = np.append(self._phase, np.zeros(
+                (nb_zero_frames, self._phase.shape[1]), dtype=np.float32), axis=0)
+
+        outputs = []
+
+        while self.nb_sequences < nb_sequences:
+            seq_end = min(self.nb_sequences + self._batch_size, nb_sequences)
+            outputs.append(self._separate(seq_end, seq_end == nb_sequences, output_length))
+
+        return self._concatenate(outputs)
+
+    def _frames_end(self):
+        """Gives the frame after the last computed one.
+
+        :return: The frame after the last computed one.
+        :rtype: int
+        """
+        return self._frames_start + self._magnitude.shape[0]
+
+    def _compute_frames(self, signal_end):
+        """Computes the frames that end before the position `signal_end`.
+
+        :param signal_end: The position after the last sample of the signal.
+        :type signal_end: int
+        """
+        frames_end = self._frames_end()
+        nb_frames = max((signal_end - self._window_size) // self._hop + 1, 0) - frames_end
+
+        if nb_frames <= 0:
+            return
+
+        start = frames_end * self._hop - self._signal_start
+        magnitude, phase = stft_frames(
+            self._signal[start:start + (nb_frames - 1) * self._hop + self._window_size],
+            self._windowing_func, self._fft_size, self._hop, nb_frames
+        )
+
+        self._magnitude = np.append(self._magnitude, magnitude, axis=0)
+        self._phase = np.append(self._phase, phase, axis=0)
+
+    def _separate(self, seq_end, last=False, output_length=None):
+        """Separates the sequences up to `seq_end` (exclusive).
+
+        :param seq_end: The sequence after the last one to be separated.
+        :type seq_end: int
+        :param last: The sequences are the last ones of the signal.
+        :type last: bool
+        :param output_length: The length of the whole output, if it is known.
+        :type output_length: int | None
+        :return: The voice and the background music that are final.
+        :rtype: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+        """
+        hop, step, padding = self._hop, self._step, self._padding
+        nb_sequences = seq_end - self.nb_sequences
+        f_start = self.nb_sequences * step - self._frames_start
+
+        sequences = stride_tricks.as_strided(
+            self._magnitude[f_start:],
+            shape=(nb_sequences, self._seq_length, self._magnitude.shape[1]),
+            strides=(self._magnitude.strides[0] * step,) + self._magnitude.strides,
+            writeable=False
+        )
+        voice_predicted = self._predict_batch(np.ascontiguousarray(sequences))
+        voice_predicted.shape = (nb_sequences * step, self._window_size)
+
+        # The synthesized frames of the sequences start at the position
+        # `self.nb_sequences * step * hop` and are final up to the start
+        # of the next sequence, or up to their end for the last sequences.
+        ola_end = seq_end * step * hop + self._window_size
+        self._time_domain_signal = np.append(
+            self._time_domain_signal,
+            np.zeros(ola_end - self._ola_start - self._time_domain_signal.size)
+        )
+        overlap_add(
+            self._time_domain_signal[self.nb_sequences * step * hop - self._ola_start:],
+            voice_predicted,
+            self._phase[f_start + self._context_length:f_start + self._context_length + nb_sequences * step],
+            self._window_size, hop
+        )
+
+        final_end = ola_end if last else seq_end * step * hop
+        o_start = max(self._ola_start - padding, 0)
+        o_end = max(final_end - padding, 0)
+
+        if output_length is not None:
+            o_start, o_end = min(o_start, output_length), min(o_end, output_length)
+
+        voice_hat = self._time_domain_signal[
+            o_start + padding - self._ola_start:o_end + padding - self._ola_start]
+        m_start = o_start + padding + self._context_length * hop - self._signal_start
+        bg_hat = self._signal[m_start:m_start + voice_hat.size] - voice_hat
+
+        # Only the frames of the next sequences and the samples of their
+        # outputs and frames are kept.
+        self.nb_sequences = seq_end
+        self._time_domain_signal = self._time_domain_signal[final_end - self._ola_start:].copy()
+        self._ola_start = final_end
+
+        self._magnitude = self._magnitude[seq_end * step - self._frames_start:].copy()
+        self._phase = self._phase[seq_end * step - self._frames_start:].copy()
+        self._frames_start = seq_end * step
+
+        signal_start = min(self._frames_end() * hop, final_end + self._context_length * hop)
+        self._signal = self._signal[signal_start - self._signal_start:].copy()
+        self._signal_start = signal_start
+
+        return voice_hat, bg_hat
+
+    @staticmethod
+    def _concatenate(outputs):
+        """Concatenates the voice and the background music of outputs.
+
+        :param outputs: The voice and background music of each output.
+        :type outputs: list[(numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)]
+        :return: The concatenated voice and background music.
+        :rtype: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+        """
+        if len(outputs) == 0:
+            return np.zeros(0), np.zeros(0)
+
+        return tuple(np.concatenate(sources) for sources in zip(*outputs))
+
+
+def algorithmic_latency(window_size, hop, seq_length, context_length, block_size):
+    """Gives the maximum time, in samples, from a sample of the input to\
+    its separated sample at the output of :class:`StreamSeparator` (with\
+    one sequence per batch), when the input is given in blocks of\
+    `block_size` samples. The computation time is not included.
+
+    A sequence is separated when the frames of its last context frames\
+    are complete, and then its output frames are final up to the start\
+    of the next sequence.
+
+    :param window_size: The window size in samples.
+    :type window_size: int
+    :param hop: The hop size in samples.
+    :type hop: int
+    :param seq_length: The sequence length in frames.
+    :type seq_length: int
+    :param context_length: The context length in frames.
+    :type context_length: int
+    :param block_size: The amount of samples of each block of the input.
+    :type block_size: int
+    :return: The latency in samples.
+    :rtype: int
+    """
+    step = seq_length - 2 * context_length
+
+    return (step + context_length - 1) * hop + window_size + block_size - 1
+
+
+def stream_separate(source, output_file_names, predict_batch, window_size, fft_size,
+                    hop, seq_length, context_length, batch_size, wav_quality,
+                    chunk_size=2 ** 16):
+    """Separates one file with bounded memory. The file is read in chunks,\
+    and the outputs are written incrementally.
+
+    :param source: The file name.
+    :type source: str
+    :param output_file_names: The output file names, for the voice and\
+                              the background music.
+    :type output_file_names: list[str]
+    :param predict_batch: The function that predicts the voice magnitude\
+                          of a batch of sequences, without the context\
+                          frames, e.g. :meth:`modules.MaD.predict_batch`.
+    :type predict_batch: callable
+    :param window_size: The window size in samples.
+    :type window_size: int
+    :param fft_size: The FFT size in samples.
+    :type fft_size: int
+    :param hop: The hop size in samples.
+    :type hop: int
+    :param seq_length: The sequence length in frames.
+    :type seq_length: int
+    :param context_length: The context length in frames.
+    :type context_length: int
+    :param batch_size: The amount of sequences predicted at a time.
+    :type batch_size: int
+    :param wav_quality: The sampling rate and the number of bits of the outputs.
+    :type wav_quality: dict
+    :param chunk_size: The amount of samples read at a time.
+    :type chunk_size: int
+    :return: The duration of the file, in seconds.
+    :rtype: float
+    """
+    separator = StreamSeparator(
+        predict_batch, window_size, fft_size, hop, seq_length, context_length, batch_size)
+    writers = [WavWriter(file_name, **wav_quality) for file_name in output_file_names]
+
+    try:
+        for chunk in wav_read_chunks(source, chunk_size, mono=True):
+            for writer, output in zip(writers, separator.process(chunk)):
+                writer.write(output)
+
+        for writer, output in zip(writers, separator.finish()):
+            writer.write(output)
+    finally:
+        for writer in writers:
+            writer.close()
+
+    return separator.nb_samples / float(wav_quality['sampling_rate'])
+
+# EOF
@@ -4,11 +4,14 @@
 from modules.affine_transform import AffineTransform
 from modules.fnn import FNNMasker
 from modules.fnn_denoiser import FNNDenoiser
+from modules.mad import MaD
 from modules.rnn_dec import RNNDec
 from modules.rnn_enc import RNNEnc
+from modules.twin_decoder import TwinDecoder
 
 __author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
 __docformat__ = 'reStructuredText'
-__all__ = ['RNNEnc', 'RNNDec', 'FNNMasker', 'FNNDenoiser', 'AffineTransform']
+__all__ = ['RNNEnc', 'RNNDec', 'FNNMasker', 'FNNDenoiser', 'AffineTransform', 'MaD',
+           'TwinDecoder']
 
 # EOF
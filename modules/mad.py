@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The Masker and the Denoiser (MaD), as one module for inference.
+"""
+
+import numpy as np
+import torch
+from torch.autograd import Variable
+from torch.nn import Module
+
+from helpers.model_bundle import read_bundle
+from modules.fnn import FNNMasker
+from modules.fnn_denoiser import FNNDenoiser
+from modules.rnn_dec import RNNDec
+from modules.rnn_enc import RNNEnc
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['MaD']
+
+
+class MaD(Module):
+    def __init__(self, reduced_dim, rnn_enc_output_dim, original_input_dim, context_length, debug):
+        """The Masker and the Denoiser (MaD), as one module for inference.
+
+        The sub-modules have the same names as the keys of the\
+        `output_states_path` at the settings, so the keys of the state\
+        dict are `<module>.<parameter>`.
+
+        :param reduced_dim: The input dimensionality of the RNN encoder.
+        :type reduced_dim: int
+        :param rnn_enc_output_dim: The output dimensionality of the RNN encoder.
+        :type rnn_enc_output_dim: int
+        :param original_input_dim: The dimensionality of the magnitude spectrogram.
+        :type original_input_dim: int
+        :param context_length: The context length.
+        :type context_length: int
+        :param debug: Flag to indicate debug
+        :type debug: bool
+        """
+        super(MaD, self).__init__()
+
+        self._context_length = context_length
+        self._original_input_dim = original_input_dim
+        self._debug = debug
+
+        self.rnn_enc = RNNEnc(reduced_dim, context_length, debug)
+        self.rnn_dec = RNNDec(rnn_enc_output_dim, debug)
+        self.fnn = FNNMasker(rnn_enc_output_dim, original_input_dim, context_length)
+        self.denoiser = FNNDenoiser(original_input_dim)
+
+    def load_states(self, states_paths):
+        """Loads the weights from the separate files of each module.
+
+        :param states_paths: The file names of the states of the modules.
+        :type states_paths: dict[str, str]
+        """
+        for module_name in ['rnn_enc', 'rnn_dec', 'fnn', 'denoiser']:
+            getattr(self, module_name).load_state_dict(torch.load(
+                states_paths[module_name],
+                map_location=lambda storage, loc: storage
+            ))
+
+    def load_bundle(self, file_name, hyper_parameters):
+        """Loads the weights from a bundle.
+
+        :param file_name: The file name of the bundle.
+        :type file_name: str
+        :param hyper_parameters: The hyper-parameters that the bundle must agree with.
+        :type hyper_parameters: dict
+        """
+        weights, _ = read_bundle(file_name, hyper_parameters)
+        self.load_state_dict({k: torch.from_numpy(np.array(v)) for k, v in weights.items()})
+
+    def forward(self, v_in):
+        """The forward pass of the Masker and the Denoiser.
+
+        :param v_in: The input magnitude spectrogram.
+        :type v_in: torch.autograd.variable.Variable
+        :return: The predicted voice magnitude spectrogram.
+        :rtype: torch.autograd.variable.Variable
+        """
+        h_enc = self.rnn_enc(v_in)
+        h_dec = self.rnn_dec(h_enc)
+        v_j_filt_prime = self.fnn(h_dec, v_in)
+
+        return self.denoiser(v_j_filt_prime)
+
+    def predict(self, mix_magnitude, batch_size):
+        """Predicts the voice magnitude spectrogram for all the sequences\
+        of a track, in batches. All sequences are processed, i.e. the\
+        last batch has the remaining sequences.
+
+        :param mix_magnitude: The overlapping sequences of the mixture magnitude.
+        :type mix_magnitude: numpy.core.multiarray.ndarray
+        :param batch_size: The batch size.
+        :type batch_size: int
+        :return: The predicted voice magnitude, without the context frames.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        voice_predicted = np.zeros(
+            (
+                mix_magnitude.shape[0],
+                mix_magnitude.shape[1] - self._context_length * 2,
+                self._original_input_dim
+            ),
+            dtype=np.float32
+        )
+
+        # The last batch can have less than `batch_size` sequences.
+        for batch in range(int(np.ceil(mix_magnitude.shape[0] / float(batch_size)))):
+            b_start = batch * batch_size
+            b_end = (batch + 1) * batch_size
+
+            voice_predicted[b_start:b_end, :, :] = self.predict_batch(mix_magnitude[b_start:b_end, :, :])
+
+        return voice_predicted
+
+    def predict_batch(self, mix_magnitude):
+        """Predicts the voice magnitude spectrogram for one batch of sequences.
+
+        :param mix_magnitude: The batch of sequences of the mixture magnitude.
+        :type mix_magnitude: numpy.core.multiarray.ndarray
+        :return: The predicted voice magnitude, without the context frames.
+        :rtype: numpy.core.multiarray.ndarray
+        """
+        v_in = Variable(torch.from_numpy(mix_magnitude))
+
+        if not self._debug and torch.has_cudnn:
+            v_in = v_in.cuda()
+
+        return self(v_in).data.cpu().numpy()
+
+# EOF
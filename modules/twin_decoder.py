@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""The fused RNN decs and FNNs of the Masker and of the TwinNet.
+"""
+
+from torch import addmm, cat, sigmoid, stack, tanh
+from torch.autograd import Variable
+from torch.nn import Module
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['TwinDecoder']
+
+
+class TwinDecoder(Module):
+    def __init__(self, rnn_dec, fnn, twin_net_rnn_dec, twin_net_fnn_masker):
+        """The RNN dec and the FNN of the Masker, and the ones of the\
+        TwinNet, in one forward pass.
+
+        Both RNN decs have the same input, so the input projections of\
+        their GRUs are made for all the time-steps and for both RNN decs\
+        with one matrix multiplication, before the loop over the\
+        time-steps. In the loop, only the recurrent projections are left.\
+        The parameters are the ones of the given modules, so the losses,\
+        the regularization and the saved states are as with the modules\
+        used separately.
+
+        :param rnn_dec: The RNN dec of the Masker.
+        :type rnn_dec: modules.RNNDec
+        :param fnn: The FNN of the Masker.
+        :type fnn: modules.FNNMasker
+        :param twin_net_rnn_dec: The RNN dec of the TwinNet.
+        :type twin_net_rnn_dec: modules.RNNDec
+        :param twin_net_fnn_masker: The FNN of the TwinNet.
+        :type twin_net_fnn_masker: modules.FNNMasker
+        """
+        super(TwinDecoder, self).__init__()
+
+        self.rnn_dec = rnn_dec
+        self.fnn = fnn
+        self.twin_net_rnn_dec = twin_net_rnn_dec
+        self.twin_net_fnn_masker = twin_net_fnn_masker
+
+    def forward(self, h_enc, v_in):
+        """The forward pass.
+
+        :param h_enc: The output of the RNN encoder.
+        :type h_enc: torch.autograd.variable.Variable
+        :param v_in: The original magnitude spectrogram input.
+        :type v_in: torch.autograd.variable.Variable
+        :return: The outputs of the RNN dec and of the FNN of the Masker\
+                 (h_j_dec and v_j_filt_prime), and of the TwinNet.
+        :rtype: (torch.autograd.variable.Variable, torch.autograd.variable.Variable,\
+                 torch.autograd.variable.Variable, torch.autograd.variable.Variable)
+        """
+        h_j_dec, h_j_dec_twin = self._decoders(h_enc)
+
+        v_j_filt_prime = self.fnn(h_j_dec, v_in)
+        v_j_filt_prime_twin = self.twin_net_fnn_masker(h_j_dec_twin, v_in)
+
+        return h_j_dec, v_j_filt_prime, h_j_dec_twin, v_j_filt_prime_twin
+
+    def _decoders(self, h_enc):
+        """The forward pass of both RNN decs.
+
+        :param h_enc: The output of the RNN encoder.
+        :type h_enc: torch.autograd.variable.Variable
+        :return: The outputs of the RNN decs (h_j_dec), of the Masker and\
+                 of the TwinNet.
+        :rtype: (torch.autograd.variable.Variable, torch.autograd.variable.Variable)
+        """
+        grus = [self.rnn_dec.gru_dec, self.twin_net_rnn_dec.gru_dec]
+        batch_size, seq_length, input_dim = h_enc.size()
+        hidden_size = grus[0].weight_hh.size()[1]
+
+        # The input projections of all the time-steps, for both RNN decs
+        g_i = addmm(
+            cat([gru.bias_ih for gru in grus]).unsqueeze(0).expand(batch_size * seq_length, 6 * hidden_size),
+            h_enc.contiguous().view(-1, input_dim),
+            cat([gru.weight_ih for gru in grus]).t()
+        )
+        g_i = g_i.view(batch_size, seq_length, 2, 3 * hidden_size)
+
+        h_t_dec = [Variable(h_enc.data.new(batch_size, hidden_size).zero_()) for _ in grus]
+        h_j_dec = [[], []]
+
+        for ts in range(seq_length):
+            for index, gru in enumerate(grus):
+                i_r, i_z, i_n = g_i[:, ts, index].chunk(3, 1)
+                h_r, h_z, h_n = addmm(
+                    gru.bias_hh.unsqueeze(0).expand(batch_size, 3 * hidden_size),
+                    h_t_dec[index], gru.weight_hh.t()
+                ).chunk(3, 1)
+
+                r_t = sigmoid(i_r + h_r)
+                z_t = sigmoid(i_z + h_z)
+                n_t = tanh(i_n + r_t * h_n)
+
+                h_t_dec[index] = n_t + z_t * (h_t_dec[index] - n_t)
+                h_j_dec[index].append(h_t_dec[index])
+
+        return stack(h_j_dec[0], 1), stack(h_j_dec[1], 1)
+
+# EOF
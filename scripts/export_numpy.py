@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Exporting of the MaD weights for the NumPy inference.
+"""
+
+from __future__ import print_function
+
+import argparse
+
+import numpy as np
+import torch
+from torch.autograd import Variable
+
+from helpers.numpy_inference import NumpyMaD
+from helpers.settings import hyper_parameters, output_states_path, numpy_states_path, \
+    training_constants
+from modules import MaD
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['export_process']
+
+
+def export_process(npz_file_name, check):
+    """The exporting process.
+
+    :param npz_file_name: The file name of the resulting .npz file.
+    :type npz_file_name: str
+    :param check: Compare the NumPy and the PyTorch outputs?
+    :type check: bool
+    """
+    print('\n-- Exporting the MaD weights to {}'.format(npz_file_name))
+
+    # The modules are used on CPU, i.e. debug is set to True.
+    mad = MaD(
+        hyper_parameters['reduced_dim'],
+        hyper_parameters['rnn_enc_output_dim'],
+        hyper_parameters['original_input_dim'],
+        hyper_parameters['context_length'],
+        True
+    )
+    mad.load_states(output_states_path)
+
+    weights = {k: v.cpu().numpy().astype(np.float32) for k, v in mad.state_dict().items()}
+
+    np.savez(npz_file_name, **weights)
+
+    print('-- Done.')
+
+    if not check:
+        return
+
+    print('-- Comparing the NumPy and the PyTorch outputs... ', end='')
+
+    v_in = np.random.uniform(size=(
+        training_constants['batch_size'],
+        hyper_parameters['seq_length'],
+        hyper_parameters['window_size']
+    )).astype(np.float32)
+
+    v_in_torch = Variable(torch.from_numpy(v_in))
+    voice_torch = mad(v_in_torch).data.numpy()
+    voice_numpy = NumpyMaD.from_npz(npz_file_name, hyper_parameters['context_length'])(v_in)
+
+    print('done. Max. abs. difference: {:.3e}'.format(np.abs(voice_torch - voice_numpy).max()))
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/export_numpy.py [-o the_weights.npz] [-c]',
+        description='Script to export the weights of the MaD TwinNet for the NumPy inference.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--output', '-o', action='store', dest='output', default=numpy_states_path,
+        help='The .npz file to be created.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--check', '-c', action='store_true', dest='check', default=False,
+        help='Compare the outputs of the NumPy and PyTorch implementations.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    export_process(cmd_args.output, cmd_args.check)
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Management of the job spool for large separation jobs.
+
+The files are added to the spool with the `enqueue` command and are\
+separated by one or more workers, started with `python scripts/use_me.py -q`.\
+The progress is printed with the `status` command, and failed or stuck\
+jobs are set back to pending with the `requeue` command.
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import glob
+import os
+
+from helpers.job_spool import JobSpool
+from helpers.settings import job_spool_path, job_spool_constants, usage_output_string_spool
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['enqueue_process', 'status_process', 'requeue_process']
+
+# The outputs of the usage script (see `_make_target_file_names` at the
+# `use_me.py` script), which must not be separated again.
+_output_suffixes = ('_voice.wav', '_bg_music.wav')
+
+
+def enqueue_process(spool_file_name, paths):
+    """Adds the WAV files of the `paths` to the spool.
+
+    :param spool_file_name: The file name of the spool.
+    :type spool_file_name: str
+    :param paths: Files, directories (searched recursively), or glob patterns.
+    :type paths: list[str]
+    """
+    sources = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, file_names in os.walk(path):
+                sources.extend(os.path.join(root, file_name) for file_name in file_names)
+        elif os.path.isfile(path):
+            sources.append(path)
+        else:
+            sources.extend(glob.glob(path, recursive=True))
+
+    sources = sorted(set(
+        os.path.abspath(source) for source in sources
+        if source.lower().endswith('.wav') and not source.endswith(_output_suffixes)
+    ))
+
+    spool = JobSpool(spool_file_name)
+
+    try:
+        nb_added = spool.enqueue(sources)
+    finally:
+        spool.close()
+
+    print('-- Found {} file(s), added {} new job(s) to {}'.format(
+        len(sources), nb_added, spool_file_name))
+
+
+def status_process(spool_file_name, max_attempts, nb_errors):
+    """Prints the progress of the spool.
+
+    :param spool_file_name: The file name of the spool.
+    :type spool_file_name: str
+    :param max_attempts: The maximum amount of attempts for a job.
+    :type max_attempts: int
+    :param nb_errors: The amount of the last errors to be printed.
+    :type nb_errors: int
+    """
+    spool = JobSpool(spool_file_name)
+
+    try:
+        stats = spool.stats(max_attempts)
+        errors = spool.errors(nb_errors)
+    finally:
+        spool.close()
+
+    print('-- Spool {}\n'.format(spool_file_name))
+    print('-- Pending: {pending} | Running: {running} | Done: {done} | '
+          'Failed: {failed} ({retriable} will be retried)'.format(**stats))
+    print('-- Done audio: {} | Processing time: {}'.format(
+        datetime.timedelta(seconds=int(stats['done_duration'])),
+        datetime.timedelta(seconds=int(stats['done_process_time']))
+    ))
+
+    if stats['throughput_duration'] is not None:
+        print('-- Audio throughput: {:.2f}x real-time'.format(stats['throughput_duration']))
+
+    print(usage_output_string_spool.format(
+        d=stats['done'], r=stats['remaining'], f=stats['failed'],
+        x=stats['throughput'] or 0.,
+        eta='unknown' if stats['eta'] is None else datetime.timedelta(seconds=int(stats['eta']))
+    ))
+
+    if len(errors) > 0:
+        print('\n-- Last errors:')
+        for source, attempts, error in errors:
+            print('-- {} (attempts: {}): {}'.format(source, attempts, error))
+
+
+def requeue_process(spool_file_name, statuses, older_than):
+    """Sets jobs back to pending.
+
+    :param spool_file_name: The file name of the spool.
+    :type spool_file_name: str
+    :param statuses: The statuses of the jobs to be set back to pending.
+    :type statuses: list[str]
+    :param older_than: Only jobs started more than `older_than` seconds ago\
+                       are set back to pending.
+    :type older_than: float
+    """
+    spool = JobSpool(spool_file_name)
+
+    try:
+        nb_jobs = spool.requeue(statuses, older_than)
+    finally:
+        spool.close()
+
+    print('-- {} job(s) set back to pending'.format(nb_jobs))
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/job_spool.py [--spool spool] enqueue|status|requeue ...',
+        description='Script to manage the job spool of the MaD TwinNet. Remember to set up '
+                    'properly the PYTHONPATH environmental variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--spool', action='store', dest='spool', default=job_spool_path,
+        help='The file name of the spool.'
+    )
+
+    commands = cmd_arg_parser.add_subparsers(dest='command')
+
+    enqueue_parser = commands.add_parser('enqueue', help='Add WAV files to the spool.')
+    enqueue_parser.add_argument(
+        'paths', nargs='+',
+        help='Files, directories (searched recursively), or glob patterns (e.g. "music/**/*.wav").'
+    )
+
+    status_parser = commands.add_parser('status', help='Print the progress of the spool.')
+    status_parser.add_argument(
+        '--max-attempts', action='store', dest='max_attempts', type=int,
+        default=job_spool_constants['max_attempts'],
+        help='The maximum amount of attempts for a job.'
+    )
+    status_parser.add_argument(
+        '--errors', action='store', dest='nb_errors', type=int, default=10,
+        help='The amount of the last errors to be printed.'
+    )
+
+    requeue_parser = commands.add_parser('requeue', help='Set failed or stuck jobs back to pending.')
+    requeue_parser.add_argument(
+        '--failed', action='store_true', dest='failed', default=False,
+        help='Set the failed jobs back to pending, with their attempts reset.'
+    )
+    requeue_parser.add_argument(
+        '--running', action='store_true', dest='running', default=False,
+        help='Set the running jobs (e.g. of workers that crashed) back to pending.'
+    )
+    requeue_parser.add_argument(
+        '--older-than', action='store', dest='older_than', type=float, default=None,
+        help='Only jobs started more than this amount of seconds ago. Required with '
+             '--running, so that the jobs of the workers that are still running are '
+             'not set back to pending.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    if cmd_args.command == 'enqueue':
+        enqueue_process(cmd_args.spool, cmd_args.paths)
+    elif cmd_args.command == 'status':
+        status_process(cmd_args.spool, cmd_args.max_attempts, cmd_args.nb_errors)
+    elif cmd_args.command == 'requeue':
+        statuses = (['failed'] if cmd_args.failed else []) + (['running'] if cmd_args.running else [])
+
+        if len(statuses) == 0:
+            print('-- Please specify --failed and/or --running.')
+            exit(-1)
+
+        if cmd_args.running and cmd_args.older_than is None:
+            print('-- Please specify --older-than with --running, e.g. --older-than 3600.')
+            exit(-1)
+
+        requeue_process(cmd_args.spool, statuses, cmd_args.older_than or 0)
+    else:
+        cmd_arg_parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Making of the single-file bundle of the MaD weights.
+"""
+
+from __future__ import print_function
+
+import argparse
+
+from helpers.model_bundle import write_bundle
+from helpers.settings import hyper_parameters, output_states_path, model_bundle_path
+from modules import MaD
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['make_bundle_process']
+
+
+def make_bundle_process(bundle_file_name):
+    """Makes the bundle from the separate files of the states of the modules.
+
+    :param bundle_file_name: The file name of the resulting bundle.
+    :type bundle_file_name: str
+    """
+    print('\n-- Making the MaD bundle {}... '.format(bundle_file_name), end='')
+
+    # The modules are used on CPU, i.e. debug is set to True.
+    mad = MaD(
+        hyper_parameters['reduced_dim'],
+        hyper_parameters['rnn_enc_output_dim'],
+        hyper_parameters['original_input_dim'],
+        hyper_parameters['context_length'],
+        True
+    )
+    mad.load_states(output_states_path)
+
+    write_bundle(
+        bundle_file_name,
+        {k: v.cpu().numpy() for k, v in mad.state_dict().items()},
+        hyper_parameters
+    )
+
+    print('done.')
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/make_bundle.py [-o the_bundle.bundle]',
+        description='Script to make the single-file bundle of the MaD TwinNet weights.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--output', '-o', action='store', dest='output', default=model_bundle_path,
+        help='The bundle file to be created.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    make_bundle_process(cmd_args.output)
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
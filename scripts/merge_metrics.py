@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Merging of the metrics stores of the shards of a testing run.
+
+Each shard (e.g. `python scripts/testing.py --shard 0/4` at one machine)\
+has its own metrics store. This script copies the stores of all shards\
+to one store and prints the global medians, as the testing script does\
+for a run without shards.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+
+from helpers.metrics_store import MetricsStore
+from helpers.settings import metrics_paths, testing_output_string_all, \
+    testing_output_string_all_fast
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['merge_metrics_process']
+
+
+def merge_metrics_process(input_directories, output_directory, fast):
+    """The merging process.
+
+    :param input_directories: The directories of the stores of the shards.
+    :type input_directories: list[str]
+    :param output_directory: The directory of the merged store. Its\
+                             previous contents are removed.
+    :type output_directory: str
+    :param fast: The stores have the fast metrics (SDR and SI-SDR).
+    :type fast: bool
+    """
+    if os.path.abspath(output_directory) in [os.path.abspath(i) for i in input_directories]:
+        print('-- The merged store cannot be one of the stores of the shards.')
+        print('-- Exiting.')
+        exit(-1)
+
+    merged_store = MetricsStore(output_directory)
+    merged_store.clear()
+
+    track_ids = set()
+
+    for input_directory in input_directories:
+        shard_track_ids = merged_store.merge(MetricsStore(input_directory))
+        duplicates = track_ids.intersection(shard_track_ids)
+
+        if len(duplicates) > 0:
+            print('-- Warning: tracks {} of {} exist at a previous store and are '
+                  'replaced.'.format(sorted(duplicates), input_directory))
+
+        track_ids.update(shard_track_ids)
+        print('-- {} track(s) from {}'.format(len(shard_track_ids), input_directory))
+
+    if len(track_ids) == 0:
+        print('-- No tracks to merge.')
+        return
+
+    records = merged_store.tracks()
+    metrics_names = ('sdr', 'si_sdr') if fast else ('sdr', 'sir')
+    output_string_all = testing_output_string_all_fast if fast else testing_output_string_all
+
+    print('\n-- Merged {} track(s) to {}\n'.format(len(track_ids), output_directory))
+    print(output_string_all.format(**{
+        metrics_name: merged_store.median('{}_voice'.format(metrics_name))
+        for metrics_name in metrics_names
+    }, t=sum(record['time'] for record in records.values())))
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/merge_metrics.py -i store_1 [store_2 ...] [-o merged_store] [-f]',
+        description='Script to merge the metrics stores of the shards of a testing run. '
+                    'Remember to set up properly the PYTHONPATH environmental variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--inputs', '-i', action='store', dest='input_directories', nargs='+', required=True,
+        help='The directories of the metrics stores of the shards.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--output', '-o', action='store', dest='output_directory', default=None,
+        help='The directory of the merged store (default the store of the settings).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--fast-metrics', '-f', action='store_true', dest='fast', default=False,
+        help='The stores have the fast metrics (SDR and SI-SDR).'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    output_directory = cmd_args.output_directory
+    if output_directory is None:
+        output_directory = metrics_paths['store_fast' if cmd_args.fast else 'store']
+
+    merge_metrics_process(
+        input_directories=cmd_args.input_directories,
+        output_directory=output_directory,
+        fast=cmd_args.fast
+    )
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Calculation of the global medians of the metrics at the metrics store.
+
+The columns are read one at a time, as NumPy arrays, so the medians do\
+not need all the metrics in memory. Optionally, the metrics are exported\
+to the lists of the older pickle files.
+"""
+
+from __future__ import print_function
+
+import argparse
+import pickle
+
+import numpy as np
+
+from helpers.metrics_store import MetricsStore
+from helpers.settings import metrics_paths
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['metrics_medians_process']
+
+_medians_output_string = 'Column: {c:>14s} | Tracks:{n:4d} | Frames:{f:7d} | Median:{m:6.2f} dB'
+_time_output_string = 'Total processing time:{t:8.2f} sec(s)'
+
+
+def metrics_medians_process(store_directory, track_ids, export_pickles, fast):
+    """Prints the medians of all the columns of the store.
+
+    :param store_directory: The directory of the store.
+    :type store_directory: str
+    :param track_ids: The ids of the tracks to be used. If None, all\
+                      tracks are used.
+    :type track_ids: list[int] | None
+    :param export_pickles: Export the metrics to the pickle files.
+    :type export_pickles: bool
+    :param fast: The store has the fast metrics (SDR and SI-SDR).
+    :type fast: bool
+    """
+    metrics_store = MetricsStore(store_directory)
+    records = metrics_store.tracks()
+
+    if track_ids is None:
+        track_ids = sorted(records)
+
+    if len(track_ids) == 0:
+        print('-- No tracks at the store {}'.format(store_directory))
+        return
+
+    print('-- Metrics store {} with {} track(s)\n'.format(store_directory, len(track_ids)))
+
+    for column in metrics_store.columns():
+        print(_medians_output_string.format(
+            c=column, n=len(track_ids),
+            f=sum(records[track_id]['frames'] for track_id in track_ids),
+            m=metrics_store.median(column, track_ids)
+        ))
+
+    print(_time_output_string.format(t=sum(records[track_id]['time'] for track_id in track_ids)))
+
+    if export_pickles:
+        metrics_names, metrics_keys = (('sdr', 'si_sdr'), ('sdr_fast', 'si_sdr_fast')) if fast \
+            else (('sdr', 'sir'), ('sdr', 'sir'))
+
+        for metrics_name, metrics_key in zip(metrics_names, metrics_keys):
+            voice = metrics_store.read('{}_voice'.format(metrics_name), track_ids)
+            bg = metrics_store.read('{}_bg'.format(metrics_name), track_ids)
+
+            with open(metrics_paths[metrics_key], 'wb') as f:
+                pickle.dump([np.stack([voice[track_id], bg[track_id]]) for track_id in track_ids],
+                            f, protocol=2)
+
+        print('\n-- Metrics exported to {} and {}'.format(
+            metrics_paths[metrics_keys[0]], metrics_paths[metrics_keys[1]]))
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/metrics_medians.py [-f] [-d store_directory] '
+              '[-t track_id [track_id ...]] [-e]',
+        description='Script to calculate the medians of the metrics of the testing. Remember '
+                    'to set up properly the PYTHONPATH environmental variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--fast-metrics', '-f', action='store_true', dest='fast', default=False,
+        help='Use the store of the fast metrics (SDR and SI-SDR).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--store', '-d', action='store', dest='store_directory', default=None,
+        help='The directory of the store (default from the settings).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--tracks', '-t', action='store', dest='track_ids', type=int, nargs='+', default=None,
+        help='The ids of the tracks to be used (default all).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--export-pickles', '-e', action='store_true', dest='export_pickles', default=False,
+        help='Export the metrics to the pickle files of the settings, as lists with '
+             'one (sources x frames) array per track.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    store_directory = cmd_args.store_directory
+    if store_directory is None:
+        store_directory = metrics_paths['store_fast' if cmd_args.fast else 'store']
+
+    metrics_medians_process(
+        store_directory=store_directory,
+        track_ids=cmd_args.track_ids,
+        export_pickles=cmd_args.export_pickles,
+        fast=cmd_args.fast
+    )
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
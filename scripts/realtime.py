@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Real-time separation, e.g. for a monitor feed.
+
+The audio is given in blocks, from a WAV file or as raw 16 bit PCM from\
+the standard input (e.g. `arecord -f S16_LE -r 44100 -c 2 | python\
+scripts/realtime.py -w - -m voice | aplay -f S16_LE -r 44100 -c 1`).\
+Each sequence is separated as soon as its frames, including the\
+`context_length` frames of lookahead, are available. The sequences are\
+as long as the given latency allows, and the compute time of each block\
+of the output is measured against the duration of the block.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+from helpers.audio_io import wav_read_chunks, WavWriter
+from helpers.settings import debug, hyper_parameters, output_states_path, model_bundle_path, \
+    wav_quality, realtime_constants, usage_output_string_compute
+from helpers.streaming import StreamSeparator, algorithmic_latency
+from modules import MaD
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['realtime_process']
+
+
+def realtime_process(source, output_file_names, latency, block_size, nb_channels, monitor):
+    """The real-time process.
+
+    :param source: The WAV file name, or `-` for raw 16 bit PCM from the\
+                   standard input.
+    :type source: str
+    :param output_file_names: The output file names, for the voice and\
+                              the background music.
+    :type output_file_names: list[str]
+    :param latency: The maximum algorithmic latency, in seconds.
+    :type latency: float
+    :param block_size: The amount of samples of each block of the input.
+    :type block_size: int
+    :param nb_channels: The amount of channels of the standard input.
+    :type nb_channels: int
+    :param monitor: The source (`voice` or `bg`) to be written as raw 16\
+                    bit PCM to the standard output, or None.
+    :type monitor: str | None
+    """
+    # With a monitor feed, the standard output has the audio
+    log_file = sys.stderr if monitor is not None else sys.stdout
+
+    print('\n-- Welcome to MaD TwinNet.', file=log_file)
+    if debug:
+        print('\n-- Cannot proceed in debug mode. Please set debug=False at the settings file.',
+              file=log_file)
+        print('-- Exiting.', file=log_file)
+        exit(-1)
+
+    window_size = hyper_parameters['window_size']
+    hop = hyper_parameters['hop_size']
+    context_length = hyper_parameters['context_length']
+    sampling_rate = wav_quality['sampling_rate']
+
+    seq_length = _get_seq_length(latency * sampling_rate, block_size)
+
+    if seq_length is None:
+        print('-- The latency must be at least {:.1f} ms. Exiting.'.format(
+            1000. * algorithmic_latency(window_size, hop, 2 * context_length + 1, context_length,
+                                        block_size) / sampling_rate), file=log_file)
+        exit(-1)
+
+    step = seq_length - 2 * context_length
+    step_duration = step * hop / float(sampling_rate)
+
+    print('-- Sequence length: {} frames ({} frames of lookahead)'.format(
+        seq_length, context_length), file=log_file)
+    print('-- Algorithmic latency: {:.1f} ms | Input block: {:.1f} ms | Output block: {:.1f} ms'.format(
+        1000. * algorithmic_latency(window_size, hop, seq_length, context_length, block_size) / sampling_rate,
+        1000. * block_size / sampling_rate, 1000. * step_duration), file=log_file)
+    print('-- Setting up modules... ', end='', file=log_file)
+
+    mad = MaD(
+        hyper_parameters['reduced_dim'],
+        hyper_parameters['rnn_enc_output_dim'],
+        hyper_parameters['original_input_dim'],
+        context_length,
+        debug
+    )
+
+    if os.path.isfile(model_bundle_path):
+        mad.load_bundle(model_bundle_path, hyper_parameters)
+    else:
+        mad.load_states(output_states_path)
+
+    if not debug and torch.has_cudnn:
+        mad = mad.cuda()
+
+    separator = StreamSeparator(
+        mad.predict_batch, window_size, hyper_parameters['fft_size'], hop,
+        seq_length, context_length, batch_size=1
+    )
+    writers = [WavWriter(file_name, **wav_quality) for file_name in output_file_names]
+
+    if source == '-':
+        blocks = _read_raw_blocks(sys.stdin.buffer, block_size, nb_channels)
+    else:
+        blocks = wav_read_chunks(source, block_size, mono=True)
+
+    print('done.', file=log_file)
+    print('-- Let\'s go!\n', file=log_file)
+
+    compute_times = []
+
+    try:
+        for block in blocks:
+            s_time = time.time()
+            outputs = separator.process(block)
+            f_time = time.time() - s_time
+
+            # A block of the output is given when a sequence is separated
+            if outputs[0].size > 0:
+                compute_times.append(f_time)
+
+            _write_outputs(writers, outputs, monitor)
+
+        _write_outputs(writers, separator.finish(), monitor)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for writer in writers:
+            writer.close()
+
+    print('\n-- Audio duration: {:.2f} sec(s) | Output blocks: {}'.format(
+        separator.nb_samples / float(sampling_rate), len(compute_times)), file=log_file)
+
+    if len(compute_times) > 0:
+        compute_times = np.array(compute_times)
+        print(usage_output_string_compute.format(
+            b=1000. * step_duration, m=1000. * np.mean(compute_times),
+            p=1000. * np.percentile(compute_times, 95), x=1000. * np.max(compute_times),
+            o=int(np.sum(compute_times > step_duration)), n=len(compute_times)
+        ), file=log_file)
+
+    print('-- That\'s all folks!', file=log_file)
+
+
+def _get_seq_length(latency, block_size):
+    """Gives the longest sequence length with an algorithmic latency up to\
+    `latency` samples.
+
+    :param latency: The maximum latency, in samples.
+    :type latency: float
+    :param block_size: The amount of samples of each block of the input.
+    :type block_size: int
+    :return: The sequence length in frames, or None if the latency is too small.
+    :rtype: int | None
+    """
+    context_length = hyper_parameters['context_length']
+
+    # The inverse of `helpers.streaming.algorithmic_latency`
+    step = int((latency - hyper_parameters['window_size'] - block_size + 1) //
+               hyper_parameters['hop_size']) - context_length + 1
+
+    return step + 2 * context_length if step > 0 else None
+
+
+def _read_raw_blocks(stream, block_size, nb_channels):
+    """Reads blocks of raw 16 bit PCM, converted to mono as by\
+    :func:`helpers.audio_io.wav_read`.
+
+    :param stream: The binary stream.
+    :type stream: io.BufferedReader
+    :param block_size: The amount of samples of each block.
+    :type block_size: int
+    :param nb_channels: The amount of channels.
+    :type nb_channels: int
+    :return: The blocks.
+    :rtype: collections.Iterable[numpy.core.multiarray.ndarray]
+    """
+    frame_size = 2 * nb_channels
+
+    while True:
+        data = stream.read(block_size * frame_size)
+        data = data[:len(data) - len(data) % frame_size]
+
+        if len(data) == 0:
+            break
+
+        samples = np.frombuffer(data, dtype='<i2').reshape(-1, nb_channels).astype(float) / (2 ** 15 - 1)
+
+        if nb_channels > 1:
+            yield (samples[:, 0] + samples[:, 1]) * 0.5
+        else:
+            yield samples[:, 0]
+
+
+def _write_outputs(writers, outputs, monitor):
+    """Writes the voice and the background music, and the monitor feed.
+
+    :param writers: The writers of the voice and the background music.
+    :type writers: list[helpers.audio_io.WavWriter]
+    :param outputs: The voice and the background music.
+    :type outputs: (numpy.core.multiarray.ndarray, numpy.core.multiarray.ndarray)
+    :param monitor: The source (`voice` or `bg`) of the monitor feed, or None.
+    :type monitor: str | None
+    """
+    for writer, output in zip(writers, outputs):
+        writer.write(output)
+
+    if monitor is not None and outputs[0].size > 0:
+        output = outputs[0 if monitor == 'voice' else 1]
+        sys.stdout.buffer.write(np.int16(output * (2 ** 15 - 1)).astype('<i2').tobytes())
+        sys.stdout.buffer.flush()
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/realtime.py -w the_file.wav|- [-o output_prefix] [-L latency] '
+              '[--block-size samples] [-c nb_channels] [-m voice|bg]',
+        description='Script to use the MaD TwinNet in real-time, on blocks of audio. Remember '
+                    'to set up properly the PYTHONPATH environmental variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--input-wav', '-w', action='store', dest='input_wav', required=True,
+        help='The wav file to be processed, or - for raw 16 bit PCM from the standard input.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--output', '-o', action='store', dest='output', default=None,
+        help='The prefix of the output files (default the input file name, or "realtime").'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--latency', '-L', action='store', dest='latency', type=float,
+        default=1000 * realtime_constants['latency'],
+        help='The maximum algorithmic latency in milliseconds. Longer latency means longer '
+             'sequences, which are faster to process.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--block-size', action='store', dest='block_size', type=int,
+        default=realtime_constants['block_size'],
+        help='The amount of samples of each block of the input.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--channels', '-c', action='store', dest='nb_channels', type=int, default=2,
+        help='The amount of channels of the raw PCM at the standard input.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--monitor', '-m', action='store', dest='monitor', choices=['voice', 'bg'], default=None,
+        help='Write the voice or the background music as raw 16 bit mono PCM to the '
+             'standard output.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    output = cmd_args.output
+    if output is None:
+        output = 'realtime' if cmd_args.input_wav == '-' else os.path.splitext(cmd_args.input_wav)[0]
+
+    realtime_process(
+        source=cmd_args.input_wav,
+        output_file_names=['{}_voice.wav'.format(output), '{}_bg_music.wav'.format(output)],
+        latency=cmd_args.latency / 1000.,
+        block_size=cmd_args.block_size,
+        nb_channels=cmd_args.nb_channels,
+        monitor=cmd_args.monitor
+    )
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Rendering of the saved separations (i.e. of the mask stores of\
+`scripts/use_me.py --save-masks` or `scripts/testing.py --save-masks`),\
+with any gain of the voice and the background music, without the MaD.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import time
+
+from helpers.audio_io import wav_write
+from helpers.mask_store import render_mask
+from helpers.settings import wav_quality
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['render_process']
+
+
+def render_process(store_file_names, output_file_names, voice_gain, bg_gain, nb_bits):
+    """The render process.
+
+    :param store_file_names: The file names of the mask stores.
+    :type store_file_names: list[str]
+    :param output_file_names: The output file names.
+    :type output_file_names: list[str]
+    :param voice_gain: The gain of the voice, in dB.
+    :type voice_gain: float
+    :param bg_gain: The gain of the background music, in dB.
+    :type bg_gain: float
+    :param nb_bits: The number of bits of the output files.
+    :type nb_bits: int
+    """
+    print('\n-- Rendering {} file(s) with voice at {:.1f} dB and background music '
+          'at {:.1f} dB'.format(len(store_file_names), voice_gain, bg_gain))
+
+    for store_file_name, output_file_name in zip(store_file_names, output_file_names):
+        s_time = time.time()
+
+        y, sampling_rate = render_mask(
+            store_file_name, voice_gain=10. ** (voice_gain / 20.), bg_gain=10. ** (bg_gain / 20.))
+
+        wav_write(y, sampling_rate, nb_bits, output_file_name)
+
+        print('-- File {} rendered to {}. Time: {:6.2f} sec(s)'.format(
+            store_file_name, output_file_name, time.time() - s_time))
+
+    print('-- That\'s all folks!')
+
+
+def _make_target_file_name(store_file_name):
+    """Makes the output file name of a mask store.
+
+    :param store_file_name: The file name of the mask store.
+    :type store_file_name: str
+    :return: The output file name.
+    :rtype: str
+    """
+    f_name = os.path.splitext(store_file_name)[0]
+
+    if f_name.endswith('_mask'):
+        f_name = f_name[:-len('_mask')]
+
+    return '{}_render.wav'.format(f_name)
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/render.py [-i the_file_mask.npz]|[-l the_files.txt] '
+              '[-o the_output.wav] [--voice-gain=dB] [--bg-gain=dB] [--nb-bits n]',
+        description='Script to render the saved separations of the MaD TwinNet with any gain '
+                    'of the voice and the background music, e.g. --bg-gain=-inf for the '
+                    'voice only. Remember to set up properly the PYTHONPATH environmental '
+                    'variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--input-store', '-i', action='store', dest='input_store', default='',
+        help='The mask store (.npz) to be rendered.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--input-list', '-l', action='store', dest='input_list', default='',
+        help='A txt file with the mask stores to be rendered, one in each line.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--output', '-o', action='store', dest='output', default=None,
+        help='The output file, for a single mask store (default the name of the mask store '
+             'with _render.wav).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--voice-gain', action='store', dest='voice_gain', type=float, default=0.,
+        help='The gain of the voice in dB (-inf to remove it).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--bg-gain', action='store', dest='bg_gain', type=float, default=0.,
+        help='The gain of the background music in dB (-inf to remove it).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--nb-bits', action='store', dest='nb_bits', type=int, default=wav_quality['nb_bits'],
+        help='The number of bits of the output files.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    if (cmd_args.input_store == '') == (cmd_args.input_list == ''):
+        print('-- Please specify **either** a mask store (with -i) **or** give '
+              'a txt file with mask stores in each line (with -l). ')
+        print('-- Exiting.')
+        exit(-1)
+
+    if cmd_args.input_store != '':
+        store_file_names = [cmd_args.input_store]
+    else:
+        with open(cmd_args.input_list) as f:
+            store_file_names = [line.strip() for line in f.readlines() if line.strip() != '']
+
+    if cmd_args.output is not None and len(store_file_names) == 1:
+        output_file_names = [cmd_args.output]
+    else:
+        output_file_names = [_make_target_file_name(file_name) for file_name in store_file_names]
+
+    render_process(
+        store_file_names=store_file_names,
+        output_file_names=output_file_names,
+        voice_gain=cmd_args.voice_gain,
+        bg_gain=cmd_args.bg_gain,
+        nb_bits=cmd_args.nb_bits
+    )
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Study of the effect of the inference sequence length on the\
+speed and the SDR of the MaD TwinNet.
+
+Each sequence has `2 * context_length` frames that are used only as\
+context, so with the training sequence length (60 frames) one third of\
+the processed frames is thrown away. This script runs the testing set\
+for each of the given sequence lengths and reports the inference time,\
+the amount of processed frames, and the median SDR and SIR, with respect\
+to the first sequence length given.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import time
+
+import numpy as np
+import torch
+
+from helpers.data_feeder import data_feeder_testing, data_process_results_testing
+from helpers.settings import debug, hyper_parameters, output_states_path, training_constants, \
+    model_bundle_path
+from modules import MaD
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['seq_length_study_process']
+
+_study_output_string = 'Seq. length:{l:5d} | Frames:{f:9d} | Inference time:{t:8.2f} sec(s) | ' \
+                       'Speed-up:{s:5.2f}x | Median SDR:{sdr:6.2f} dB ({d_sdr:+5.2f}) | ' \
+                       'Median SIR:{sir:6.2f} dB ({d_sir:+5.2f})'
+
+
+def seq_length_study_process(seq_lengths, nb_tracks):
+    """The study process.
+
+    :param seq_lengths: The sequence lengths in frames to be studied.
+    :type seq_lengths: list[int]
+    :param nb_tracks: The amount of testing tracks to be used. If 0, all\
+                      tracks are used.
+    :type nb_tracks: int
+    """
+    print('\n-- Starting the sequence length study. Debug mode: {}.'.format(debug))
+    print('-- Setting up modules... ', end='')
+
+    mad = MaD(
+        hyper_parameters['reduced_dim'],
+        hyper_parameters['rnn_enc_output_dim'],
+        hyper_parameters['original_input_dim'],
+        hyper_parameters['context_length'],
+        debug
+    )
+
+    if os.path.isfile(model_bundle_path):
+        mad.load_bundle(model_bundle_path, hyper_parameters)
+    else:
+        mad.load_states(output_states_path)
+
+    if not debug and torch.has_cudnn:
+        mad = mad.cuda()
+
+    print('done.')
+
+    results = []
+
+    for seq_length in seq_lengths:
+        print('-- Sequence length {}... '.format(seq_length), end='')
+
+        testing_it = data_feeder_testing(
+            window_size=hyper_parameters['window_size'], fft_size=hyper_parameters['fft_size'],
+            hop_size=hyper_parameters['hop_size'], seq_length=seq_length,
+            context_length=hyper_parameters['context_length'], batch_size=1,
+            debug=debug
+        )
+
+        sdr = []
+        sir = []
+        nb_frames = 0
+        inference_time = 0
+
+        for index, data in enumerate(testing_it()):
+            if 0 < nb_tracks <= index:
+                break
+
+            mix, mix_magnitude, mix_phase, voice_true, bg_true = data
+
+            s_time = time.time()
+            voice_predicted = mad.predict(mix_magnitude, training_constants['batch_size'])
+            inference_time += time.time() - s_time
+
+            nb_frames += mix_magnitude.shape[0] * mix_magnitude.shape[1]
+
+            tmp_sdr, tmp_sir = data_process_results_testing(
+                index=index, voice_true=voice_true, bg_true=bg_true,
+                voice_predicted=voice_predicted,
+                window_size=hyper_parameters['window_size'], mix=mix, mix_magnitude=mix_magnitude,
+                mix_phase=mix_phase, hop=hyper_parameters['hop_size'],
+                context_length=hyper_parameters['context_length']
+            )
+
+            sdr.extend([i for i in tmp_sdr[0] if not np.isnan(i)])
+            sir.extend([i for i in tmp_sir[0] if not np.isnan(i)])
+
+        results.append((seq_length, nb_frames, inference_time, np.median(sdr), np.median(sir)))
+
+        print('done.')
+
+    print('\n-- Study finished\n')
+
+    ref_time, ref_sdr, ref_sir = results[0][2], results[0][3], results[0][4]
+
+    for seq_length, nb_frames, inference_time, median_sdr, median_sir in results:
+        print(_study_output_string.format(
+            l=seq_length, f=nb_frames, t=inference_time,
+            s=ref_time / inference_time,
+            sdr=median_sdr, d_sdr=median_sdr - ref_sdr,
+            sir=median_sir, d_sir=median_sir - ref_sir
+        ))
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/seq_length_study.py [-s 60 300 500 1000] [-n nb_tracks]',
+        description='Script to study the effect of the inference sequence length. Remember '
+                    'to set up properly the PYTHONPATH environmental variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--seq-lengths', '-s', action='store', dest='seq_lengths', type=int, nargs='+',
+        default=[hyper_parameters['seq_length'], 300, 500, 1000],
+        help='The sequence lengths to be studied. The first one is the reference.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--nb-tracks', '-n', action='store', dest='nb_tracks', type=int, default=0,
+        help='The amount of testing tracks to be used (0 for all).'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    seq_length_study_process(cmd_args.seq_lengths, cmd_args.nb_tracks)
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,399 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Local separation service.
+
+The service loads the MaD TwinNet once and accepts separation requests\
+over HTTP, on localhost by default. The sequences of concurrent requests\
+are processed in shared batches. The endpoints are:
+
+- `POST /separate` with a JSON body `{"input": "file.wav"}`. The outputs\
+  are written next to the input file, as with the `use_me.py` script, and\
+  their paths are returned as JSON. The outputs cannot be given, so the\
+  service writes only next to the files it separates, and, with a root\
+  directory, it separates only the files under it.
+- `POST /separate?source=voice|bg|both` with a WAV file as body. The\
+  response is a WAV file with the voice, the background music, or both\
+  (as the first and the second channel, respectively).
+- `GET /stats`, which returns as JSON the amount of waiting requests and\
+  sequences, the amount of requests and batches, and the latency.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import torch
+
+from helpers.audio_io import wav_read, wav_write
+from helpers.batching import MicroBatcher
+from helpers.data_feeder import data_feeder_testing, data_process_results_testing
+from helpers.settings import debug, hyper_parameters, output_states_path, model_bundle_path, \
+    inference_constants, service_constants, wav_quality
+from modules import MaD
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['service_process']
+
+
+class _Service(object):
+    def __init__(self, seq_length, batch_size, max_wait):
+        """The state of the service, i.e. the MaD, the micro-batcher,\
+        and the statistics.
+
+        :param seq_length: The sequence length in frames used for the inference.
+        :type seq_length: int
+        :param batch_size: The batch size.
+        :type batch_size: int
+        :param max_wait: The maximum waiting time for filling a batch, in seconds.
+        :type max_wait: float
+        """
+        self.seq_length = seq_length
+
+        mad = MaD(
+            hyper_parameters['reduced_dim'],
+            hyper_parameters['rnn_enc_output_dim'],
+            hyper_parameters['original_input_dim'],
+            hyper_parameters['context_length'],
+            debug
+        )
+
+        if os.path.isfile(model_bundle_path):
+            mad.load_bundle(model_bundle_path, hyper_parameters)
+        else:
+            mad.load_states(output_states_path)
+
+        if not debug and torch.has_cudnn:
+            mad = mad.cuda()
+
+        self.batcher = MicroBatcher(
+            mad.predict_batch, batch_size, hyper_parameters['context_length'], max_wait)
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=service_constants['latency_window'])
+        self._nb_active = 0
+        self._nb_done = 0
+        self._nb_failed = 0
+        self._total_duration = 0.
+
+    def separate(self, source, output_file_names):
+        """Separates one file.
+
+        :param source: The file name.
+        :type source: str
+        :param output_file_names: The output file names, for the voice and\
+                                  the background music.
+        :type output_file_names: list[str]
+        :return: The duration of the file, in seconds.
+        :rtype: float
+        """
+        s_time = time.time()
+
+        with self._lock:
+            self._nb_active += 1
+
+        try:
+            testing_it = data_feeder_testing(
+                window_size=hyper_parameters['window_size'], fft_size=hyper_parameters['fft_size'],
+                hop_size=hyper_parameters['hop_size'], seq_length=self.seq_length,
+                context_length=hyper_parameters['context_length'], batch_size=1,
+                debug=debug, sources_list=[source]
+            )
+
+            mix, mix_magnitude, mix_phase, voice_true, bg_true = next(testing_it())
+
+            voice_predicted = self.batcher.predict(mix_magnitude)
+
+            data_process_results_testing(
+                index=0, voice_true=voice_true, bg_true=bg_true,
+                voice_predicted=voice_predicted,
+                window_size=hyper_parameters['window_size'], mix=mix, mix_magnitude=mix_magnitude,
+                mix_phase=mix_phase, hop=hyper_parameters['hop_size'],
+                context_length=hyper_parameters['context_length'],
+                output_file_name=output_file_names
+            )
+        except Exception:
+            with self._lock:
+                self._nb_active -= 1
+                self._nb_failed += 1
+            raise
+
+        duration = len(mix) / float(wav_quality['sampling_rate'])
+
+        with self._lock:
+            self._nb_active -= 1
+            self._nb_done += 1
+            self._total_duration += duration
+            self._latencies.append(time.time() - s_time)
+
+        return duration
+
+    def stats(self):
+        """Gives the statistics of the service.
+
+        :return: The statistics.
+        :rtype: dict
+        """
+        nb_waiting_requests, nb_waiting_sequences = self.batcher.queue_depth()
+
+        with self._lock:
+            latencies = np.array(self._latencies)
+            stats = {
+                'active_requests': self._nb_active,
+                'done_requests': self._nb_done,
+                'failed_requests': self._nb_failed,
+                'processed_duration': self._total_duration
+            }
+
+        stats.update({
+            'waiting_requests': nb_waiting_requests,
+            'waiting_sequences': nb_waiting_sequences,
+            'batches': self.batcher.nb_batches,
+            'mean_batch_size': self.batcher.nb_batched_sequences / float(max(self.batcher.nb_batches, 1)),
+            'latency': {
+                'mean': float(np.mean(latencies)) if len(latencies) > 0 else None,
+                'p50': float(np.percentile(latencies, 50)) if len(latencies) > 0 else None,
+                'p95': float(np.percentile(latencies, 95)) if len(latencies) > 0 else None,
+                'max': float(np.max(latencies)) if len(latencies) > 0 else None
+            }
+        })
+
+        return stats
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = 'MaDTwinNet/1.0'
+
+    def do_GET(self):
+        if urlparse(self.path).path == '/stats':
+            self._send_json(200, self.server.service.stats())
+        else:
+            self._send_json(404, {'error': 'Unknown path {}'.format(self.path)})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+
+        if url.path != '/separate':
+            self._send_json(404, {'error': 'Unknown path {}'.format(self.path)})
+            return
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        try:
+            if self.headers.get('Content-Type', '').startswith('application/json'):
+                self._separate_path(json.loads(body.decode('utf-8')))
+            else:
+                self._separate_upload(body, parse_qs(url.query).get('source', ['both'])[0])
+        except Exception as e:
+            self._send_json(500, {'error': '{}: {}'.format(type(e).__name__, e)})
+
+    def _separate_path(self, request):
+        """Separates a file, given by its path. The outputs are written\
+        next to it.
+
+        :param request: The request, with the `input`.
+        :type request: dict
+        """
+        source = request['input']
+        root = self.server.root
+
+        if 'outputs' in request:
+            self._send_json(400, {'error': 'The outputs cannot be given, they are written next '
+                                           'to the input.'})
+            return
+
+        if root is not None and not os.path.realpath(source).startswith(
+                os.path.join(os.path.realpath(root), '')):
+            self._send_json(403, {'error': 'The file {} is not under {}.'.format(source, root)})
+            return
+
+        if not os.path.isfile(source):
+            self._send_json(400, {'error': 'The file {} does not exist.'.format(source)})
+            return
+
+        f_name = os.path.splitext(source)[0]
+        output_file_names = ['{}_voice.wav'.format(f_name), '{}_bg_music.wav'.format(f_name)]
+
+        s_time = time.time()
+        duration = self.server.service.separate(source, output_file_names)
+
+        self._send_json(200, {
+            'input': source, 'outputs': output_file_names,
+            'duration': duration, 'time': time.time() - s_time
+        })
+
+    def _separate_upload(self, wav_data, source_name):
+        """Separates an uploaded WAV file and sends back the result as WAV file.
+
+        :param wav_data: The contents of the WAV file.
+        :type wav_data: bytes
+        :param source_name: The source to be sent back, i.e. `voice`, `bg`, or `both`.
+        :type source_name: str
+        """
+        if source_name not in ['voice', 'bg', 'both']:
+            self._send_json(400, {'error': 'Unknown source {}.'.format(source_name)})
+            return
+
+        tmp_dir = tempfile.mkdtemp(prefix='mad_service_')
+
+        try:
+            source = os.path.join(tmp_dir, 'input.wav')
+            output_file_names = [os.path.join(tmp_dir, 'voice.wav'), os.path.join(tmp_dir, 'bg_music.wav')]
+
+            with open(source, 'wb') as f:
+                f.write(wav_data)
+
+            self.server.service.separate(source, output_file_names)
+
+            if source_name == 'both':
+                response_file_name = os.path.join(tmp_dir, 'both.wav')
+                wav_write(
+                    np.stack([wav_read(file_name)[0] for file_name in output_file_names], axis=1),
+                    file_name=response_file_name, **wav_quality
+                )
+            else:
+                response_file_name = output_file_names[0 if source_name == 'voice' else 1]
+
+            with open(response_file_name, 'rb') as f:
+                response = f.read()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/wav')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def _send_json(self, code, contents):
+        """Sends a JSON response.
+
+        :param code: The HTTP status code.
+        :type code: int
+        :param contents: The contents of the response.
+        :type contents: dict
+        """
+        response = json.dumps(contents).encode('utf-8')
+
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def service_process(host, port, seq_length, batch_size, max_wait, root=None):
+    """The service process.
+
+    :param host: The host name or address to listen at.
+    :type host: str
+    :param port: The port to listen at.
+    :type port: int
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size, with sequences from one or more requests.
+    :type batch_size: int
+    :param max_wait: The maximum waiting time for filling a batch, in seconds.
+    :type max_wait: float
+    :param root: The directory that the files given by their path must be\
+                 under. If None, any file can be given.
+    :type root: str | None
+    """
+    print('\n-- Welcome to MaD TwinNet.')
+    if debug:
+        print('\n-- Cannot proceed in debug mode. Please set debug=False at the settings file.')
+        print('-- Exiting.')
+        exit(-1)
+    print('-- Setting up modules... ', end='')
+
+    server = _ThreadingHTTPServer((host, port), _RequestHandler)
+    server.service = _Service(seq_length, batch_size, max_wait)
+    server.root = root
+
+    print('done.')
+    print('-- Listening at http://{}:{}/ (press Ctrl+C to stop)'.format(host, port))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.batcher.close()
+
+    print('\n-- That\'s all folks!')
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/service.py [--host host] [--port port] [-s seq_length] '
+              '[-b batch_size] [--max-wait seconds] [--root directory]',
+        description='Script to run the MaD TwinNet as a local service. Remember to set up properly'
+                    'the PYTHONPATH environmental variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--host', action='store', dest='host', default=service_constants['host'],
+        help='The host name or address to listen at.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--port', action='store', dest='port', type=int, default=service_constants['port'],
+        help='The port to listen at.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--seq-length', '-s', action='store', dest='seq_length', type=int,
+        default=inference_constants['seq_length'],
+        help='The sequence length in frames used for the inference (context frames included).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--batch-size', '-b', action='store', dest='batch_size', type=int,
+        default=inference_constants['batch_size'],
+        help='The batch size. Batches are filled with sequences from concurrent requests.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--max-wait', action='store', dest='max_wait', type=float,
+        default=service_constants['max_wait'],
+        help='The maximum waiting time (in seconds) for more requests to fill a batch.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--root', action='store', dest='root', default=service_constants['root'],
+        help='Separate only the files under this directory, when given by their path.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    service_process(
+        host=cmd_args.host,
+        port=cmd_args.port,
+        seq_length=cmd_args.seq_length,
+        batch_size=cmd_args.batch_size,
+        max_wait=cmd_args.max_wait,
+        root=cmd_args.root
+    )
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Client of the local separation service (see `scripts/service.py`).
+
+It has the input arguments of the `use_me.py` script, but the separation\
+is done by the service, which has the MaD TwinNet already loaded.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import time
+from multiprocessing.pool import ThreadPool
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from helpers.audio_io import wav_read, wav_write
+from helpers.settings import service_constants, usage_output_string_per_example, \
+    usage_output_string_total, usage_output_string_realtime, wav_quality
+
+__author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
+__docformat__ = 'reStructuredText'
+__all__ = ['service_client_process']
+
+
+def service_client_process(url, sources_list, upload, nb_concurrent):
+    """Sends the files to the service for separation.
+
+    :param url: The URL of the service.
+    :type url: str
+    :param sources_list: The file names to be used.
+    :type sources_list: list[str]
+    :param upload: Upload the files and get back the results, instead of\
+                   giving their paths (e.g. for a service at a container).
+    :type upload: bool
+    :param nb_concurrent: The amount of concurrent requests.
+    :type nb_concurrent: int
+    """
+    separate = _separate_upload if upload else _separate_path
+
+    print('-- Sending {} file(s) to {}, with {} concurrent request(s)\n'.format(
+        len(sources_list), url, nb_concurrent))
+
+    pool = ThreadPool(nb_concurrent)
+    total_duration = 0
+    s_time = time.time()
+
+    for source, duration, f_time in pool.imap_unordered(
+            lambda source: separate(url, source), sources_list):
+        print(usage_output_string_per_example.format(f=source, t=f_time))
+        total_duration += duration
+
+    pool.close()
+    pool.join()
+
+    total_time = time.time() - s_time
+
+    print('\n-- Testing finished\n')
+    print(usage_output_string_total.format(t=total_time))
+    print(usage_output_string_realtime.format(
+        d=total_duration, t=total_time,
+        r=total_time / total_duration, x=total_duration / total_time
+    ))
+
+
+def _separate_path(url, source):
+    """Separates a file, giving its path to the service.
+
+    :param url: The URL of the service.
+    :type url: str
+    :param source: The file name.
+    :type source: str
+    :return: The file name, its duration, and the processing time in seconds.
+    :rtype: (str, float, float)
+    """
+    s_time = time.time()
+
+    response = _request(url + '/separate', json.dumps(
+        {'input': os.path.abspath(source)}).encode('utf-8'), 'application/json')
+
+    return source, json.loads(response.decode('utf-8'))['duration'], time.time() - s_time
+
+
+def _separate_upload(url, source):
+    """Separates a file, uploading it to the service. The results are\
+    written next to the file, as with the `use_me.py` script.
+
+    :param url: The URL of the service.
+    :type url: str
+    :param source: The file name.
+    :type source: str
+    :return: The file name, its duration, and the processing time in seconds.
+    :rtype: (str, float, float)
+    """
+    s_time = time.time()
+
+    with open(source, 'rb') as f:
+        response = _request(url + '/separate?source=both', f.read(), 'audio/wav')
+
+    f_name = os.path.splitext(source)[0]
+    response_file_name = '{}_mad_response.wav'.format(f_name)
+
+    try:
+        with open(response_file_name, 'wb') as f:
+            f.write(response)
+
+        both = wav_read(response_file_name)[0]
+    finally:
+        os.remove(response_file_name)
+
+    wav_write(np.ascontiguousarray(both[:, 0]), file_name='{}_voice.wav'.format(f_name), **wav_quality)
+    wav_write(np.ascontiguousarray(both[:, 1]), file_name='{}_bg_music.wav'.format(f_name), **wav_quality)
+
+    return source, len(both) / float(wav_quality['sampling_rate']), time.time() - s_time
+
+
+def _request(url, data=None, content_type=None):
+    """Sends a request to the service.
+
+    :param url: The URL.
+    :type url: str
+    :param data: The body of a POST request. If None, the request is a GET request.
+    :type data: bytes | None
+    :param content_type: The content type of the body.
+    :type content_type: str | None
+    :return: The body of the response.
+    :rtype: bytes
+    """
+    headers = {} if content_type is None else {'Content-Type': content_type}
+
+    return urlopen(Request(url, data=data, headers=headers)).read()
+
+
+def _get_file_names_from_file(file_name):
+    """Reads line by line a txt file and returns the contents.
+
+    :param file_name: The file name of the txt file.
+    :type file_name: str
+    :return: The contents of the file, in a line-by-line fashion.
+    :rtype: list[str]
+    """
+    with open(file_name) as f:
+        return [line.strip() for line in f.readlines()]
+
+
+def main():
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/service_client.py [-w the_file.wav]|[-l the_files.txt]|[--stats] '
+              '[-c nb_concurrent] [-u] [--host host] [--port port]',
+        description='Script to use the local MaD TwinNet service with your own files. Remember '
+                    'to set up properly the PYTHONPATH environmental variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--input-wav', '-w', action='store', dest='input_wav', default='',
+        help='Specify one wav file to be processed.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--input-list', '-l', action='store', dest='input_list', default=[],
+        help='Specify one txt file with each line to be one path for a wav file.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--concurrent', '-c', action='store', dest='nb_concurrent', type=int, default=4,
+        help='The amount of concurrent requests.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--upload', '-u', action='store_true', dest='upload', default=False,
+        help='Upload the files to the service, instead of giving their paths.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--stats', action='store_true', dest='stats', default=False,
+        help='Print the statistics of the service and exit.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--host', action='store', dest='host', default=service_constants['host'],
+        help='The host name or address of the service.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--port', action='store', dest='port', type=int, default=service_constants['port'],
+        help='The port of the service.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+    url = 'http://{}:{}'.format(cmd_args.host, cmd_args.port)
+
+    if cmd_args.stats:
+        print(json.dumps(json.loads(_request(url + '/stats').decode('utf-8')), indent=2, sort_keys=True))
+        return
+
+    input_wav = cmd_args.input_wav
+    input_list = cmd_args.input_list
+
+    if (input_wav == '' and len(input_list) == 0) or (input_wav != '' and len(input_list) != 0):
+        print('-- Please specify **either** a wav file (with -w) **or** give'
+              'a txt file with file names in each line (with -l). ')
+        print('-- Exiting.')
+        exit(-1)
+
+    if len(input_list) == 0:
+        input_list = [input_wav]
+    else:
+        input_list = _get_file_names_from_file(input_list)
+
+    service_client_process(
+        url=url,
+        sources_list=input_list,
+        upload=cmd_args.upload,
+        nb_concurrent=cmd_args.nb_concurrent
+    )
+
+
+if __name__ == '__main__':
+    main()
+
+# EOF
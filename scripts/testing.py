@@ -6,142 +6,396 @@
 
 from __future__ import print_function
 
-import pickle
+import argparse
+import os
 import time
 
 import numpy as np
 import torch
-from torch.autograd import Variable
 
-from helpers.data_feeder import data_feeder_testing, data_process_results_testing
+from helpers.data_feeder import data_reader_testing, data_process_results_testing, \
+    data_durations_testing
+from helpers.energy_gate import EnergyGate
+from helpers.metrics import MetricsPool, bss_eval_metrics, fast_metrics
+from helpers.metrics_store import MetricsStore
+from helpers.pipeline import pipeline
+from helpers.resume import run_fingerprint
+from helpers.sharding import shard_argument, shard_indices
 from helpers.settings import debug, hyper_parameters, output_states_path, training_constants, \
-    testing_output_string_per_example, metrics_paths, testing_output_string_all
-from modules import RNNEnc, RNNDec, FNNMasker, FNNDenoiser
+    model_bundle_path, testing_output_string_per_example, metrics_paths, testing_output_string_all, \
+    inference_constants, testing_output_string_per_example_fast, testing_output_string_all_fast, \
+    output_audio_paths, energy_gate_constants, usage_output_string_gate, testing_output_string_gate
+from modules import MaD
 
 __author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
 __docformat__ = 'reStructuredText'
 __all__ = ['testing_process']
 
 
-def testing_process():
+def testing_process(seq_length, stage_threads=None, nb_metrics_workers=0, fast=False,
+                    force=False, shard=None, save_masks=False, energy_gate=None):
     """The testing process.
+
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param stage_threads: The amount of threads for reading, inference, and\
+                          synthesis/metrics. If given, the three stages run\
+                          as a pipeline, i.e. the stages of consecutive tracks\
+                          overlap. If None, the tracks are processed one by one.
+    :type stage_threads: (int, int, int) | None
+    :param nb_metrics_workers: The amount of worker processes for the\
+                               calculation of the metrics. If 0, the metrics\
+                               are calculated inline, before the next track.
+    :type nb_metrics_workers: int
+    :param fast: Calculate the fast SDR and SI-SDR, instead of the BSS-eval\
+                 SDR and SIR (e.g. for quick regression checks).
+    :type fast: bool
+    :param force: Process all the tracks. If False, the tracks that are\
+                  already processed with the same weights and settings\
+                  are not processed again.
+    :type force: bool
+    :param shard: The index of the shard and the amount of shards, for\
+                  processing only the tracks of one shard (see\
+                  :func:`helpers.sharding.shard_indices`). If None, all the\
+                  tracks are processed.
+    :type shard: (int, int) | None
+    :param save_masks: Save also the predicted voice magnitude, the mixture\
+                       phase, and the mixture of each track, for re-rendering\
+                       (see :mod:`helpers.mask_store`).
+    :type save_masks: bool
+    :param energy_gate: The level threshold in dB of the energy gate (see\
+                        :mod:`helpers.energy_gate`). The metrics are saved at\
+                        a separate store, and their medians are compared to\
+                        the ones of the tracks that are processed without\
+                        the gate. If None, all the sequences are predicted.
+    :type energy_gate: float | None
     """
 
     print('\n-- Starting testing process. Debug mode: {}.'.format(debug))
+
+    if fast:
+        metrics_function = fast_metrics
+        output_string_all = testing_output_string_all_fast
+        metrics_names = ('sdr', 'si_sdr')
+        store_path = metrics_paths['store_fast']
+    else:
+        metrics_function = bss_eval_metrics
+        output_string_all = testing_output_string_all
+        metrics_names = ('sdr', 'sir')
+        store_path = metrics_paths['store']
+
+    if energy_gate is None:
+        metrics_store = MetricsStore(store_path)
+    else:
+        metrics_store = MetricsStore('{}_gate{:g}'.format(store_path, energy_gate))
+
     print('-- Setting up modules... ', end='')
 
-    # Masker modules
-    rnn_enc = RNNEnc(hyper_parameters['reduced_dim'], hyper_parameters['context_length'], debug)
-    rnn_dec = RNNDec(hyper_parameters['rnn_enc_output_dim'], debug)
-    fnn = FNNMasker(
+    # Masker and Denoiser modules
+    mad = MaD(
+        hyper_parameters['reduced_dim'],
         hyper_parameters['rnn_enc_output_dim'],
         hyper_parameters['original_input_dim'],
-        hyper_parameters['context_length']
+        hyper_parameters['context_length'],
+        debug
     )
 
-    # Denoiser modules
-    denoiser = FNNDenoiser(hyper_parameters['original_input_dim'])
-
-    rnn_enc.load_state_dict(torch.load(output_states_path['rnn_enc']))
-    rnn_dec.load_state_dict(torch.load(output_states_path['rnn_dec']))
-    fnn.load_state_dict(torch.load(output_states_path['fnn']))
-    denoiser.load_state_dict(torch.load(output_states_path['denoiser']))
+    if os.path.isfile(model_bundle_path):
+        mad.load_bundle(model_bundle_path, hyper_parameters)
+    else:
+        mad.load_states(output_states_path)
 
     if not debug and torch.has_cudnn:
-        rnn_enc = rnn_enc.cuda()
-        rnn_dec = rnn_dec.cuda()
-        fnn = fnn.cuda()
-        denoiser = denoiser.cuda()
+        mad = mad.cuda()
+
+    if energy_gate is None:
+        predictor = mad
+    else:
+        predictor = EnergyGate(
+            mad, energy_gate, hyper_parameters['window_size'], hyper_parameters['context_length'])
 
     print('done.')
 
-    testing_it = data_feeder_testing(
+    nb_examples, read_example = data_reader_testing(
         window_size=hyper_parameters['window_size'], fft_size=hyper_parameters['fft_size'],
-        hop_size=hyper_parameters['hop_size'], seq_length=hyper_parameters['seq_length'],
+        hop_size=hyper_parameters['hop_size'], seq_length=seq_length,
         context_length=hyper_parameters['context_length'], batch_size=1,
         debug=debug
     )
 
-    print('-- Testing starts\n')
-
-    sdr = []
-    sir = []
-    total_time = 0
+    def read(index):
+        return index, read_example(index)
 
-    for index, data in enumerate(testing_it()):
+    def infer(example):
+        index, data = example
+        return index, data, predictor.predict(data[1], training_constants['batch_size'])
 
-        s_time = time.time()
+    def evaluate(prediction):
+        index, (mix, mix_magnitude, mix_phase, voice_true, bg_true), voice_predicted = prediction
+        return data_process_results_testing(
+            index=index, voice_true=voice_true, bg_true=bg_true,
+            voice_predicted=voice_predicted,
+            window_size=hyper_parameters['window_size'], mix=mix, mix_magnitude=mix_magnitude,
+            mix_phase=mix_phase, hop=hyper_parameters['hop_size'],
+            context_length=hyper_parameters['context_length'],
+            metrics_pool=metrics_pool, metrics_function=metrics_function,
+            mask_file_name=output_audio_paths['mask'].format(p=index + 1) if save_masks else None
+        )
 
-        mix, mix_magnitude, mix_phase, voice_true, bg_true = data
+    if nb_metrics_workers > 0:
+        metrics_pool = MetricsPool(nb_metrics_workers, metrics_function)
+    else:
+        metrics_pool = None
+
+    if energy_gate is None:
+        fingerprint = run_fingerprint(seq_length=seq_length)
+    else:
+        fingerprint = run_fingerprint(seq_length=seq_length, energy_gate=energy_gate)
+    records = {} if force else metrics_store.tracks()
+
+    if shard is None:
+        examples = list(range(nb_examples))
+    else:
+        examples = shard_indices(data_durations_testing()[:nb_examples], *shard)
+        print('-- Shard {}/{}: {} of {} tracks'.format(shard[0], shard[1], len(examples), nb_examples))
+
+    pending = [index for index in examples
+               if not _is_example_processed(index + 1, records, fingerprint, save_masks)]
+
+    if len(pending) < len(examples):
+        print('-- Resuming: {} of {} tracks are already processed (use --force to '
+              'process them again)'.format(len(examples) - len(pending), len(examples)))
+
+    if stage_threads is None:
+        results = (evaluate(infer(read(index))) for index in pending)
+    else:
+        results = pipeline(pending, [
+            (read, stage_threads[0]), (infer, stage_threads[1]), (evaluate, stage_threads[2])
+        ])
 
-        voice_predicted = np.zeros(
-            (
-                mix_magnitude.shape[0],
-                hyper_parameters['seq_length'] - hyper_parameters['context_length'] * 2,
-                hyper_parameters['window_size']
-            ),
-            dtype=np.float32
-        )
+    print('-- Testing starts\n')
 
-        for batch in range(int(mix_magnitude.shape[0] / training_constants['batch_size'])):
-            b_start = batch * training_constants['batch_size']
-            b_end = (batch + 1) * training_constants['batch_size']
+    examples_time = {}
+    waiting_metrics = []
+    start_time = s_time = time.time()
 
-            v_in = Variable(torch.from_numpy(mix_magnitude[b_start:b_end, :, :]))
+    # The metrics of each track are stored as soon as they are ready
+    def store(index, tmp_sdr, tmp_sir):
+        _print_example_metrics(index, tmp_sdr, tmp_sir, examples_time[index], fast)
+        metrics_store.append(
+            index + 1, dict(zip(metrics_names, (tmp_sdr, tmp_sir))), examples_time[index],
+            fingerprint)
 
-            if not debug and torch.has_cudnn:
-                v_in = v_in.cuda()
+    for index, (tmp_sdr, tmp_sir) in zip(pending, results):
 
-            tmp_voice_predicted = rnn_enc(v_in)
-            tmp_voice_predicted = rnn_dec(tmp_voice_predicted)
-            tmp_voice_predicted = fnn(tmp_voice_predicted, v_in)
-            tmp_voice_predicted = denoiser(tmp_voice_predicted)
+        e_time = time.time()
+        examples_time[index] = e_time - s_time
+        s_time = e_time
 
-            voice_predicted[b_start:b_end, :, :] = tmp_voice_predicted.data.cpu().numpy()
+        if metrics_pool is None:
+            store(index, tmp_sdr, tmp_sir)
+        else:
+            # With the pipeline, the metrics of a track can be ready before
+            # its time is known, so they wait for it
+            waiting_metrics.extend(metrics_pool.ready())
 
-        tmp_sdr, tmp_sir = data_process_results_testing(
-            index=index, voice_true=voice_true, bg_true=bg_true,
-            voice_predicted=voice_predicted,
-            window_size=hyper_parameters['window_size'], mix=mix, mix_magnitude=mix_magnitude,
-            mix_phase=mix_phase, hop=hyper_parameters['hop_size'],
-            context_length=hyper_parameters['context_length']
-        )
+            for ready_metrics in [m for m in waiting_metrics if m[0] in examples_time]:
+                waiting_metrics.remove(ready_metrics)
+                store(*ready_metrics)
 
-        e_time = time.time()
+    if metrics_pool is not None:
+        print('-- Waiting for the metrics...\n')
 
-        print(testing_output_string_per_example.format(
-            e=index,
-            sdr=np.median([i for i in tmp_sdr[0] if not np.isnan(i)]),
-            sir=np.median([i for i in tmp_sir[0] if not np.isnan(i)]),
-            t=e_time - s_time
-        ))
+        try:
+            for ready_metrics in waiting_metrics:
+                store(*ready_metrics)
 
-        total_time += e_time - s_time
+            for ready_metrics in metrics_pool.gather():
+                store(*ready_metrics)
+        finally:
+            metrics_pool.close()
 
-        sdr.append(tmp_sdr)
-        sir.append(tmp_sir)
+    total_time = time.time() - start_time
 
     print('\n-- Testing finished\n')
-    print(testing_output_string_all.format(
-        sdr=np.median([ii for i in sdr for ii in i[0] if not np.isnan(ii)]),
-        sir=np.median([ii for i in sir for ii in i[0] if not np.isnan(ii)]),
-        t=total_time
+    print(output_string_all.format(**{
+        metrics_name: metrics_store.median(
+            '{}_voice'.format(metrics_name), [index + 1 for index in examples])
+        for metrics_name in metrics_names
+    }, t=total_time))
+
+    if energy_gate is not None:
+        _print_gate_impact(
+            predictor, metrics_store, MetricsStore(store_path),
+            run_fingerprint(seq_length=seq_length), [index + 1 for index in examples])
+
+    print('\n-- Metrics saved at {}'.format(metrics_store.directory))
+    print('-- That\'s all folks!')
+
+
+def _is_example_processed(example_index, records, fingerprint, save_masks):
+    """Checks if a testing example is processed with the current weights\
+    and settings, i.e. its metrics are at the store, with the current\
+    fingerprint, and its audio files exist.
+
+    :param example_index: The index of the example (starting from 1).
+    :type example_index: int
+    :param records: The records of the metrics store.
+    :type records: dict[int, dict]
+    :param fingerprint: The fingerprint of the run.
+    :type fingerprint: str
+    :param save_masks: The mask store of the example must exist too.
+    :type save_masks: bool
+    :return: True if the example is processed.
+    :rtype: bool
+    """
+    record = records.get(example_index)
+
+    if record is None or record.get('fingerprint') != fingerprint:
+        return False
+
+    return all(os.path.isfile(path.format(p=example_index))
+               for name, path in output_audio_paths.items() if name != 'mask' or save_masks)
+
+
+def _print_gate_impact(energy_gate, metrics_store, baseline_store, baseline_fingerprint, track_ids):
+    """Prints the sequences that the energy gate skipped, and the median\
+    SDR of the voice with and without the gate, for the tracks that are\
+    processed without the gate too.
+
+    :param energy_gate: The energy gate.
+    :type energy_gate: helpers.energy_gate.EnergyGate
+    :param metrics_store: The metrics store of the run with the gate.
+    :type metrics_store: helpers.metrics_store.MetricsStore
+    :param baseline_store: The metrics store of the runs without the gate.
+    :type baseline_store: helpers.metrics_store.MetricsStore
+    :param baseline_fingerprint: The fingerprint of the run without the gate.
+    :type baseline_fingerprint: str
+    :param track_ids: The ids of the tracks of the run.
+    :type track_ids: list[int]
+    """
+    print(usage_output_string_gate.format(
+        g=energy_gate.threshold, s=energy_gate.nb_skipped, n=energy_gate.nb_sequences,
+        p=100. * energy_gate.nb_skipped / max(energy_gate.nb_sequences, 1),
+        t=energy_gate.time_saved()
     ))
 
-    print('\n-- Saving results... ', end='')
+    records = baseline_store.tracks()
+    track_ids = [track_id for track_id in track_ids
+                 if records.get(track_id, {}).get('fingerprint') == baseline_fingerprint]
 
-    with open(metrics_paths['sdr'], 'wb') as f:
-        pickle.dump(sdr, f, protocol=2)
+    if len(track_ids) == 0:
+        print('-- For the SDR impact of the energy gate, please test without it too.')
+        return
 
-    with open(metrics_paths['sir'], 'wb') as f:
-        pickle.dump(sir, f, protocol=2)
+    sdr_gate = metrics_store.median('sdr_voice', track_ids)
+    sdr_baseline = baseline_store.median('sdr_voice', track_ids)
 
-    print('done!')
-    print('-- That\'s all folks!')
+    print(testing_output_string_gate.format(
+        g=sdr_gate, b=sdr_baseline, d=sdr_gate - sdr_baseline, n=len(track_ids)))
+
+
+def _print_example_metrics(index, sdr, sir, example_time, fast):
+    """Prints the median SDR and SIR (or SI-SDR) of a track.
+
+    :param index: The index of the track.
+    :type index: int
+    :param sdr: The SDR for each of the frames of the track.
+    :type sdr: numpy.core.multiarray.ndarray
+    :param sir: The SIR (or SI-SDR) for each of the frames of the track.
+    :type sir: numpy.core.multiarray.ndarray
+    :param example_time: The processing time of the track, in seconds.
+    :type example_time: float
+    :param fast: The metrics are the fast SDR and SI-SDR.
+    :type fast: bool
+    """
+    sdr = np.median([i for i in sdr[0] if not np.isnan(i)])
+    sir = np.median([i for i in sir[0] if not np.isnan(i)])
+
+    if fast:
+        print(testing_output_string_per_example_fast.format(
+            e=index, sdr=sdr, si_sdr=sir, t=example_time))
+    else:
+        print(testing_output_string_per_example.format(
+            e=index, sdr=sdr, sir=sir, t=example_time))
 
 
 def main():
-    testing_process()
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/testing.py [-s seq_length] [-P read infer eval] '
+              '[-m nb_metrics_workers] [-f] [--force] '
+              '[--shard i/N] [-k] [-g [dB]]',
+        description='Script to test the MaD TwinNet. Remember to set up properly'
+                    'the PYTHONPATH environmental variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--seq-length', '-s', action='store', dest='seq_length', type=int,
+        default=inference_constants['seq_length'],
+        help='The sequence length in frames used for the inference (context frames included).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--pipeline', '-P', action='store', dest='stage_threads', type=int, nargs=3,
+        default=None, metavar=('READ', 'INFER', 'EVAL'),
+        help='Run reading, inference, and synthesis/metrics as a pipeline, '
+             'with the given amount of threads per stage.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--metrics-workers', '-m', action='store', dest='nb_metrics_workers', type=int,
+        default=0,
+        help='The amount of worker processes that calculate the metrics, while the '
+             'inference goes on with the next tracks (0 for inline calculation).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--fast-metrics', '-f', action='store_true', dest='fast', default=False,
+        help='Calculate the fast (vectorized) SDR and SI-SDR instead of the BSS-eval '
+             'SDR and SIR. For quick checks, not for official results.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--force', action='store_true', dest='force', default=False,
+        help='Process all the tracks, even the ones that are already processed '
+             'with the same weights and settings.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--shard', action='store', dest='shard', type=shard_argument, default=None,
+        help='Process only the i-th of N shards of the tracks, given as i/N (e.g. 0/4). '
+             'The shards have about the same total duration.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--save-masks', '-k', action='store_true', dest='save_masks', default=False,
+        help='Save also the predicted voice magnitude and the mixture phase of each track, '
+             'for re-rendering with scripts/render.py.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--energy-gate', '-g', action='store', dest='energy_gate', type=float, nargs='?',
+        const=energy_gate_constants['threshold'], default=None,
+        help='Do not give to the MaD the sequences with all their frames below the level '
+             'threshold in dB (optionally given), and compare the SDR to the one without it.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    if cmd_args.stage_threads is not None and min(cmd_args.stage_threads) < 1:
+        cmd_arg_parser.error('argument --pipeline/-P: the amount of threads of each stage '
+                             'must be at least 1')
+
+    testing_process(
+        seq_length=cmd_args.seq_length,
+        stage_threads=cmd_args.stage_threads,
+        nb_metrics_workers=cmd_args.nb_metrics_workers,
+        fast=cmd_args.fast,
+        force=cmd_args.force,
+        shard=cmd_args.shard,
+        save_masks=cmd_args.save_masks,
+        energy_gate=cmd_args.energy_gate
+    )
 
 
 if __name__ == '__main__':
@@ -2,33 +2,177 @@
 # -*- coding: utf-8 -*-
 
 """Training process module.
+
+With more than one process, the training is data-parallel on CPU (see\
+:mod:`helpers.distributed`): each process gets a shard of the sets of\
+training files and the gradients are averaged over the processes at\
+every step. Thus, a step uses `processes * batch_size` sequences.
 """
 
 from __future__ import print_function
 
+import argparse
+import os
 import time
+from multiprocessing import Process, Queue
 
+import numpy as np
 import torch
 from torch import optim
 from torch.autograd import Variable
 
+from helpers.checkpoint import CheckpointWriter, make_checkpoint, load_checkpoint, \
+    restore_rng_states, pack_rank_state, unpack_rank_state
 from helpers.data_feeder import data_feeder_training
+from helpers.distributed import init_distributed, broadcast_parameters, \
+    all_reduce_gradients, all_reduce_sums, all_gather_values
+from helpers.model_bundle import write_bundle
 from helpers.settings import debug, hyper_parameters, training_constants, \
-    training_output_string, output_states_path
-from modules import RNNEnc, RNNDec, FNNMasker, FNNDenoiser, AffineTransform
+    training_output_string, output_states_path, model_bundle_path, distributed_constants, \
+    checkpoint_path, checkpoint_constants
+from modules import RNNEnc, RNNDec, FNNMasker, FNNDenoiser, AffineTransform, TwinDecoder
 from objectives import kullback_leibler as kl, l2_loss, sparsity_penalty, l2_reg_squared
 
 __author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
 __docformat__ = 'reStructuredText'
-__all__ = ['training_process']
+__all__ = ['training_process', 'scaling_study_process']
+
+_scaling_output_string = 'Processes:{p:3d} | Step time:{t:8.3f} sec(s) | ' \
+                         'Throughput:{x:8.2f} sequences/sec | Speed-up:{s:5.2f}x | ' \
+                         'Scaling efficiency:{e:6.1f}%'
 
 
-def training_process():
+def training_process(nb_processes=1, nb_threads=None, init_method=None, nb_steps=None,
+                     checkpoint_steps=0, resume=False):
     """The training process.
+
+    A checkpoint (see :mod:`helpers.checkpoint`) is written at the end of\
+    each epoch, and optionally every `checkpoint_steps` steps.
+
+    :param nb_processes: The amount of processes. With more than one, the\
+                         training is data-parallel on CPU.
+    :type nb_processes: int
+    :param nb_threads: The amount of PyTorch threads of each process. If\
+                       None, the default of PyTorch is used.
+    :type nb_threads: int | None
+    :param init_method: The URL of the initialization of the distributed\
+                        training. If None, the one of the settings is used.
+    :type init_method: str | None
+    :param nb_steps: The amount of steps. If not None, the training stops\
+                     after these steps and the model is not saved (e.g. for\
+                     timing).
+    :type nb_steps: int | None
+    :param checkpoint_steps: Write a checkpoint also every this amount of\
+                             steps. If 0, only at the end of each epoch.
+    :type checkpoint_steps: int
+    :param resume: Resume the training from the checkpoint, if there is one.
+    :type resume: bool
+    :return: The mean time of a step in seconds, without the first step.
+    :rtype: float
+    :raises RuntimeError: When any of the processes fails.
+    """
+    if nb_processes == 1:
+        return _train(0, 1, nb_threads, None, nb_steps, checkpoint_steps, resume)
+
+    if init_method is None:
+        init_method = distributed_constants['init_method']
+
+    results = Queue()
+    processes = [
+        Process(target=_train, args=(rank, nb_processes, nb_threads, init_method, nb_steps,
+                                     checkpoint_steps, resume, results))
+        for rank in range(nb_processes)
+    ]
+
+    for process in processes:
+        process.start()
+
+    for process in processes:
+        process.join()
+
+    if any(process.exitcode != 0 for process in processes):
+        raise RuntimeError('The data-parallel training failed at {} of the {} processes.'.format(
+            sum(process.exitcode != 0 for process in processes), nb_processes))
+
+    return results.get()
+
+
+def scaling_study_process(nb_processes_list, nb_threads, nb_steps):
+    """Times the steps of the data-parallel training for different amounts\
+    of processes and reports the scaling efficiency, i.e. the throughput\
+    over the one of a single process times the amount of processes.
+
+    :param nb_processes_list: The amounts of processes to be studied. The\
+                              first one is the reference.
+    :type nb_processes_list: list[int]
+    :param nb_threads: The amount of PyTorch threads of each process.
+    :type nb_threads: int
+    :param nb_steps: The amount of steps for each amount of processes.
+    :type nb_steps: int
     """
+    results = []
+
+    for nb_processes in nb_processes_list:
+        step_time = training_process(nb_processes, nb_threads, nb_steps=nb_steps)
+        results.append((nb_processes, step_time, nb_processes * training_constants['batch_size'] / step_time))
+
+    print('\n-- Study finished\n')
+
+    ref_processes, _, ref_throughput = results[0]
 
-    print('\n-- Starting training process. Debug mode: {}'.format(debug))
-    print('-- Setting up modules... ', end='')
+    for nb_processes, step_time, throughput in results:
+        print(_scaling_output_string.format(
+            p=nb_processes, t=step_time, x=throughput, s=throughput / ref_throughput,
+            e=100. * throughput * ref_processes / (ref_throughput * nb_processes)
+        ))
+
+
+def _train(rank, world_size, nb_threads, init_method, nb_steps, checkpoint_steps=0,
+           resume=False, results=None):
+    """Trains the MaD TwinNet, at one process.
+
+    :param rank: The rank of the process.
+    :type rank: int
+    :param world_size: The amount of processes.
+    :type world_size: int
+    :param nb_threads: The amount of PyTorch threads, or None.
+    :type nb_threads: int | None
+    :param init_method: The URL of the initialization of the distributed\
+                        training. Not used with one process.
+    :type init_method: str
+    :param nb_steps: The amount of steps, or None for all the epochs.\
+                     With a given amount, no checkpoints are written.
+    :type nb_steps: int | None
+    :param checkpoint_steps: Write a checkpoint also every this amount of\
+                             steps (0 for only at the end of each epoch).
+    :type checkpoint_steps: int
+    :param resume: Resume the training from the checkpoint, if there is one.
+    :type resume: bool
+    :param results: The queue for the mean step time, from the process\
+                    with rank 0.
+    :type results: multiprocessing.Queue | None
+    :return: The mean time of a step in seconds (the loading of its batch\
+             included), without the first step.
+    :rtype: float
+    """
+    log = print if rank == 0 else _no_print
+
+    # The scaling study (with a given amount of steps) is on the CPU, also
+    # for its single process reference
+    use_cuda = not debug and torch.has_cudnn and world_size == 1 and nb_steps is None
+
+    if nb_threads is not None:
+        torch.set_num_threads(nb_threads)
+
+    if world_size > 1:
+        init_distributed(rank, world_size, init_method, distributed_constants['backend'])
+
+    log('\n-- Starting training process. Debug mode: {}'.format(debug))
+
+    if world_size > 1:
+        log('-- Data-parallel training with {} process(es)'.format(world_size))
+
+    log('-- Setting up modules... ', end='')
     # Masker modules
     rnn_enc = RNNEnc(hyper_parameters['reduced_dim'], hyper_parameters['context_length'], debug)
     rnn_dec = RNNDec(hyper_parameters['rnn_enc_output_dim'], debug)
@@ -50,7 +194,7 @@ def training_process():
     )
     affine_transform = AffineTransform(hyper_parameters['rnn_enc_output_dim'])
 
-    if not debug and torch.has_cudnn:
+    if use_cuda:
         rnn_enc = rnn_enc.cuda()
         rnn_dec = rnn_dec.cuda()
         fnn = fnn.cuda()
@@ -59,8 +203,22 @@ def training_process():
         twin_net_fnn_masker = twin_net_fnn_masker.cuda()
         affine_transform = affine_transform.cuda()
 
-    print('done.')
-    print('-- Setting up optimizes and losses... ', end='')
+    # Both RNN decs and FNNs in one pass, with the parameters of the modules above
+    twin_decoder = TwinDecoder(rnn_dec, fnn, twin_net_rnn_dec, twin_net_fnn_masker)
+
+    parameters = list(rnn_enc.parameters()) + \
+        list(rnn_dec.parameters()) + \
+        list(fnn.parameters()) + \
+        list(denoiser.parameters()) + \
+        list(twin_net_rnn_dec.parameters()) + \
+        list(twin_net_fnn_masker.parameters()) + \
+        list(affine_transform.parameters())
+
+    if world_size > 1:
+        broadcast_parameters(parameters)
+
+    log('done.')
+    log('-- Setting up optimizes and losses... ', end='')
 
     # Objectives and penalties
     loss_masker = kl
@@ -71,18 +229,33 @@ def training_process():
     reg_fnn_dec = l2_reg_squared
 
     # Optimizer
-    optimizer = optim.Adam(
-        list(rnn_enc.parameters()) +
-        list(rnn_dec.parameters()) +
-        list(fnn.parameters()) +
-        list(denoiser.parameters()) +
-        list(twin_net_rnn_dec.parameters()) +
-        list(twin_net_fnn_masker.parameters()) +
-        list(affine_transform.parameters()),
-        lr=hyper_parameters['learning_rate']
-    )
+    optimizer = optim.Adam(parameters, lr=hyper_parameters['learning_rate'])
+
+    log('done.')
 
-    print('done.')
+    modules = [('rnn_enc', rnn_enc), ('rnn_dec', rnn_dec), ('fnn', fnn), ('denoiser', denoiser),
+               ('twin_net_rnn_dec', twin_net_rnn_dec), ('twin_net_fnn_masker', twin_net_fnn_masker),
+               ('affine_transform', affine_transform)]
+
+    checkpoint = None
+    if resume:
+        if os.path.isfile(checkpoint_path):
+            log('-- Loading checkpoint {}... '.format(checkpoint_path), end='')
+            checkpoint = load_checkpoint(checkpoint_path, modules, optimizer)
+
+            if len(checkpoint['rank_states']) != world_size:
+                raise ValueError('The checkpoint {} is of a training with {} process(es), '
+                                 'not {}.'.format(checkpoint_path, len(checkpoint['rank_states']),
+                                                  world_size))
+
+            log('done. Resuming at epoch {} after {} step(s).'.format(
+                checkpoint['epoch'], checkpoint['step']))
+        else:
+            log('-- No checkpoint at {}, starting from scratch.'.format(checkpoint_path))
+
+    checkpoint_writer = None
+    if rank == 0 and nb_steps is None:
+        checkpoint_writer = CheckpointWriter(checkpoint_path)
 
     # Initializing data feeder
     epoch_it = data_feeder_training(
@@ -93,106 +266,277 @@ def training_process():
         context_length=hyper_parameters['context_length'],
         batch_size=training_constants['batch_size'],
         files_per_pass=training_constants['files_per_pass'],
-        debug=debug
+        debug=debug,
+        rank=rank,
+        world_size=world_size
     )
 
-    print('-- Training starts\n')
-
-    # Training loop starts
-    for epoch in range(training_constants['epochs']):
-        epoch_l_m = []
-        epoch_l_d = []
-        epoch_l_tw = []
-        epoch_l_twin = []
-
-        time_start = time.time()
-
-        # Epoch loop
-        for data in epoch_it():
-            v_in = Variable(torch.from_numpy(data[0]))
-            v_j = Variable(torch.from_numpy(data[1]))
-
-            if not debug and torch.has_cudnn:
-                v_in = v_in.cuda()
-                v_j = v_j.cuda()
-
-            # Masker pass
-            h_enc = rnn_enc(v_in)
-            h_dec = rnn_dec(h_enc)
-            v_j_filt_prime = fnn(h_dec, v_in)
-
-            # TwinNet pass
-            h_dec_twin = twin_net_rnn_dec(h_enc)
-            v_j_filt_prime_twin = twin_net_fnn_masker(h_dec_twin, v_in)
-
-            # Twin net regularization
-            affine_output = affine_transform(h_dec)
-
-            # Denoiser pass
-            v_j_filt = denoiser(v_j_filt_prime)
-
-            optimizer.zero_grad()
-
-            # Calculate losses
-            l_m = loss_masker(v_j_filt_prime, v_j)
-            l_d = loss_denoiser(v_j_filt, v_j)
-            l_tw = loss_twin(v_j_filt_prime_twin, v_j)
-            l_twin = reg_twin(affine_output, h_dec_twin)
-
-            # Make MaD TwinNet objective
-            loss = l_m + l_d + l_tw + (hyper_parameters['lambda_l_twin'] * l_twin) + \
-                   (hyper_parameters['lambda_1'] * reg_fnn_masker(fnn.linear_layer.weight)) + \
-                   (hyper_parameters['lambda_2'] * reg_fnn_dec(denoiser.fnn_dec.weight))
-
-            # Backward pass
-            loss.backward()
-
-            # Gradient norm clipping
-            torch.nn.utils.clip_grad_norm(
-                list(rnn_enc.parameters()) +
-                list(rnn_dec.parameters()) +
-                list(fnn.parameters()) +
-                list(denoiser.parameters()) +
-                list(twin_net_rnn_dec.parameters()) +
-                list(twin_net_fnn_masker.parameters()) +
-                list(affine_transform.parameters()),
-                max_norm=hyper_parameters['max_grad_norm'], norm_type=2
-            )
-
-            # Optimize
-            optimizer.step()
-
-            # Log losses
-            epoch_l_m.append(l_m.data[0])
-            epoch_l_d.append(l_d.data[0])
-            epoch_l_tw.append(l_tw.data[0])
-            epoch_l_twin.append(l_twin.data[0])
-
-        time_end = time.time()
-
-        # Tell us what happened
-        print(training_output_string.format(
-            ep=epoch,
-            l_m=torch.mean(torch.FloatTensor(epoch_l_m)),
-            l_d=torch.mean(torch.FloatTensor(epoch_l_d)),
-            l_tw=torch.mean(torch.FloatTensor(epoch_l_tw)),
-            l_twin=torch.mean(torch.FloatTensor(epoch_l_tw)),
-            t=time_end - time_start
-        ))
+    log('-- Training starts\n')
+
+    start_epoch = 0 if checkpoint is None else checkpoint['epoch']
+    step = 0 if checkpoint is None else checkpoint['step']
+    step_times = []
+
+    try:
+        # Training loop starts
+        for epoch in range(start_epoch, training_constants['epochs']):
+            # The sums of the losses and the amount of steps with a batch
+            epoch_losses = [0.] * 5
+            epoch_step = 0
+
+            time_start = time.time()
+
+            if checkpoint is not None:
+                # Skip the batches of the steps done before the checkpoint, with
+                # the shuffling of the data feeder of this process as it was
+                epoch_losses, numpy_state = unpack_rank_state(checkpoint['rank_states'][rank])
+                np.random.set_state(numpy_state)
+                epoch_step = checkpoint['epoch_step']
+
+            epoch_numpy_state = np.random.get_state()
+            batches = epoch_it()
+
+            for _ in range(epoch_step):
+                next(batches, None)
+
+            if checkpoint is not None:
+                restore_rng_states(checkpoint['rng_states'])
+                checkpoint = None
+
+            # Epoch loop
+            while nb_steps is None or step < nb_steps:
+                step_start = time.time()
+                data = next(batches, None)
+
+                optimizer.zero_grad()
+
+                if data is not None:
+                    v_in = Variable(torch.from_numpy(data[0]))
+                    v_j = Variable(torch.from_numpy(data[1]))
+
+                    if use_cuda:
+                        v_in = v_in.cuda()
+                        v_j = v_j.cuda()
+
+                    # Masker and TwinNet pass
+                    h_enc = rnn_enc(v_in)
+                    h_dec, v_j_filt_prime, h_dec_twin, v_j_filt_prime_twin = \
+                        twin_decoder(h_enc, v_in)
+
+                    # Twin net regularization
+                    affine_output = affine_transform(h_dec)
+
+                    # Denoiser pass
+                    v_j_filt = denoiser(v_j_filt_prime)
+
+                    # Calculate losses
+                    l_m = loss_masker(v_j_filt_prime, v_j)
+                    l_d = loss_denoiser(v_j_filt, v_j)
+                    l_tw = loss_twin(v_j_filt_prime_twin, v_j)
+                    l_twin = reg_twin(affine_output, h_dec_twin)
+
+                    # Make MaD TwinNet objective
+                    loss = l_m + l_d + l_tw + (hyper_parameters['lambda_l_twin'] * l_twin) + \
+                        (hyper_parameters['lambda_1'] * reg_fnn_masker(fnn.linear_layer.weight)) + \
+                        (hyper_parameters['lambda_2'] * reg_fnn_dec(denoiser.fnn_dec.weight))
+
+                    # Backward pass
+                    loss.backward()
+
+                    # Log losses
+                    for index, l in enumerate([l_m, l_d, l_tw, l_twin]):
+                        epoch_losses[index] += l.data[0]
+                    epoch_losses[4] += 1
+
+                # Average the gradients over the processes
+                if world_size > 1:
+                    if all_reduce_gradients(parameters, data is not None) == 0:
+                        break
+                elif data is None:
+                    break
+
+                # Gradient norm clipping
+                torch.nn.utils.clip_grad_norm(
+                    parameters, max_norm=hyper_parameters['max_grad_norm'], norm_type=2
+                )
+
+                # Optimize
+                optimizer.step()
+
+                if step > 0:
+                    step_times.append(time.time() - step_start)
+                step += 1
+                epoch_step += 1
+
+                if nb_steps is None and checkpoint_steps > 0 and step % checkpoint_steps == 0:
+                    _save_checkpoint(
+                        checkpoint_writer, world_size, modules, optimizer, epoch, step, epoch_step,
+                        epoch_losses, epoch_numpy_state)
+
+            time_end = time.time()
+
+            if nb_steps is None:
+                _save_checkpoint(
+                    checkpoint_writer, world_size, modules, optimizer, epoch + 1, step, 0,
+                    [0.] * 5, np.random.get_state())
+
+            losses = epoch_losses
+
+            if world_size > 1:
+                losses = all_reduce_sums(losses)
+
+            # Tell us what happened
+            log(training_output_string.format(
+                ep=epoch,
+                l_m=losses[0] / max(losses[4], 1),
+                l_d=losses[1] / max(losses[4], 1),
+                l_tw=losses[2] / max(losses[4], 1),
+                l_twin=losses[3] / max(losses[4], 1),
+                t=time_end - time_start
+            ))
+
+            if nb_steps is not None and step >= nb_steps:
+                break
+    finally:
+        if checkpoint_writer is not None:
+            checkpoint_writer.close()
+
+    step_time = sum(step_times) / max(len(step_times), 1)
+
+    if results is not None and rank == 0:
+        results.put(step_time)
+
+    if nb_steps is not None:
+        log('\n-- {} step(s) done. Mean step time: {:.3f} sec(s)'.format(step, step_time))
+        return step_time
 
     # Kindly end and save the model
-    print('\n-- Training done.')
-    print('-- Saving model.. ', end='')
-    torch.save(rnn_enc.state_dict(), output_states_path['rnn_enc'])
-    torch.save(rnn_dec.state_dict(), output_states_path['rnn_dec'])
-    torch.save(fnn.state_dict(), output_states_path['fnn'])
-    torch.save(denoiser.state_dict(), output_states_path['denoiser'])
-    print('done.')
-    print('-- That\'s all folks!')
+    log('\n-- Training done.')
+
+    if rank == 0:
+        print('-- Saving model.. ', end='')
+        torch.save(rnn_enc.state_dict(), output_states_path['rnn_enc'])
+        torch.save(rnn_dec.state_dict(), output_states_path['rnn_dec'])
+        torch.save(fnn.state_dict(), output_states_path['fnn'])
+        torch.save(denoiser.state_dict(), output_states_path['denoiser'])
+        write_bundle(
+            model_bundle_path,
+            {'{}.{}'.format(module_name, k): v.cpu().numpy()
+             for module_name, module in [('rnn_enc', rnn_enc), ('rnn_dec', rnn_dec),
+                                         ('fnn', fnn), ('denoiser', denoiser)]
+             for k, v in module.state_dict().items()},
+            hyper_parameters
+        )
+        print('done.')
+        print('-- That\'s all folks!')
+
+    return step_time
+
+
+def _save_checkpoint(checkpoint_writer, world_size, modules, optimizer, epoch, step, epoch_step,
+                     epoch_losses, numpy_state):
+    """Gathers the states of all the processes and writes a checkpoint.\
+    All the processes must call this.
+
+    :param checkpoint_writer: The writer of the checkpoints, at the process\
+                              with rank 0. None at the other processes.
+    :type checkpoint_writer: helpers.checkpoint.CheckpointWriter | None
+    :param world_size: The amount of processes.
+    :type world_size: int
+    :param modules: The modules, as (name, module).
+    :type modules: list[(str, torch.nn.Module)]
+    :param optimizer: The optimizer.
+    :type optimizer: torch.optim.Optimizer
+    :param epoch: The current epoch.
+    :type epoch: int
+    :param step: The amount of steps done.
+    :type step: int
+    :param epoch_step: The amount of steps done at the current epoch.
+    :type epoch_step: int
+    :param epoch_losses: The sums of the losses of this process at the\
+                         current epoch, and the amount of its steps.
+    :type epoch_losses: list[float]
+    :param numpy_state: The state of the NumPy random number generator of\
+                        this process at the start of the current epoch.
+    :type numpy_state: tuple
+    """
+    rank_state = pack_rank_state(epoch_losses, numpy_state)
+    rank_states = all_gather_values(rank_state) if world_size > 1 else [rank_state]
+
+    if checkpoint_writer is not None:
+        checkpoint_writer.save(make_checkpoint(
+            modules, optimizer, epoch, step, epoch_step, rank_states))
+
+
+def _no_print(*args, **kwargs):
+    """Prints nothing, at the processes with rank other than 0.
+    """
+    pass
 
 
 def main():
-    training_process()
+    cmd_arg_parser = argparse.ArgumentParser(
+        usage='python scripts/training.py [-p nb_processes] [-t nb_threads] '
+              '[--init-method tcp://127.0.0.1:29500] [--checkpoint-steps n] [--resume] '
+              '[--scaling-study 1 2 4 8] [--steps n]',
+        description='Script to train the MaD TwinNet, optionally data-parallel with many '
+                    'processes on CPU. Remember to set up properly the PYTHONPATH '
+                    'environmental variable'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--processes', '-p', action='store', dest='nb_processes', type=int, default=1,
+        help='The amount of processes. With more than one, the training is data-parallel '
+             'on CPU and each step uses processes * batch size sequences.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--threads', '-t', action='store', dest='nb_threads', type=int, default=None,
+        help='The amount of PyTorch threads of each process (default of PyTorch if not given).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--init-method', action='store', dest='init_method',
+        default=distributed_constants['init_method'],
+        help='The URL of the initialization of the data-parallel training.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--checkpoint-steps', action='store', dest='checkpoint_steps', type=int,
+        default=checkpoint_constants['steps'],
+        help='Write a checkpoint also every this amount of steps (0 for only at the end of '
+             'each epoch).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--resume', action='store_true', dest='resume',
+        help='Resume the training from the last checkpoint.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--scaling-study', action='store', dest='scaling_study', type=int, nargs='+',
+        default=None,
+        help='Time the training steps for each of the given amounts of processes and report '
+             'the scaling efficiency, instead of training. The first one is the reference.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--steps', action='store', dest='nb_steps', type=int, default=20,
+        help='The amount of steps of the scaling study.'
+    )
+
+    cmd_args = cmd_arg_parser.parse_args()
+
+    if cmd_args.scaling_study is not None:
+        scaling_study_process(
+            cmd_args.scaling_study, 1 if cmd_args.nb_threads is None else cmd_args.nb_threads,
+            cmd_args.nb_steps)
+    else:
+        training_process(
+            nb_processes=cmd_args.nb_processes, nb_threads=cmd_args.nb_threads,
+            init_method=cmd_args.init_method, checkpoint_steps=cmd_args.checkpoint_steps,
+            resume=cmd_args.resume
+        )
 
 
 if __name__ == '__main__':
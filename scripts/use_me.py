@@ -7,30 +7,70 @@
 from __future__ import print_function
 
 import argparse
+import datetime
 import os
+import shutil
+import tempfile
 import time
+from multiprocessing import Pool
 
 import numpy as np
 import torch
-from torch.autograd import Variable
+from numpy.lib import stride_tricks
 
-from helpers.data_feeder import data_feeder_testing, data_process_results_testing
-from helpers.settings import debug, hyper_parameters, output_states_path, training_constants, \
-    usage_output_string_per_example, usage_output_string_total
-from modules import RNNEnc, RNNDec, FNNMasker, FNNDenoiser
+from helpers.batching import cross_track_inference
+from helpers.data_feeder import data_feeder_testing, data_reader_testing, \
+    data_process_results_testing
+from helpers.energy_gate import EnergyGate
+from helpers.incremental import incremental_separate
+from helpers.job_spool import JobSpool
+from helpers.output_cache import OutputCache
+from helpers.pipeline import pipeline
+from helpers.resume import run_fingerprint, source_fingerprint, is_processed, \
+    mark_processed
+from helpers.settings import debug, hyper_parameters, output_states_path, \
+    model_bundle_path, usage_output_string_per_example, usage_output_string_total, \
+    inference_constants, usage_output_string_realtime, wav_quality, job_spool_path, \
+    job_spool_constants, usage_output_string_spool, output_cache_path, output_cache_constants, \
+    usage_output_string_cache, energy_gate_constants, usage_output_string_gate
+from helpers.sharding import shard_argument, shard_indices, wav_duration
+from helpers.streaming import stream_separate
+from modules import MaD
 
 __author__ = ['Konstantinos Drossos -- TUT', 'Stylianos Mimilakis -- Fraunhofer IDMT']
 __docformat__ = 'reStructuredText'
-__all__ = ['use_me_process']
+__all__ = ['use_me_process', 'use_me_pool_process', 'use_me_intra_file_process',
+           'use_me_pipeline_process', 'use_me_spool_process', 'use_me_stream_process',
+           'use_me_incremental_process']
 
 
-def use_me_process(sources_list, output_file_names):
+def use_me_process(sources_list, output_file_names, seq_length, batch_size, fingerprint=None,
+                   cache=None, energy_gate=None, stereo=None):
     """The usage process.
 
     :param sources_list: The file names to be used.
     :type sources_list: list[str]
     :param output_file_names: The output file names to be used.
     :type output_file_names: list[list[str]]
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size, with sequences from one or more files.
+    :type batch_size: int
+    :param fingerprint: The fingerprint of the run, to be recorded for each\
+                        processed file. If None, nothing is recorded.
+    :type fingerprint: str | None
+    :param cache: The output cache, to add the outputs of each processed\
+                  file to. If None, no cache is used.
+    :type cache: helpers.output_cache.OutputCache | None
+    :param energy_gate: The level threshold in dB of the energy gate (see\
+                        :mod:`helpers.energy_gate`). If None, all the\
+                        sequences are predicted.
+    :type energy_gate: float | None
+    :param stereo: The channels to be separated, i.e. `lr` (left and right)\
+                   or `ms` (mid and side), with the sequences of all the\
+                   channels predicted together. If None, the mono version\
+                   of the files is separated.
+    :type stereo: str | None
     """
 
     print('\n-- Welcome to MaD TwinNet.')
@@ -40,100 +80,877 @@ def use_me_process(sources_list, output_file_names):
         exit(-1)
     print('-- Now I will extract the voice and the background music from the provided files')
 
-    # Masker modules
-    rnn_enc = RNNEnc(hyper_parameters['reduced_dim'], hyper_parameters['context_length'], debug)
-    rnn_dec = RNNDec(hyper_parameters['rnn_enc_output_dim'], debug)
-    fnn = FNNMasker(
-        hyper_parameters['rnn_enc_output_dim'],
-        hyper_parameters['original_input_dim'],
-        hyper_parameters['context_length']
-    )
-
-    # Denoiser modules
-    denoiser = FNNDenoiser(hyper_parameters['original_input_dim'])
-
-    rnn_enc.load_state_dict(torch.load(output_states_path['rnn_enc']))
-    rnn_dec.load_state_dict(torch.load(output_states_path['rnn_dec']))
-    fnn.load_state_dict(torch.load(output_states_path['fnn']))
-    denoiser.load_state_dict(torch.load(output_states_path['denoiser']))
-
-    if not debug and torch.has_cudnn:
-        rnn_enc = rnn_enc.cuda()
-        rnn_dec = rnn_dec.cuda()
-        fnn = fnn.cuda()
-        denoiser = denoiser.cuda()
+    predictor = _load_predictor(energy_gate)
 
     testing_it = data_feeder_testing(
         window_size=hyper_parameters['window_size'], fft_size=hyper_parameters['fft_size'],
-        hop_size=hyper_parameters['hop_size'], seq_length=hyper_parameters['seq_length'],
+        hop_size=hyper_parameters['hop_size'], seq_length=seq_length,
         context_length=hyper_parameters['context_length'], batch_size=1,
-        debug=debug, sources_list=sources_list
+        debug=debug, sources_list=sources_list, stereo=stereo
     )
 
     print('-- Let\'s go!\n')
     total_time = 0
+    total_duration = 0
+    s_time = time.time()
+
+    # The batches can have sequences from more than one file, so the time
+    # of each file is the time from the end of the previous file.
+    for index, data, voice_predicted in cross_track_inference(
+            testing_it(), predictor.predict_batch, batch_size, hyper_parameters['context_length']):
+
+        mix, mix_magnitude, mix_phase, voice_true, bg_true = data
+
+        data_process_results_testing(
+            index=index, voice_true=voice_true, bg_true=bg_true,
+            voice_predicted=voice_predicted,
+            window_size=hyper_parameters['window_size'], mix=mix, mix_magnitude=mix_magnitude,
+            mix_phase=mix_phase, hop=hyper_parameters['hop_size'],
+            context_length=hyper_parameters['context_length'],
+            output_file_name=output_file_names[index], stereo=stereo
+        )
+
+        e_time = time.time()
+
+        _mark_file_processed(
+            sources_list[index], output_file_names[index], fingerprint, cache)
+
+        print(usage_output_string_per_example.format(
+            f=sources_list[index],
+            t=e_time - s_time
+        ))
 
-    for index, data in enumerate(testing_it()):
+        total_time += e_time - s_time
+        total_duration += len(mix) / float(wav_quality['sampling_rate'])
+        s_time = e_time
 
+    print('\n-- Testing finished\n')
+    print(usage_output_string_total.format(
+        t=total_time
+    ))
+    print(usage_output_string_realtime.format(
+        d=total_duration, t=total_time,
+        r=total_time / total_duration, x=total_duration / total_time
+    ))
+    _print_gate_stats(predictor)
+    print('-- That\'s all folks!')
+
+
+def use_me_pool_process(sources_list, output_file_names, seq_length, batch_size,
+                        nb_workers, nb_threads, fingerprint=None, cache=None, stereo=None):
+    """The usage process, with a pool of worker processes. Each worker\
+    has its own copy of the MaD (on CPU) and processes one file at a time.
+
+    :param sources_list: The file names to be used.
+    :type sources_list: list[str]
+    :param output_file_names: The output file names to be used.
+    :type output_file_names: list[list[str]]
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :param nb_workers: The amount of worker processes.
+    :type nb_workers: int
+    :param nb_threads: The amount of PyTorch threads of each worker.
+    :type nb_threads: int
+    :param fingerprint: The fingerprint of the run, to be recorded for each\
+                        processed file. If None, nothing is recorded.
+    :type fingerprint: str | None
+    :param cache: The output cache, to add the outputs of each processed\
+                  file to. If None, no cache is used.
+    :type cache: helpers.output_cache.OutputCache | None
+    :param stereo: The channels to be separated, i.e. `lr` (left and right)\
+                   or `ms` (mid and side), with the sequences of all the\
+                   channels predicted together. If None, the mono version\
+                   of the files is separated.
+    :type stereo: str | None
+    """
+    print('\n-- Welcome to MaD TwinNet.')
+    if debug:
+        print('\n-- Cannot proceed in debug mode. Please set debug=False at the settings file.')
+        print('-- Exiting.')
+        exit(-1)
+    print('-- Now I will extract the voice and the background music from the provided files')
+    print('-- Using {} worker(s) with {} thread(s) each'.format(nb_workers, nb_threads))
+
+    with Pool(
+        processes=nb_workers, initializer=_init_worker,
+        initargs=(nb_threads, seq_length, batch_size, stereo)
+    ) as pool:
+        print('-- Let\'s go!\n')
+        total_duration = 0
         s_time = time.time()
 
-        mix, mix_magnitude, mix_phase, voice_true, bg_true = data
+        outputs = dict(zip(sources_list, output_file_names))
+
+        for source, duration, f_time in pool.imap_unordered(
+                _separate_file, zip(sources_list, output_file_names)):
+
+            _mark_file_processed(source, outputs[source], fingerprint, cache)
 
-        voice_predicted = np.zeros(
-            (
-                mix_magnitude.shape[0],
-                hyper_parameters['seq_length'] - hyper_parameters['context_length'] * 2,
-                hyper_parameters['window_size']
-            ),
-            dtype=np.float32
+            print(usage_output_string_per_example.format(f=source, t=f_time))
+
+            total_duration += duration
+
+        pool.close()
+        pool.join()
+
+    total_time = time.time() - s_time
+
+    print('\n-- Testing finished\n')
+    print(usage_output_string_total.format(
+        t=total_time
+    ))
+    print(usage_output_string_realtime.format(
+        d=total_duration, t=total_time,
+        r=total_time / total_duration, x=total_duration / total_time
+    ))
+    print('-- That\'s all folks!')
+
+
+def use_me_intra_file_process(sources_list, output_file_names, seq_length, batch_size,
+                              nb_workers, nb_threads, fingerprint=None, cache=None):
+    """The usage process, with the sequences of each file split across\
+    a pool of worker processes. The files are processed one after the\
+    other, but the inference of each file is done in parallel. This is\
+    suitable for few and long files.
+
+    :param sources_list: The file names to be used.
+    :type sources_list: list[str]
+    :param output_file_names: The output file names to be used.
+    :type output_file_names: list[list[str]]
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size. Each task of the workers is one batch.
+    :type batch_size: int
+    :param nb_workers: The amount of worker processes.
+    :type nb_workers: int
+    :param nb_threads: The amount of PyTorch threads of each worker.
+    :type nb_threads: int
+    :param fingerprint: The fingerprint of the run, to be recorded for each\
+                        processed file. If None, nothing is recorded.
+    :type fingerprint: str | None
+    :param cache: The output cache, to add the outputs of each processed\
+                  file to. If None, no cache is used.
+    :type cache: helpers.output_cache.OutputCache | None
+    """
+    print('\n-- Welcome to MaD TwinNet.')
+    if debug:
+        print('\n-- Cannot proceed in debug mode. Please set debug=False at the settings file.')
+        print('-- Exiting.')
+        exit(-1)
+    print('-- Now I will extract the voice and the background music from the provided files')
+    print('-- Splitting each file across {} worker(s) with {} thread(s) each'.format(
+        nb_workers, nb_threads))
+
+    with Pool(
+        processes=nb_workers, initializer=_init_worker,
+        initargs=(nb_threads, seq_length, batch_size)
+    ) as pool:
+        testing_it = data_feeder_testing(
+            window_size=hyper_parameters['window_size'], fft_size=hyper_parameters['fft_size'],
+            hop_size=hyper_parameters['hop_size'], seq_length=seq_length,
+            context_length=hyper_parameters['context_length'], batch_size=1,
+            debug=debug, sources_list=sources_list
         )
 
-        for batch in range(int(mix_magnitude.shape[0] / training_constants['batch_size'])):
-            b_start = batch * training_constants['batch_size']
-            b_end = (batch + 1) * training_constants['batch_size']
+        print('-- Let\'s go!\n')
+        total_time = 0
+        total_duration = 0
+
+        for index, data in enumerate(testing_it()):
+
+            s_time = time.time()
+
+            mix, mix_magnitude, mix_phase, voice_true, bg_true = data
+
+            voice_predicted = _parallel_predict(pool, mix_magnitude, batch_size)
+
+            data_process_results_testing(
+                index=index, voice_true=voice_true, bg_true=bg_true,
+                voice_predicted=voice_predicted,
+                window_size=hyper_parameters['window_size'], mix=mix, mix_magnitude=mix_magnitude,
+                mix_phase=mix_phase, hop=hyper_parameters['hop_size'],
+                context_length=hyper_parameters['context_length'],
+                output_file_name=output_file_names[index]
+            )
+
+            e_time = time.time()
+
+            _mark_file_processed(
+                sources_list[index], output_file_names[index], fingerprint, cache)
+
+            print(usage_output_string_per_example.format(
+                f=sources_list[index],
+                t=e_time - s_time
+            ))
+
+            total_time += e_time - s_time
+            total_duration += len(mix) / float(wav_quality['sampling_rate'])
+
+        pool.close()
+        pool.join()
+
+    print('\n-- Testing finished\n')
+    print(usage_output_string_total.format(
+        t=total_time
+    ))
+    print(usage_output_string_realtime.format(
+        d=total_duration, t=total_time,
+        r=total_time / total_duration, x=total_duration / total_time
+    ))
+    print('-- That\'s all folks!')
+
+
+def use_me_pipeline_process(sources_list, output_file_names, seq_length, batch_size,
+                            stage_threads, fingerprint=None, cache=None, energy_gate=None,
+                            stereo=None):
+    """The usage process, with reading, inference, and synthesis/writing\
+    as a pipeline. While a file is in the inference, the next files are\
+    read and the previous ones are written.
+
+    :param sources_list: The file names to be used.
+    :type sources_list: list[str]
+    :param output_file_names: The output file names to be used.
+    :type output_file_names: list[list[str]]
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :param stage_threads: The amount of threads for reading, inference, and\
+                          synthesis/writing.
+    :type stage_threads: (int, int, int)
+    :param fingerprint: The fingerprint of the run, to be recorded for each\
+                        processed file. If None, nothing is recorded.
+    :type fingerprint: str | None
+    :param cache: The output cache, to add the outputs of each processed\
+                  file to. If None, no cache is used.
+    :type cache: helpers.output_cache.OutputCache | None
+    :param energy_gate: The level threshold in dB of the energy gate (see\
+                        :mod:`helpers.energy_gate`). If None, all the\
+                        sequences are predicted.
+    :type energy_gate: float | None
+    :param stereo: The channels to be separated, i.e. `lr` (left and right)\
+                   or `ms` (mid and side), with the sequences of all the\
+                   channels predicted together. If None, the mono version\
+                   of the files is separated.
+    :type stereo: str | None
+    """
+    print('\n-- Welcome to MaD TwinNet.')
+    if debug:
+        print('\n-- Cannot proceed in debug mode. Please set debug=False at the settings file.')
+        print('-- Exiting.')
+        exit(-1)
+    print('-- Now I will extract the voice and the background music from the provided files')
+    print('-- Using a pipeline with {} reading, {} inference, and {} writing thread(s)'.format(
+        *stage_threads))
 
-            v_in = Variable(torch.from_numpy(mix_magnitude[b_start:b_end, :, :]))
+    predictor = _load_predictor(energy_gate)
 
-            if not debug and torch.has_cudnn:
-                v_in = v_in.cuda()
+    _, read_example = data_reader_testing(
+        window_size=hyper_parameters['window_size'], fft_size=hyper_parameters['fft_size'],
+        hop_size=hyper_parameters['hop_size'], seq_length=seq_length,
+        context_length=hyper_parameters['context_length'], batch_size=1,
+        debug=debug, sources_list=sources_list, stereo=stereo
+    )
 
-            tmp_voice_predicted = rnn_enc(v_in)
-            tmp_voice_predicted = rnn_dec(tmp_voice_predicted)
-            tmp_voice_predicted = fnn(tmp_voice_predicted, v_in)
-            tmp_voice_predicted = denoiser(tmp_voice_predicted)
+    def read(index):
+        return index, read_example(index)
 
-            voice_predicted[b_start:b_end, :, :] = tmp_voice_predicted.data.cpu().numpy()
+    def infer(example):
+        index, data = example
+        return index, data, predictor.predict(data[1], batch_size)
 
+    def write(prediction):
+        index, (mix, mix_magnitude, mix_phase, voice_true, bg_true), voice_predicted = prediction
         data_process_results_testing(
             index=index, voice_true=voice_true, bg_true=bg_true,
             voice_predicted=voice_predicted,
             window_size=hyper_parameters['window_size'], mix=mix, mix_magnitude=mix_magnitude,
             mix_phase=mix_phase, hop=hyper_parameters['hop_size'],
             context_length=hyper_parameters['context_length'],
-            output_file_name=output_file_names[index]
+            output_file_name=output_file_names[index], stereo=stereo
         )
+        return len(mix) / float(wav_quality['sampling_rate'])
+
+    print('-- Let\'s go!\n')
+    total_duration = 0
+    start_time = s_time = time.time()
+
+    # The stages of consecutive files overlap, so the time of each file is
+    # the time from the end of the previous file.
+    for index, duration in enumerate(pipeline(range(len(sources_list)), [
+            (read, stage_threads[0]), (infer, stage_threads[1]), (write, stage_threads[2])])):
 
         e_time = time.time()
 
+        _mark_file_processed(
+            sources_list[index], output_file_names[index], fingerprint, cache)
+
         print(usage_output_string_per_example.format(
             f=sources_list[index],
             t=e_time - s_time
         ))
 
+        total_duration += duration
+        s_time = e_time
+
+    total_time = time.time() - start_time
+
+    print('\n-- Testing finished\n')
+    print(usage_output_string_total.format(
+        t=total_time
+    ))
+    print(usage_output_string_realtime.format(
+        d=total_duration, t=total_time,
+        r=total_time / total_duration, x=total_duration / total_time
+    ))
+    _print_gate_stats(predictor)
+    print('-- That\'s all folks!')
+
+
+def use_me_spool_process(spool_file_name, seq_length, batch_size, max_attempts,
+                         fingerprint=None, force=False, cache=None, save_masks=False):
+    """The usage process, as a worker of a job spool. The worker claims\
+    jobs (i.e. files) from the spool until there are no more, and records\
+    their completion or failure at the spool. Many workers can use the\
+    same spool.
+
+    :param spool_file_name: The file name of the spool.
+    :type spool_file_name: str
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :param max_attempts: The maximum amount of attempts for a job.
+    :type max_attempts: int
+    :param fingerprint: The fingerprint of the run, to be recorded for each\
+                        processed file. If None, nothing is recorded.
+    :type fingerprint: str | None
+    :param force: Process the files that are already processed with the same\
+                  weights and settings (according to the `fingerprint`).
+    :type force: bool
+    :param cache: The output cache, to get the outputs of the files from,\
+                  and to add the outputs of each processed file to. If None,\
+                  no cache is used.
+    :type cache: helpers.output_cache.OutputCache | None
+    :param save_masks: Save also the mask store of each file (the outputs\
+                       are then not got from the cache).
+    :type save_masks: bool
+    """
+    print('\n-- Welcome to MaD TwinNet.')
+    if debug:
+        print('\n-- Cannot proceed in debug mode. Please set debug=False at the settings file.')
+        print('-- Exiting.')
+        exit(-1)
+    print('-- Now I will extract the voice and the background music from the files of the '
+          'spool {}'.format(spool_file_name))
+
+    mad = _load_mad(cpu_only=False)
+    spool = JobSpool(spool_file_name)
+
+    print('-- Worker {}. Let\'s go!\n'.format(spool.worker))
+
+    try:
+        while True:
+            job = spool.claim(max_attempts)
+
+            if job is None:
+                break
+
+            job_id, source = job
+            output_file_name = _make_target_file_names([source], save_masks)[0]
+            s_time = time.time()
+
+            try:
+                if not force and fingerprint is not None and is_processed(
+                        _make_marker_file_name(source), source_fingerprint(fingerprint, source),
+                        output_file_name):
+                    duration = wav_duration(source)
+                elif cache is not None and not save_masks and fingerprint is not None and cache.get(
+                        cache.key(source, fingerprint), output_file_name):
+                    duration = wav_duration(source)
+                    _mark_file_processed(source, output_file_name, fingerprint)
+                else:
+                    duration = _separate_single_file(
+                        mad, source, output_file_name, seq_length, batch_size)
+                    _mark_file_processed(source, output_file_name, fingerprint, cache)
+            except Exception as e:
+                spool.fail(job_id, '{}: {}'.format(type(e).__name__, e))
+                print('-- File {} failed: {}'.format(source, e))
+                continue
+
+            if not spool.complete(job_id, duration, time.time() - s_time):
+                print('-- File {} was set back to pending meanwhile.'.format(source))
+                continue
+
+            print(usage_output_string_per_example.format(f=source, t=time.time() - s_time))
+
+        _print_spool_stats(spool.stats(max_attempts))
+    finally:
+        spool.close()
+
+    print('-- That\'s all folks!')
+
+
+def use_me_stream_process(sources_list, output_file_names, seq_length, batch_size,
+                          fingerprint=None, cache=None, energy_gate=None):
+    """The usage process, with bounded memory. Each file is read in\
+    chunks, and the voice and the background music are written while the\
+    file is processed, so the memory does not depend on the duration of\
+    the files. The outputs are the same as the ones of :func:`use_me_process`.
+
+    :param sources_list: The file names to be used.
+    :type sources_list: list[str]
+    :param output_file_names: The output file names to be used.
+    :type output_file_names: list[list[str]]
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size, i.e. the amount of sequences in memory.
+    :type batch_size: int
+    :param fingerprint: The fingerprint of the run, to be recorded for each\
+                        processed file. If None, nothing is recorded.
+    :type fingerprint: str | None
+    :param cache: The output cache, to add the outputs of each processed\
+                  file to. If None, no cache is used.
+    :type cache: helpers.output_cache.OutputCache | None
+    :param energy_gate: The level threshold in dB of the energy gate (see\
+                        :mod:`helpers.energy_gate`). If None, all the\
+                        sequences are predicted.
+    :type energy_gate: float | None
+    """
+    print('\n-- Welcome to MaD TwinNet.')
+    if debug:
+        print('\n-- Cannot proceed in debug mode. Please set debug=False at the settings file.')
+        print('-- Exiting.')
+        exit(-1)
+    print('-- Now I will extract the voice and the background music from the provided files, '
+          'in streaming mode')
+
+    predictor = _load_predictor(energy_gate)
+
+    print('-- Let\'s go!\n')
+    total_time = 0
+    total_duration = 0
+
+    for source, output_file_name in zip(sources_list, output_file_names):
+        s_time = time.time()
+
+        total_duration += stream_separate(
+            source=source, output_file_names=output_file_name,
+            predict_batch=predictor.predict_batch,
+            window_size=hyper_parameters['window_size'], fft_size=hyper_parameters['fft_size'],
+            hop=hyper_parameters['hop_size'], seq_length=seq_length,
+            context_length=hyper_parameters['context_length'], batch_size=batch_size,
+            wav_quality=wav_quality
+        )
+
+        e_time = time.time()
+
+        _mark_file_processed(source, output_file_name, fingerprint, cache)
+
+        print(usage_output_string_per_example.format(f=source, t=e_time - s_time))
+
         total_time += e_time - s_time
 
     print('\n-- Testing finished\n')
     print(usage_output_string_total.format(
         t=total_time
     ))
+    print(usage_output_string_realtime.format(
+        d=total_duration, t=total_time,
+        r=total_time / total_duration, x=total_duration / total_time
+    ))
+    _print_gate_stats(predictor)
     print('-- That\'s all folks!')
 
 
-def _make_target_file_names(sources_list):
+def use_me_incremental_process(sources_list, output_file_names, seq_length, batch_size,
+                               fingerprint, energy_gate=None):
+    """The usage process, for files that are separated again after an\
+    edit. Only the sequences with changed frames are predicted, and only\
+    the samples that they overlap are synthesized, using the mask store of\
+    the previous separation of each file (see :mod:`helpers.incremental`).\
+    The outputs are the same as the ones of :func:`use_me_process`.
+
+    :param sources_list: The file names to be used.
+    :type sources_list: list[str]
+    :param output_file_names: The output file names to be used, with the\
+                              mask store as the third one.
+    :type output_file_names: list[list[str]]
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :param fingerprint: The fingerprint of the run, to be recorded for each\
+                        processed file and at its mask store.
+    :type fingerprint: str
+    :param energy_gate: The level threshold in dB of the energy gate (see\
+                        :mod:`helpers.energy_gate`). If None, all the\
+                        sequences are predicted.
+    :type energy_gate: float | None
+    """
+    print('\n-- Welcome to MaD TwinNet.')
+    if debug:
+        print('\n-- Cannot proceed in debug mode. Please set debug=False at the settings file.')
+        print('-- Exiting.')
+        exit(-1)
+    print('-- Now I will extract the voice and the background music from the provided files, '
+          'in incremental mode')
+
+    predictor = _load_predictor(energy_gate)
+
+    print('-- Let\'s go!\n')
+    total_time = 0
+    total_duration = 0
+
+    for source, output_file_name in zip(sources_list, output_file_names):
+        s_time = time.time()
+
+        duration, nb_predicted, nb_sequences, nb_synthesized, nb_samples = incremental_separate(
+            predict=predictor.predict, source=source, output_file_names=output_file_name,
+            window_size=hyper_parameters['window_size'], fft_size=hyper_parameters['fft_size'],
+            hop=hyper_parameters['hop_size'], seq_length=seq_length,
+            context_length=hyper_parameters['context_length'], batch_size=batch_size,
+            fingerprint=fingerprint, wav_quality=wav_quality
+        )
+
+        e_time = time.time()
+
+        _mark_file_processed(source, output_file_name, fingerprint)
+
+        print('-- File {}: {} of {} sequences predicted | {:.1f}% of the samples '
+              'synthesized'.format(source, nb_predicted, nb_sequences,
+                                   100. * nb_synthesized / max(nb_samples, 1)))
+        print(usage_output_string_per_example.format(f=source, t=e_time - s_time))
+
+        total_time += e_time - s_time
+        total_duration += duration
+
+    print('\n-- Testing finished\n')
+    print(usage_output_string_total.format(
+        t=total_time
+    ))
+    print(usage_output_string_realtime.format(
+        d=total_duration, t=total_time,
+        r=total_time / total_duration, x=total_duration / total_time
+    ))
+    _print_gate_stats(predictor)
+    print('-- That\'s all folks!')
+
+
+def _print_spool_stats(stats):
+    """Prints the progress of a job spool.
+
+    :param stats: The statistics of the spool, as given by\
+                  :meth:`helpers.job_spool.JobSpool.stats`.
+    :type stats: dict
+    """
+    if stats['eta'] is None:
+        eta = 'unknown'
+    else:
+        eta = str(datetime.timedelta(seconds=int(stats['eta'])))
+
+    print(usage_output_string_spool.format(
+        d=stats['done'], r=stats['remaining'], f=stats['failed'],
+        x=stats['throughput'] or 0., eta=eta
+    ))
+
+
+def _mark_file_processed(source, output_file_name, fingerprint, cache=None):
+    """Records that a file is processed, after its outputs are written,\
+    and adds its outputs to the cache.
+
+    :param source: The file name.
+    :type source: str
+    :param output_file_name: The output file names.
+    :type output_file_name: list[str]
+    :param fingerprint: The fingerprint of the run. If None, nothing is recorded.
+    :type fingerprint: str | None
+    :param cache: The output cache. If None, no cache is used.
+    :type cache: helpers.output_cache.OutputCache | None
+    """
+    if fingerprint is not None:
+        mark_processed(_make_marker_file_name(source), source_fingerprint(fingerprint, source))
+
+        if cache is not None:
+            cache.put(cache.key(source, fingerprint), output_file_name)
+
+
+def _get_files_from_cache(cache, fingerprint, sources_list, output_file_names):
+    """Gets the outputs of the files from the cache. Of the files with the\
+    same audio, only the first one is kept for processing, and the rest\
+    can copy its outputs afterwards.
+
+    :param cache: The output cache.
+    :type cache: helpers.output_cache.OutputCache
+    :param fingerprint: The fingerprint of the run.
+    :type fingerprint: str
+    :param sources_list: The file names.
+    :type sources_list: list[str]
+    :param output_file_names: The output file names.
+    :type output_file_names: list[list[str]]
+    :return: The files to be processed (and their output file names), and\
+             the files with the same audio as one of them (with their output\
+             file names and the output file names of that file).
+    :rtype: (list[str], list[list[str]], list[(str, list[str], list[str])])
+    """
+    pending = []
+    duplicates = []
+    keys = {}
+
+    for source, output_file_name in zip(sources_list, output_file_names):
+        key = cache.key(source, fingerprint)
+
+        if key in keys:
+            duplicates.append((source, output_file_name, keys[key]))
+        elif cache.get(key, output_file_name):
+            _mark_file_processed(source, output_file_name, fingerprint)
+            print('-- File {} got from the cache'.format(source))
+        else:
+            pending.append((source, output_file_name))
+            keys[key] = output_file_name
+
+    return [source for source, _ in pending], [output_file_name for _, output_file_name in pending], \
+        duplicates
+
+
+def _print_cache_stats(stats):
+    """Prints the statistics of an output cache.
+
+    :param stats: The statistics of the cache, as given by\
+                  :meth:`helpers.output_cache.OutputCache.stats`.
+    :type stats: dict
+    """
+    print(usage_output_string_cache.format(
+        h=stats['hits'], m=stats['misses'], th=stats['total_hits'], tm=stats['total_misses'],
+        e=stats['evictions'], n=stats['entries'],
+        s=stats['size'] / float(2 ** 20), x=stats['max_size'] / float(2 ** 20)
+    ))
+
+
+def _load_mad(cpu_only):
+    """Creates the MaD and loads its weights, from the bundle if it\
+    exists or from the separate files of the modules otherwise.
+
+    :param cpu_only: Keep the MaD on CPU, even if CUDA is available.
+    :type cpu_only: bool
+    :return: The MaD.
+    :rtype: modules.MaD
+    """
+    mad = MaD(
+        hyper_parameters['reduced_dim'],
+        hyper_parameters['rnn_enc_output_dim'],
+        hyper_parameters['original_input_dim'],
+        hyper_parameters['context_length'],
+        debug or cpu_only
+    )
+
+    if os.path.isfile(model_bundle_path):
+        mad.load_bundle(model_bundle_path, hyper_parameters)
+    else:
+        mad.load_states(output_states_path)
+
+    if not debug and not cpu_only and torch.has_cudnn:
+        mad = mad.cuda()
+
+    return mad
+
+
+def _load_predictor(energy_gate):
+    """Creates the MaD, and the energy gate around it if a threshold is given.
+
+    :param energy_gate: The level threshold in dB of the energy gate, or None.
+    :type energy_gate: float | None
+    :return: The MaD or the energy gate, i.e. an object with the `predict`\
+             and `predict_batch` methods of the MaD.
+    :rtype: modules.MaD | helpers.energy_gate.EnergyGate
+    """
+    mad = _load_mad(cpu_only=False)
+
+    if energy_gate is None:
+        return mad
+
+    return EnergyGate(
+        mad, energy_gate, hyper_parameters['window_size'], hyper_parameters['context_length'])
+
+
+def _print_gate_stats(predictor):
+    """Prints the sequences that the energy gate skipped, if it is used.
+
+    :param predictor: The MaD or the energy gate.
+    :type predictor: modules.MaD | helpers.energy_gate.EnergyGate
+    """
+    if isinstance(predictor, EnergyGate):
+        print(usage_output_string_gate.format(
+            g=predictor.threshold, s=predictor.nb_skipped, n=predictor.nb_sequences,
+            p=100. * predictor.nb_skipped / max(predictor.nb_sequences, 1),
+            t=predictor.time_saved()
+        ))
+
+
+# The MaD and the settings of each worker of the pool
+_worker = {}
+
+
+def _init_worker(nb_threads, seq_length, batch_size, stereo=None):
+    """Initializes a worker of the pool.
+
+    :param nb_threads: The amount of PyTorch threads.
+    :type nb_threads: int
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :param stereo: The channels to be separated (`lr` or `ms`), or None.
+    :type stereo: str | None
+    """
+    torch.set_num_threads(nb_threads)
+
+    _worker['mad'] = _load_mad(cpu_only=True)
+    _worker['seq_length'] = seq_length
+    _worker['batch_size'] = batch_size
+    _worker['stereo'] = stereo
+
+
+def _separate_file(source_and_output):
+    """Separates one file, at a worker of the pool.
+
+    :param source_and_output: The file name and the output file names.
+    :type source_and_output: (str, list[str])
+    :return: The file name, its duration and the processing time in seconds.
+    :rtype: (str, float, float)
+    """
+    source, output_file_name = source_and_output
+    s_time = time.time()
+
+    duration = _separate_single_file(
+        _worker['mad'], source, output_file_name, _worker['seq_length'], _worker['batch_size'],
+        _worker['stereo'])
+
+    return source, duration, time.time() - s_time
+
+
+def _separate_single_file(mad, source, output_file_name, seq_length, batch_size, stereo=None):
+    """Separates one file.
+
+    :param mad: The MaD.
+    :type mad: modules.MaD
+    :param source: The file name.
+    :type source: str
+    :param output_file_name: The output file names.
+    :type output_file_name: list[str]
+    :param seq_length: The sequence length in frames used for the inference.
+    :type seq_length: int
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :param stereo: The channels to be separated (`lr` or `ms`), or None.
+    :type stereo: str | None
+    :return: The duration of the file, in seconds.
+    :rtype: float
+    """
+    testing_it = data_feeder_testing(
+        window_size=hyper_parameters['window_size'], fft_size=hyper_parameters['fft_size'],
+        hop_size=hyper_parameters['hop_size'], seq_length=seq_length,
+        context_length=hyper_parameters['context_length'], batch_size=1,
+        debug=debug, sources_list=[source], stereo=stereo
+    )
+
+    mix, mix_magnitude, mix_phase, voice_true, bg_true = next(testing_it())
+
+    voice_predicted = mad.predict(mix_magnitude, batch_size)
+
+    data_process_results_testing(
+        index=0, voice_true=voice_true, bg_true=bg_true,
+        voice_predicted=voice_predicted,
+        window_size=hyper_parameters['window_size'], mix=mix, mix_magnitude=mix_magnitude,
+        mix_phase=mix_phase, hop=hyper_parameters['hop_size'],
+        context_length=hyper_parameters['context_length'],
+        output_file_name=output_file_name, stereo=stereo
+    )
+
+    return len(mix) / float(wav_quality['sampling_rate'])
+
+
+def _parallel_predict(pool, mix_magnitude, batch_size):
+    """Predicts the voice magnitude of the sequences of one file, with\
+    each batch of sequences processed by a worker of the pool.
+
+    The (non-overlapping) frames of the file are written to a temporary\
+    .npy file, which the workers memory map to make their sequences. Thus,\
+    only the indices of the sequences and the predictions are transferred\
+    between the processes.
+
+    :param pool: The pool of the workers.
+    :type pool: multiprocessing.pool.Pool
+    :param mix_magnitude: The overlapping sequences of the mixture magnitude.
+    :type mix_magnitude: numpy.core.multiarray.ndarray
+    :param batch_size: The batch size.
+    :type batch_size: int
+    :return: The predicted voice magnitude, without the context frames, in order.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    nb_sequences, seq_length, nb_features = mix_magnitude.shape
+    step = seq_length - 2 * hyper_parameters['context_length']
+
+    voice_predicted = np.zeros((nb_sequences, step, nb_features), dtype=np.float32)
+
+    f_handle, frames_file = tempfile.mkstemp(suffix='.npy')
+    os.close(f_handle)
+
+    try:
+        frames = np.lib.format.open_memmap(
+            frames_file, mode='w+', dtype=np.float32,
+            shape=((nb_sequences - 1) * step + seq_length, nb_features)
+        )
+        frames[:nb_sequences * step].reshape(nb_sequences, step, nb_features)[:] = mix_magnitude[:, :step, :]
+        frames[nb_sequences * step:] = mix_magnitude[-1, step:, :]
+        frames.flush()
+        del frames
+
+        tasks = [(frames_file, b_start, min(b_start + batch_size, nb_sequences), seq_length)
+                 for b_start in range(0, nb_sequences, batch_size)]
+
+        for (_, b_start, b_end, _), tmp_voice_predicted in zip(
+                tasks, pool.imap(_predict_sequences, tasks)):
+            voice_predicted[b_start:b_end, :, :] = tmp_voice_predicted
+    finally:
+        os.remove(frames_file)
+
+    return voice_predicted
+
+
+def _predict_sequences(task):
+    """Predicts the voice magnitude of some sequences of a file, at a\
+    worker of the pool.
+
+    :param task: The file name of the frames, the indices of the first and\
+                 (one after) the last sequence, and the sequence length.
+    :type task: (str, int, int, int)
+    :return: The predicted voice magnitude, without the context frames.
+    :rtype: numpy.core.multiarray.ndarray
+    """
+    frames_file, seq_start, seq_end, seq_length = task
+    step = seq_length - 2 * hyper_parameters['context_length']
+
+    frames = np.load(frames_file, mmap_mode='r')[seq_start * step:]
+    sequences = stride_tricks.as_strided(
+        frames,
+        shape=(seq_end - seq_start, seq_length, frames.shape[1]),
+        strides=(frames.strides[0] * step, frames.strides[0], frames.strides[1]),
+        writeable=False
+    )
+
+    return _worker['mad'].predict(np.ascontiguousarray(sequences), _worker['batch_size'])
+
+
+def _make_target_file_names(sources_list, save_masks=False):
     """Makes the target file names for the sources list.
 
     :param sources_list: The sources list.
     :type sources_list: list[str]
+    :param save_masks: Add the file name of the mask store.
+    :type save_masks: bool
     :return: The target names.
     :rtype: list[list[str]]
     """
@@ -143,9 +960,23 @@ def _make_target_file_names(sources_list):
         f_name = os.path.splitext(source)[0]
         targets_list.append(['{}_voice.wav'.format(f_name), '{}_bg_music.wav'.format(f_name)])
 
+        if save_masks:
+            targets_list[-1].append('{}_mask.npz'.format(f_name))
+
     return targets_list
 
 
+def _make_marker_file_name(source):
+    """Makes the file name of the record that a file is processed.
+
+    :param source: The file name.
+    :type source: str
+    :return: The file name of the record.
+    :rtype: str
+    """
+    return '{}_mad.json'.format(os.path.splitext(source)[0])
+
+
 def _get_file_names_from_file(file_name):
     """Reads line by line a txt file and returns the contents.
 
@@ -158,9 +989,34 @@ def _get_file_names_from_file(file_name):
         return [line.strip() for line in f.readlines()]
 
 
+def _run_settings(cmd_args):
+    """Gives the settings of the run that affect the outputs, for its\
+    fingerprint.
+
+    :param cmd_args: The arguments.
+    :type cmd_args: argparse.Namespace
+    :return: The settings.
+    :rtype: dict
+    """
+    settings = {'seq_length': cmd_args.seq_length}
+
+    # Without them, the fingerprint is the one of the previous versions
+    if cmd_args.energy_gate is not None:
+        settings['energy_gate'] = cmd_args.energy_gate
+
+    if cmd_args.stereo is not None:
+        settings['stereo'] = cmd_args.stereo
+
+    return settings
+
+
 def main():
     cmd_arg_parser = argparse.ArgumentParser(
-        usage='python scripts/use_me [-w the_file.wav]|[-l the_files.txt]',
+        usage='python scripts/use_me [-w the_file.wav]|[-l the_files.txt] '
+              '[-s seq_length] [-b batch_size] [-p nb_workers] [-t nb_threads] [-x] '
+              '[-P read infer write] [--force] [--shard i/N] '
+              '[-q [spool]] [--max-attempts n] [--stream] [-c [cache]] [--cache-size GB] [--save-masks] '
+              '[--incremental] [-g [dB]] [--stereo [lr|ms]]',
         description='Script to use the MaD TwinNet with your own files. Remember to set up properly'
                     'the PYTHONPATH environmental variable'
     )
@@ -175,10 +1031,180 @@ def main():
         help='Specify one txt file with each line to be one path for a wav file.'
     )
 
+    cmd_arg_parser.add_argument(
+        '--seq-length', '-s', action='store', dest='seq_length', type=int,
+        default=inference_constants['seq_length'],
+        help='The sequence length in frames used for the inference (context frames included).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--batch-size', '-b', action='store', dest='batch_size', type=int,
+        default=inference_constants['batch_size'],
+        help='The batch size. Batches are filled with sequences from consecutive files.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--workers', '-p', action='store', dest='nb_workers', type=int, default=1,
+        help='The amount of worker processes. With more than one, each worker '
+             'processes whole files on CPU.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--threads', '-t', action='store', dest='nb_threads', type=int, default=1,
+        help='The amount of PyTorch threads of each worker process.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--intra-file', '-x', action='store_true', dest='intra_file', default=False,
+        help='Split the sequences of each file across the worker processes, '
+             'instead of giving whole files to each worker (for few, long files).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--pipeline', '-P', action='store', dest='stage_threads', type=int, nargs=3,
+        default=None, metavar=('READ', 'INFER', 'WRITE'),
+        help='Run reading, inference, and synthesis/writing as a pipeline, '
+             'with the given amount of threads per stage.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--force', action='store_true', dest='force', default=False,
+        help='Process all the files, even the ones that are already processed '
+             'with the same weights and settings.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--shard', action='store', dest='shard', type=shard_argument, default=None,
+        help='Process only the i-th of N shards of the files, given as i/N (e.g. 0/4). '
+             'The shards have about the same total duration.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--spool', '-q', action='store', dest='spool', nargs='?', const=job_spool_path,
+        default=None,
+        help='Work on the jobs of a job spool (see scripts/job_spool.py), instead of '
+             'the given files. Without a value, the spool of the settings is used.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--max-attempts', action='store', dest='max_attempts', type=int,
+        default=job_spool_constants['max_attempts'],
+        help='The maximum amount of attempts for a job of the spool.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--cache', '-c', action='store', dest='cache', nargs='?', const=output_cache_path,
+        default=None,
+        help='Use an output cache, i.e. get the outputs of files with audio that is already '
+             'processed from the cache (optionally give its directory).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--cache-size', action='store', dest='cache_size', type=float,
+        default=output_cache_constants['max_size'] / float(2 ** 30),
+        help='The maximum size of the output cache in GB.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--stream', action='store_true', dest='stream', default=False,
+        help='Process each file in chunks, with memory that does not depend on the duration '
+             'of the files (e.g. for hour-long files).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--save-masks', '-k', action='store_true', dest='save_masks', default=False,
+        help='Save also the predicted voice magnitude and the mixture phase of each file, '
+             'for re-rendering with scripts/render.py.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--incremental', '-I', action='store_true', dest='incremental', default=False,
+        help='Separate again only the changed parts of edited files, using their mask stores '
+             '(which are saved in this mode).'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--energy-gate', '-g', action='store', dest='energy_gate', type=float, nargs='?',
+        const=energy_gate_constants['threshold'], default=None,
+        help='Do not give to the MaD the sequences with all their frames below the level '
+             'threshold in dB (optionally given), e.g. for silent parts. Their voice is '
+             'silent and their background music is the mixture.'
+    )
+
+    cmd_arg_parser.add_argument(
+        '--stereo', action='store', dest='stereo', nargs='?', const='lr', default=None,
+        choices=['lr', 'ms'],
+        help='Separate the left and right (lr, default) or the mid and side (ms) channels '
+             'of the files, with the sequences of the channels predicted together, and '
+             'write stereo outputs.'
+    )
+
     cmd_args = cmd_arg_parser.parse_args()
+
+    if cmd_args.batch_size < 1:
+        cmd_arg_parser.error('argument --batch-size/-b: the batch size must be at least 1')
+
+    if cmd_args.stage_threads is not None and min(cmd_args.stage_threads) < 1:
+        cmd_arg_parser.error('argument --pipeline/-P: the amount of threads of each stage '
+                             'must be at least 1')
+
+    if cmd_args.stereo is not None and (
+            cmd_args.stream or cmd_args.incremental or cmd_args.save_masks or
+            cmd_args.spool is not None or cmd_args.intra_file):
+        print('-- The stereo mode cannot be used with --stream, -I, -k, a job spool, or -x. '
+              'Exiting.')
+        exit(-1)
+
+    if cmd_args.energy_gate is not None and (
+            cmd_args.spool is not None or cmd_args.nb_workers > 1):
+        print('-- The energy gate cannot be used with a job spool or many workers. Exiting.')
+        exit(-1)
+
+    if cmd_args.stream and (cmd_args.save_masks or cmd_args.incremental):
+        print('-- The masks cannot be saved in streaming mode. Exiting.')
+        exit(-1)
+
+    if cmd_args.incremental and cmd_args.spool is not None:
+        print('-- The incremental mode cannot be used with a job spool. Exiting.')
+        exit(-1)
+
+    cache = None
+    if cmd_args.cache is not None:
+        cache = OutputCache(
+            cmd_args.cache, int(cmd_args.cache_size * 2 ** 30), mono=cmd_args.stereo is None)
+
+    try:
+        _main(cmd_args, cache)
+    finally:
+        if cache is not None:
+            _print_cache_stats(cache.stats())
+            cache.close()
+
+
+def _main(cmd_args, cache):
+    """Selects the files and the process, according to the arguments.
+
+    :param cmd_args: The arguments.
+    :type cmd_args: argparse.Namespace
+    :param cache: The output cache, or None.
+    :type cache: helpers.output_cache.OutputCache | None
+    """
     input_wav = cmd_args.input_wav
     input_list = cmd_args.input_list
 
+    if cmd_args.spool is not None:
+        use_me_spool_process(
+            spool_file_name=cmd_args.spool,
+            seq_length=cmd_args.seq_length,
+            batch_size=cmd_args.batch_size,
+            max_attempts=cmd_args.max_attempts,
+            fingerprint=run_fingerprint(**_run_settings(cmd_args)),
+            force=cmd_args.force,
+            cache=cache,
+            save_masks=cmd_args.save_masks
+        )
+        return
+
     if (input_wav == '' and len(input_list) == 0) or (input_wav != '' and len(input_list) != 0):
         print('-- Please specify **either** a wav file (with -iw) **or** give'
               'a txt file with file names in each line (with -il). ')
@@ -190,10 +1216,123 @@ def main():
     else:
         input_list = _get_file_names_from_file(input_list)
 
-    use_me_process(
-        sources_list=input_list,
-        output_file_names=_make_target_file_names(input_list)
-    )
+    if cmd_args.shard is not None:
+        shard = shard_indices([wav_duration(source) for source in input_list], *cmd_args.shard)
+        print('-- Shard {}/{}: {} of {} files'.format(
+            cmd_args.shard[0], cmd_args.shard[1], len(shard), len(input_list)))
+
+        if len(shard) == 0:
+            print('-- Nothing to do. Exiting.')
+            return
+
+        input_list = [input_list[index] for index in shard]
+
+    output_file_names = _make_target_file_names(
+        input_list, cmd_args.save_masks or cmd_args.incremental)
+    fingerprint = run_fingerprint(**_run_settings(cmd_args))
+
+    if not cmd_args.force:
+        pending = [
+            (source, output_file_name)
+            for source, output_file_name in zip(input_list, output_file_names)
+            if not is_processed(_make_marker_file_name(source),
+                                source_fingerprint(fingerprint, source), output_file_name)
+        ]
+
+        if len(pending) < len(input_list):
+            print('-- Resuming: {} of {} files are already processed (use --force to '
+                  'process them again)'.format(len(input_list) - len(pending), len(input_list)))
+
+        if len(pending) == 0:
+            print('-- Nothing to do. Exiting.')
+            return
+
+        input_list, output_file_names = [list(i) for i in zip(*pending)]
+
+    # The cache has no masks, so with the masks all the files are processed
+    duplicates = []
+    if cache is not None and not (cmd_args.save_masks or cmd_args.incremental):
+        input_list, output_file_names, duplicates = _get_files_from_cache(
+            cache, fingerprint, input_list, output_file_names)
+
+        if len(input_list) == 0:
+            print('-- Nothing else to do. Exiting.')
+            return
+
+    if cmd_args.incremental:
+        use_me_incremental_process(
+            sources_list=input_list,
+            output_file_names=output_file_names,
+            seq_length=cmd_args.seq_length,
+            batch_size=cmd_args.batch_size,
+            fingerprint=fingerprint,
+            energy_gate=cmd_args.energy_gate
+        )
+    elif cmd_args.stream:
+        use_me_stream_process(
+            sources_list=input_list,
+            output_file_names=output_file_names,
+            seq_length=cmd_args.seq_length,
+            batch_size=cmd_args.batch_size,
+            fingerprint=fingerprint,
+            cache=cache,
+            energy_gate=cmd_args.energy_gate
+        )
+    elif cmd_args.stage_threads is not None:
+        use_me_pipeline_process(
+            sources_list=input_list,
+            output_file_names=output_file_names,
+            seq_length=cmd_args.seq_length,
+            batch_size=cmd_args.batch_size,
+            stage_threads=cmd_args.stage_threads,
+            fingerprint=fingerprint,
+            cache=cache,
+            energy_gate=cmd_args.energy_gate,
+            stereo=cmd_args.stereo
+        )
+    elif cmd_args.nb_workers > 1 and cmd_args.intra_file:
+        use_me_intra_file_process(
+            sources_list=input_list,
+            output_file_names=output_file_names,
+            seq_length=cmd_args.seq_length,
+            batch_size=cmd_args.batch_size,
+            nb_workers=cmd_args.nb_workers,
+            nb_threads=cmd_args.nb_threads,
+            fingerprint=fingerprint,
+            cache=cache
+        )
+    elif cmd_args.nb_workers > 1:
+        use_me_pool_process(
+            sources_list=input_list,
+            output_file_names=output_file_names,
+            seq_length=cmd_args.seq_length,
+            batch_size=cmd_args.batch_size,
+            nb_workers=cmd_args.nb_workers,
+            nb_threads=cmd_args.nb_threads,
+            fingerprint=fingerprint,
+            cache=cache,
+            stereo=cmd_args.stereo
+        )
+    else:
+        use_me_process(
+            sources_list=input_list,
+            output_file_names=output_file_names,
+            seq_length=cmd_args.seq_length,
+            batch_size=cmd_args.batch_size,
+            fingerprint=fingerprint,
+            cache=cache,
+            energy_gate=cmd_args.energy_gate,
+            stereo=cmd_args.stereo
+        )
+
+    # The files with the same audio as a processed file have its outputs
+    for source, output_file_name, same_output_file_name in duplicates:
+        if all(os.path.isfile(file_name) for file_name in same_output_file_name):
+            for same_file_name, file_name in zip(same_output_file_name, output_file_name):
+                shutil.copyfile(same_file_name, file_name)
+
+            _mark_file_processed(source, output_file_name, fingerprint)
+            print('-- File {} has the same audio as a processed file'.format(source))
 
 
 if __name__ == '__main__':